@@ -4,6 +4,7 @@ import base64
 import contextlib
 import errno
 import fcntl
+import hashlib
 import json
 import os
 import platform
@@ -11,6 +12,7 @@ import pty
 import pwd
 import random
 import re
+import select
 import shutil
 import signal
 import stat
@@ -23,6 +25,7 @@ import threading
 import time
 import traceback
 import zipfile
+import zlib
 from concurrent.futures import ThreadPoolExecutor
 
 # pid -> Process
@@ -38,6 +41,15 @@ REGISTERED=[]
 LASTPS={}
 AUTOPOLL = 0
 AUTOPOLL_TASK = None
+# Set to wake autopoll early; see wake_autopoll.
+AUTOPOLL_EVENT = None
+AUTOPOLL_WOKEN = False
+# Bounds on the delay between polls. The client can change these with autopoll's
+# min=<seconds> and max=<seconds> arguments.
+DEFAULT_AUTOPOLL_MIN_DELAY = 0.5
+DEFAULT_AUTOPOLL_MAX_DELAY = 8.0
+AUTOPOLL_MIN_DELAY = DEFAULT_AUTOPOLL_MIN_DELAY
+AUTOPOLL_MAX_DELAY = DEFAULT_AUTOPOLL_MAX_DELAY
 TTY_TASK = None
 RECOVERY_STATE={}
 # 0: Not blocking on stdin
@@ -48,6 +60,63 @@ READSTATE=0
 BASEID=str(random.randint(0, 1048576)) + str(os.getpid()) + str(int(time.time() * 1000000))
 IDCOUNT=0
 SEARCH_TASK = None
+# id -> FileStream
+FILE_STREAMS = {}
+# Bytes per %notif stream chunk. A multiple of 3 so only the last chunk's base64 is padded.
+FILE_STREAM_CHUNK_SIZE = 48 * 1024
+# Chunks a FileStream sends before waiting for an ack.
+FILE_STREAM_WINDOW = 16
+# id -> Upload
+UPLOADS = {}
+# Bytes read at a time when hashing or copying an upload.
+UPLOAD_HASH_BLOCK_SIZE = 1 << 20
+# Base64 characters of an upload chunk decoded at a time. A multiple of 4.
+UPLOAD_DECODE_BLOCK_SIZE = 256 * 1024
+# Bounds on the block size `file signature` picks. A client may ask for a smaller one, but not a larger one.
+SIGNATURE_MIN_BLOCK_SIZE = 2048
+SIGNATURE_MAX_BLOCK_SIZE = 128 * 1024
+# ProcSampler, False if it can't be used, or None if not yet created.
+PROC_SAMPLER = None
+# CPUSampler, False if it can't be used, or None if not yet created.
+CPU_SAMPLER = None
+# Whether poll output includes per-core CPU utilization.
+CPU_PER_CORE = False
+# Whether poll output includes per-process resource usage (Linux only).
+RESOURCES = False
+# pid -> resource usage last sent in the "res" category.
+LASTRES = {}
+# Changes in resource usage smaller than these aren't sent. RSS and I/O rates must also
+# change by RESOURCE_RELATIVE_THRESHOLD of their last value.
+RESOURCE_CPU_THRESHOLD = 2.0  # percentage points
+RESOURCE_RSS_THRESHOLD = 1 << 20  # bytes
+RESOURCE_IO_THRESHOLD = 64 << 10  # bytes per second
+RESOURCE_RELATIVE_THRESHOLD = 0.1
+# Process output is read in chunks that grow from READ_SIZE_MIN up to READ_SIZE_MAX bytes while
+# reads keep filling them.
+READ_SIZE_MIN = 256
+READ_SIZE_MAX = 65536
+# Seconds to hold a process's output after sending a %output frame so a flood becomes few frames.
+OUTPUT_COALESCE_DELAY = 0.002
+# Seconds of quiet after which a process's TTY modes are checked again.
+TTY_SETTLE_DELAY = 0.05
+# Counts output written by unlock(). Reported by the stats command.
+WRITE_STATS = {"responses": 0, "items": 0, "bytes": 0, "syscalls": 0, "eagain": 0}
+# Bytes before and after compression for compressed file transfers. Reported by the stats command.
+COMPRESSION_STATS = {kind: {"raw": 0, "compressed": 0} for kind in ("fetch", "upload", "zip")}
+
+def record_compression(kind, raw, compressed):
+    COMPRESSION_STATS[kind]["raw"] += raw
+    COMPRESSION_STATS[kind]["compressed"] += compressed
+
+def compression_level(args):
+    """Returns the level from a "zlib=<level>" argument, or None if there isn't one."""
+    for arg in args:
+        if arg.startswith("zlib="):
+            level = int(arg[5:])
+            if not 0 <= level <= 9:
+                raise ValueError(f'bad compression level {level}')
+            return level
+    return None
 
 def squash(i):
     a = list(map(chr, list(range(48,58))+list(range(65,91))+list(range(97,123))))
@@ -82,11 +151,25 @@ def lock():
 
 def unlock(writes):
     if writes:
-        for data in writes:
-            if isinstance(data, str):
-                data = data.encode('utf-8')
-            os.write(sys.stdout.fileno(), data)
+        data = b"".join(item.encode('utf-8') if isinstance(item, str) else item for item in writes)
+        WRITE_STATS["responses"] += 1
+        WRITE_STATS["items"] += len(writes)
         sys.stdout.flush()
+        write_fully(sys.stdout.fileno(), data)
+
+def write_fully(fd, data):
+    """Writes all of data, retrying after short writes and waiting out EAGAIN."""
+    view = memoryview(data)
+    while view:
+        try:
+            written = os.write(fd, view)
+        except BlockingIOError:
+            WRITE_STATS["eagain"] += 1
+            select.select([], [fd], [])
+            continue
+        WRITE_STATS["syscalls"] += 1
+        WRITE_STATS["bytes"] += written
+        view = view[written:]
 
 class Process:
     @staticmethod
@@ -243,11 +326,17 @@ class Process:
         return await self.__stdout_reader.readline()
 
     async def read_forever(self, reader, channel, callback):
+        size = READ_SIZE_MIN
         try:
             while True:
-                log(f'read_forever {self.__descr}: reading for channel {channel}')
-                value = await reader.read(256)
+                log(f'read_forever {self.__descr}: reading up to {size} for channel {channel}')
+                value = await reader.read(size)
                 log(f'read_forever {self.__descr}: read {value} for channel {channel}')
+                # Grow the read size while reads fill it and shrink it back once output slows down.
+                if len(value) == size:
+                    size = min(size * 2, READ_SIZE_MAX)
+                elif len(value) < size // 4:
+                    size = max(size // 2, READ_SIZE_MIN)
                 coro = callback(channel, value)
                 if coro:
                     log(f'read_forever {self.__descr}: await callback-returned coro {coro}')
@@ -283,29 +372,66 @@ def guess_login_shell():
 
 ## Process monitoring
 
-async def autopoll(delay):
+def wake_autopoll():
+    """Asks autopoll to poll soon because something that affects the process list happened."""
+    global AUTOPOLL_WOKEN
+    if AUTOPOLL_WOKEN:
+        return
+    AUTOPOLL_WOKEN = True
+    if AUTOPOLL_EVENT is not None:
+        AUTOPOLL_EVENT.set()
+
+async def autopoll_sleep(polled, delay):
+    """Returns once the client has asked for more output and either delay seconds have passed
+    since polled or wake_autopoll was called. Never returns sooner than AUTOPOLL_MIN_DELAY
+    after polled."""
+    while True:
+        # The bounds may have changed while sleeping.
+        delay = min(max(delay, AUTOPOLL_MIN_DELAY), AUTOPOLL_MAX_DELAY)
+        due = polled + (AUTOPOLL_MIN_DELAY if AUTOPOLL_WOKEN else delay)
+        remaining = due - time.monotonic()
+        if AUTOPOLL and remaining <= 0:
+            return
+        # wake_autopoll, handle_autopoll, and set_poll_options set the event.
+        AUTOPOLL_EVENT.clear()
+        try:
+            await asyncio.wait_for(AUTOPOLL_EVENT.wait(), remaining if remaining > 0 else None)
+        except asyncio.TimeoutError:
+            pass
+
+async def autopoll():
+    """Polls repeatedly, sending output when there is any.
+
+    The delay between polls doubles, up to AUTOPOLL_MAX_DELAY, while the process list doesn't
+    change and drops back to AUTOPOLL_MIN_DELAY when it does. Output, process exit, and
+    registration changes wake it early."""
     try:
         global AUTOPOLL
+        global AUTOPOLL_EVENT
+        global AUTOPOLL_WOKEN
+        AUTOPOLL_EVENT = asyncio.Event()
+        delay = AUTOPOLL_MIN_DELAY
         while True:
             log('autopoll: call poll()')
+            AUTOPOLL_WOKEN = False
             cats = await poll()
-            if not cats:
-                log(f'autopoll: sleep for {delay}')
-                await asyncio.sleep(delay)
-                log(f'autopoll: awoke')
-                continue
-            # Send poll output and sleep until client requests autopolling again.
-            identifier = makeid()
-            q = lock()
-            send_esc(q, f'%autopoll {identifier}')
-            send_poll_output(q, cats)
-            send_esc(q, f'%end {identifier}')
-            unlock(q)
-            AUTOPOLL = 0
-            while not AUTOPOLL:
-                log(f'autopoll: sleep for {delay}')
-                await asyncio.sleep(delay)
-                log(f'autopoll: awoke')
+            polled = time.monotonic()
+            if cats.get("ps") or cats.get("res"):
+                delay = AUTOPOLL_MIN_DELAY
+            else:
+                delay = min(max(delay * 2, AUTOPOLL_MIN_DELAY), AUTOPOLL_MAX_DELAY)
+            if cats:
+                # Send poll output. The next poll waits until the client requests autopolling again.
+                identifier = makeid()
+                q = lock()
+                send_esc(q, f'%autopoll {identifier}')
+                send_poll_output(q, cats)
+                send_esc(q, f'%end {identifier}')
+                unlock(q)
+                AUTOPOLL = 0
+            log(f'autopoll: sleep for up to {delay}')
+            await autopoll_sleep(polled, delay)
+            log(f'autopoll: awoke')
     except asyncio.CancelledError:
         log('autopoll canceled')
         raise
@@ -356,7 +482,10 @@ async def poll():
     ps_out = await poll_ps()
     if ps_out is not None:
         result["ps"] = ps_out
-    cpu_time_diff = await poll_cpu()
+    res_out = poll_resources()
+    if res_out:
+        result["res"] = res_out
+    cpu_time_diff = await poll_cpu(CPU_PER_CORE)
     if cpu_time_diff is not None:
         result["cpu"] = cpu_time_diff
     return result
@@ -382,11 +511,77 @@ async def check_mpstat_exists():
             mpstat_exists = False
 
 
-async def poll_cpu():
+class CPUSampler:
+    """Computes CPU utilization from the change in /proc/stat counters between samples.
+
+    Unlike mpstat this doesn't wait for an interval: the first sample covers the time since
+    the sampler was created and each later one covers the time since the previous sample. A
+    sample in which no ticks have elapsed repeats the last percentage, or 0 if there is none.
+    Like `100 - %idle` from mpstat, iowait counts as busy."""
+    def __init__(self):
+        # cpu name ("cpu" for the total, "cpu0" etc. for cores) -> (busy ticks, total ticks)
+        self.last = self.read()
+        # cpu name -> last percentage, reused when no ticks have elapsed.
+        self.percents = {}
+
+    def read(self):
+        counters = {}
+        with open('/proc/stat') as f:
+            for line in f:
+                if not line.startswith('cpu'):
+                    break
+                fields = line.split()
+                # user nice system idle iowait irq softirq steal. guest and guest_nice are
+                # already included in user and nice.
+                ticks = [int(value) for value in fields[1:9]]
+                total = sum(ticks)
+                counters[fields[0]] = (total - ticks[3], total)
+        return counters
+
+    def sample(self):
+        """Returns [(cpu name, percent busy)] with the total first."""
+        counters = self.read()
+        result = []
+        for name, (busy, total) in counters.items():
+            last_busy, last_total = self.last.get(name, (0, 0))
+            if total > last_total:
+                self.percents[name] = 100.0 * (busy - last_busy) / (total - last_total)
+            result.append((name, self.percents.get(name, 0.0)))
+        self.last = counters
+        return result
+
+def get_cpu_sampler():
+    """Returns the CPUSampler, or None if /proc/stat can't be used."""
+    global CPU_SAMPLER
+    if CPU_SAMPLER is None:
+        CPU_SAMPLER = False
+        try:
+            CPU_SAMPLER = CPUSampler()
+        except Exception as e:
+            log(f'CPUSampler unavailable: {e}')
+    return CPU_SAMPLER or None
+
+def format_cpu_sample(sample, per_core):
+    """Returns poll output lines: "=<total>" then, if per_core, "<core>=<percent>" for each core."""
+    lines = []
+    for name, percent in sample:
+        if name == 'cpu':
+            lines.insert(0, f'={percent:.2f}')
+        elif per_core:
+            lines.append(f'{name[3:]}={percent:.2f}')
+    return lines
+
+async def poll_cpu(per_core=False):
     operating_system = platform.system()
     if operating_system == 'Darwin':  # macOS
         command = "top -l 1 -n 0 | awk '/CPU usage/ {print $3}'"
     elif operating_system == 'Linux':  # Linux
+        sampler = get_cpu_sampler()
+        if sampler is not None:
+            try:
+                return format_cpu_sample(sampler.sample(), per_core)
+            except Exception as e:
+                log(f'poll_cpu: CPUSampler threw {e}: {traceback.format_exc()}')
         await check_mpstat_exists()
         if not mpstat_exists:
             return None
@@ -412,7 +607,243 @@ async def poll_cpu():
     log(f'poll_cpu: {command} failed with {proc.returncode}')
     return None
 
+class ProcSampler:
+    """Reads the process table from /proc on Linux instead of running ps.
+
+    Only the subtrees under the root pids are read. Children are found through
+    /proc/<pid>/task/<tid>/children when the kernel provides it; otherwise one pass over
+    /proc/*/stat builds a parent index. Rows have the same fields as
+    `ps -eo pid,ppid,stat,lstart,command` so they diff the same way."""
+    def __init__(self):
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.boot_time = None
+        with open('/proc/stat') as f:
+            for line in f:
+                if line.startswith('btime '):
+                    self.boot_time = int(line.split()[1])
+                    break
+        if self.boot_time is None:
+            raise OSError('/proc/stat lacks btime')
+        me = os.getpid()
+        self.has_children_files = os.path.exists(f'/proc/{me}/task/{me}/children')
+        # pid -> (start time in clock ticks since boot, start time formatted like ps's lstart).
+        # Kept between samples so the formatting is done once per process.
+        self.start_times = {}
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        # pid -> (start time, cpu ticks, bytes read, bytes written, time.monotonic()) from the
+        # previous sample, for computing rates.
+        self.counters = {}
+        # pid -> (cpu percent, rss bytes, threads, bytes read per second, bytes written per
+        # second) from the latest sample that measured resources.
+        self.usage = {}
+
+    @staticmethod
+    def read_stat(pid):
+        """Returns the command name and the fields after it in /proc/<pid>/stat."""
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            data = f.read().decode('utf-8', 'replace')
+        # The command name is in parentheses and may itself contain spaces and parentheses.
+        close = data.rindex(')')
+        return data[data.index('(') + 1:close], data[close + 2:].split()
+
+    @staticmethod
+    def read_children(pid):
+        children = []
+        for tid in os.listdir(f'/proc/{pid}/task'):
+            try:
+                with open(f'/proc/{pid}/task/{tid}/children') as f:
+                    children.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+        return children
+
+    @staticmethod
+    def read_command(pid, name, state):
+        if state == 'Z':
+            return f'[{name}] <defunct>'
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        if not data:
+            return f'[{name}]'
+        command = data.rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace')
+        # Like ps, don't let control characters (especially newlines) through.
+        return re.sub(r'[\x00-\x1f\x7f]', '?', command)
+
+    def make_row(self, pid, name, fields):
+        # Field numbers in proc(5) minus 3, since the fields start after the command name.
+        state = fields[0]
+        pgrp = int(fields[2])
+        session = int(fields[3])
+        tpgid = int(fields[5])
+        nice = int(fields[16])
+        threads = int(fields[17])
+        start = int(fields[19])
+        flags = state
+        if nice < 0:
+            flags += '<'
+        elif nice > 0:
+            flags += 'N'
+        if session == pid:
+            flags += 's'
+        if threads > 1:
+            flags += 'l'
+        if tpgid == pgrp:
+            flags += '+'
+        cached = self.start_times.get(pid)
+        if cached is None or cached[0] != start:
+            when = time.localtime(self.boot_time + start // self.ticks)
+            cached = (start, time.strftime('%a %b %e %H:%M:%S %Y', when))
+            self.start_times[pid] = cached
+        return (str(pid), fields[1], flags, cached[1], self.read_command(pid, name, state))
+
+    def measure(self, pid, fields, now):
+        """Returns resource usage for self.usage. Rates are 0 the first time a process is seen."""
+        start = int(fields[19])
+        cpu = int(fields[11]) + int(fields[12])
+        threads = int(fields[17])
+        with open(f'/proc/{pid}/statm') as f:
+            rss = int(f.read().split()[1]) * self.page_size
+        read = written = 0
+        try:
+            # Only readable for our own processes, and missing without task I/O accounting.
+            with open(f'/proc/{pid}/io') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    if key == 'read_bytes':
+                        read = int(value)
+                    elif key == 'write_bytes':
+                        written = int(value)
+        except OSError:
+            pass
+        last = self.counters.get(pid)
+        self.counters[pid] = (start, cpu, read, written, now)
+        if last is None or last[0] != start or now <= last[4]:
+            return (0.0, rss, threads, 0, 0)
+        elapsed = now - last[4]
+        return (100.0 * (cpu - last[1]) / self.ticks / elapsed,
+                rss,
+                threads,
+                int((read - last[2]) / elapsed),
+                int((written - last[3]) / elapsed))
+
+    def parent_index(self):
+        """Reads every process's stat. Returns ({ppid: [pid]}, {pid: (name, fields)})."""
+        children = {}
+        stats = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                name, fields = self.read_stat(entry)
+            except (OSError, ValueError):
+                continue
+            pid = int(entry)
+            stats[pid] = (name, fields)
+            children.setdefault(int(fields[1]), []).append(pid)
+        return children, stats
+
+    def sample(self, roots, resources=False):
+        """Returns {pid: row} for the roots and all their descendants, keyed by pid as a string.
+
+        If resources is True, also replaces self.usage with their resource usage."""
+        now = time.monotonic()
+        usage = {}
+        if self.has_children_files:
+            children, stats = None, {}
+        else:
+            children, stats = self.parent_index()
+        results = {}
+        stack = list(roots)
+        while stack:
+            pid = stack.pop()
+            if str(pid) in results:
+                continue
+            try:
+                name, fields = stats.get(pid) or self.read_stat(pid)
+                results[str(pid)] = self.make_row(pid, name, fields)
+                if resources:
+                    try:
+                        usage[str(pid)] = self.measure(pid, fields, now)
+                    except (OSError, ValueError, IndexError):
+                        # Leave it unmeasured but still visit its children, which may outlive it.
+                        pass
+                if children is None:
+                    stack.extend(self.read_children(pid))
+                else:
+                    stack.extend(children.get(pid, []))
+            except (OSError, ValueError, IndexError):
+                # The process exited while being read.
+                continue
+        for pid in list(self.start_times):
+            if str(pid) not in results:
+                del self.start_times[pid]
+        for pid in list(self.counters):
+            if str(pid) not in usage:
+                del self.counters[pid]
+        self.usage = usage
+        return results
+
+def resource_moved(old, new):
+    """Whether any field of a resource usage tuple changed by more than its threshold."""
+    if abs(new[0] - old[0]) >= RESOURCE_CPU_THRESHOLD or new[2] != old[2]:
+        return True
+    for i, minimum in ((1, RESOURCE_RSS_THRESHOLD), (3, RESOURCE_IO_THRESHOLD), (4, RESOURCE_IO_THRESHOLD)):
+        if abs(new[i] - old[i]) >= max(minimum, RESOURCE_RELATIVE_THRESHOLD * old[i]):
+            return True
+    return False
+
+def poll_resources():
+    """Returns +/-/~ lines for the "res" category, or None if resources aren't measured.
+
+    Each + or ~ line is "<pid> <cpu percent> <rss bytes> <threads> <bytes read/s> <bytes written/s>".
+    Values are compared against the last ones sent, so small changes don't produce edits."""
+    global LASTRES
+    sampler = PROC_SAMPLER
+    if not RESOURCES or not sampler:
+        return None
+    usage = sampler.usage
+    last = LASTRES
+    LASTRES = {}
+    lines = []
+    for pid, values in usage.items():
+        previous = last.get(pid)
+        if previous is not None and not resource_moved(previous, values):
+            LASTRES[pid] = previous
+            continue
+        LASTRES[pid] = values
+        cpu, rss, threads, read, written = values
+        lines.append(('~' if previous is not None else '+') + f'{pid} {cpu:.1f} {rss} {threads} {read} {written}')
+    for pid in last:
+        if pid not in usage:
+            lines.append(f'-{pid}')
+    return lines
+
+def get_proc_sampler():
+    """Returns the ProcSampler, or None if /proc can't be used."""
+    global PROC_SAMPLER
+    if PROC_SAMPLER is None:
+        PROC_SAMPLER = False
+        if platform.system() == 'Linux':
+            try:
+                PROC_SAMPLER = ProcSampler()
+            except Exception as e:
+                log(f'ProcSampler unavailable: {e}')
+    return PROC_SAMPLER or None
+
 async def poll_ps():
+    sampler = get_proc_sampler()
+    if sampler is not None:
+        try:
+            results = await asyncio.get_event_loop().run_in_executor(
+                None, sampler.sample, list(REGISTERED), RESOURCES)
+            return procmon_diff(results)
+        except Exception as e:
+            log(f'poll_ps: ProcSampler threw {e}: {traceback.format_exc()}')
+            # ps doesn't measure resources, so don't keep reporting the last sample's.
+            sampler.usage = {}
     env = dict(os.environ)
     env["LANG"] = "C"
     proc = await asyncio.create_subprocess_shell(
@@ -437,11 +868,13 @@ async def register(pid):
         return
     REGISTERED.append(pid)
     log(f'After registering {pid} REGISTERED={REGISTERED}')
+    wake_autopoll()
 
 async def deregister(pid):
     global REGISTERED
     if pid in REGISTERED:
         REGISTERED.remove(pid)
+        wake_autopoll()
 
 def procmon_parse(output):
     output = output.decode("utf-8")
@@ -504,7 +937,7 @@ def procmon_parse(output):
         pid = row[0]
         ppid = row[1]
         parent[pid] = ppid
-        children[ppid] = children.get(ppid, []) + [pid]
+        children.setdefault(ppid, []).append(pid)
         index[pid] = row
     log(f'procmon_parse: {len(index)} valid rows')
     # pid -> row
@@ -518,7 +951,10 @@ def procmon_parse(output):
         if str(pid) in index:
             add(str(pid))
     log(f'procmon_parse: {len(results)} processes in output')
+    return procmon_diff(results)
 
+def procmon_diff(results):
+    """Returns +/-/~ lines describing how results ({pid: row}) differs from the last call."""
     global LASTPS
     last = dict(LASTPS)
     LASTPS = dict(results)
@@ -526,16 +962,16 @@ def procmon_parse(output):
     def diff():
         currentkeys = set(results.keys())
         lastkeys = set(last.keys())
-        log(f'procmon_parse: diff current={currentkeys} last={lastkeys}')
+        log(f'procmon_diff: current={currentkeys} last={lastkeys}')
         for addition in currentkeys - lastkeys:
-            log(f'procmon_parse: add {addition}')
+            log(f'procmon_diff: add {addition}')
             yield "+" + " ".join(map(str, results[addition]))
         for removal in lastkeys - currentkeys:
-            log(f'procmon_parse: remove {removal}')
+            log(f'procmon_diff: remove {removal}')
             yield "-" + str(removal)
         for pid in results:
             if pid in last and results[pid] != last[pid]:
-                log(f'procmon_parse: edit {pid}')
+                log(f'procmon_diff: edit {pid}')
                 yield "~" + " ".join(map(str, results[pid]))
     return list(diff())
 
@@ -656,9 +1092,19 @@ def reset():
     global REGISTERED
     global LASTPS
     global AUTOPOLL
+    global CPU_PER_CORE
+    global RESOURCES
+    global LASTRES
+    global AUTOPOLL_MIN_DELAY
+    global AUTOPOLL_MAX_DELAY
     REGISTERED = []
     LASTPS = {}
     AUTOPOLL = 0
+    CPU_PER_CORE = False
+    RESOURCES = False
+    LASTRES = {}
+    AUTOPOLL_MIN_DELAY = DEFAULT_AUTOPOLL_MIN_DELAY
+    AUTOPOLL_MAX_DELAY = DEFAULT_AUTOPOLL_MAX_DELAY
 
 async def handle_reset1(identifier, args):
     reset()
@@ -717,7 +1163,9 @@ def make_path(b64path):
     return os.path.expanduser(base64.b64decode(b64path)).decode('latin1')
 
 async def handle_file(identifier, args):
-    log(f'handle_file {identifier} {args}')
+    # Only the subcommand and first argument: the rest may be megabytes of file data, and this is
+    # formatted even when logging is off.
+    log(f'handle_file {identifier} {args[:2]} and {len(args[2:])} more')
     if len(args) < 2:
         log(f'Not enough args {args}')
         q = begin(identifier)
@@ -801,15 +1249,37 @@ async def handle_file(identifier, args):
                                   args[2])
         return
     if sub == "zip":
+        try:
+            level = compression_level(args[2:])
+        except ValueError as e:
+            file_error(q, identifier, e, args[1])
+            return
         await handle_file_zip(q,
                               identifier,
-                              make_path(args[1]))
+                              make_path(args[1]),
+                              level)
         return
     if sub == "search":
         await handle_file_search(q,
                                  identifier,
                                  args[1:])
         return
+    if sub == "stream":
+        await handle_file_stream(q,
+                                 identifier,
+                                 args[1:])
+        return
+    if sub == "upload":
+        await handle_file_upload(q,
+                                 identifier,
+                                 args[1:])
+        return
+    if sub == "signature":
+        await handle_file_signature(q,
+                                    identifier,
+                                    make_path(args[1]),
+                                    args[2] if len(args) > 2 else None)
+        return
 
     log(f'unrecognized subcommand {sub}')
     end(q, identifier, 1)
@@ -839,6 +1309,18 @@ def remotefile(pp, abspath, s):
             "ctime": ctime,
             "mtime": mtime}
 
+# Statuses for `file upload commit` when the data doesn't match what begin promised.
+UPLOAD_INCOMPLETE = 101
+UPLOAD_CORRUPT = 102
+
+# errno -> status reported for file commands. Other OSErrors are 100 and other exceptions 255.
+FILE_ERROR_STATUS = {errno.EPERM: 1, errno.ENOENT: 2, errno.ENOTDIR: 3, errno.ELOOP: 4}
+
+def file_error_status(e):
+    if isinstance(e, OSError):
+        return FILE_ERROR_STATUS.get(e.errno, 100)
+    return 255
+
 def file_error(q, identifier, e, path):
     if e is None:
         log(f'file_error {path}')
@@ -848,8 +1330,7 @@ def file_error(q, identifier, e, path):
         raise e
     except OSError as e:
         log(f'file_error {path}: {traceback.format_exc()}')
-        errors = {errno.EPERM: 1, errno.ENOENT: 2, errno.ENOTDIR: 3, errno.ELOOP: 4}
-        end(q, identifier, errors.get(e.errno, 100))
+        end(q, identifier, FILE_ERROR_STATUS.get(e.errno, 100))
     except PermissionError as e:
         log(f'file_error {path}: {traceback.format_exc()}')
         end(q, identifier, 1)
@@ -987,8 +1468,11 @@ async def contents_of_directory(directory, prefix, executable, max_count):
         log(f'exception while getting contents of {directory}: {traceback.format_exc()}')
         return []
 
-async def handle_file_zip(q, identifier, path):
-    log(f'handle_file_zip {identifier} {path}')
+async def handle_file_zip(q, identifier, path, level=None):
+    """Zips a directory to a temporary file and sends its name. If level is given it is the
+    deflate level (0 stores files uncompressed) and a second line, "<raw bytes> <compressed
+    bytes>", follows the name."""
+    log(f'handle_file_zip {identifier} {path} {level}')
 
     if not os.path.isdir(path):
         log(f'{path} is not a directory')
@@ -998,7 +1482,10 @@ async def handle_file_zip(q, identifier, path):
         # Create a temporary file in the user's home directory
         temp_file = tempfile.NamedTemporaryFile(dir=os.path.expanduser("~"), prefix=".", delete=False)
         log(f'zip to {temp_file}')
-        ziph = zipfile.ZipFile(temp_file.name, 'w', zipfile.ZIP_DEFLATED)
+        if level == 0:
+            ziph = zipfile.ZipFile(temp_file.name, 'w', zipfile.ZIP_STORED)
+        else:
+            ziph = zipfile.ZipFile(temp_file.name, 'w', zipfile.ZIP_DEFLATED, compresslevel=level)
         log('Opened zip for writing')
     except Exception as e:
         file_error(q, identifier, e, "While creating a temporary file under your home directory")
@@ -1025,6 +1512,11 @@ async def handle_file_zip(q, identifier, path):
         ziph.close()
         log('send tempfile name')
         send_esc(q, temp_file.name)
+        if level is not None:
+            raw = sum(info.file_size for info in ziph.infolist())
+            compressed = sum(info.compress_size for info in ziph.infolist())
+            record_compression("zip", raw, compressed)
+            send_esc(q, f'{raw} {compressed}')
         end(q, identifier, 0)
 
 class Search:
@@ -1152,6 +1644,418 @@ async def handle_file_fetch(q, identifier, path, offset, size):
     except Exception as e:
         file_error(q, identifier, e, path)
 
+class FileStream:
+    """Sends part of a file as %notif stream notifications, one chunk at a time.
+
+    Each chunk is "%notif stream <id> <seq> <offset> <base64 data>". The last notification is
+    "%notif stream <id> eof <seq> <offset>" or "%notif stream <id> error <status>". Like Search,
+    at most window_size chunks are sent before the client acks them. To resume an interrupted
+    fetch, start a new stream at the offset after the last chunk received.
+
+    With a compression level, the chunks' data is one zlib stream that is sync-flushed after
+    each chunk, so every chunk can be inflated as soon as it arrives. Offsets still count
+    uncompressed bytes, and the eof notification adds "<raw bytes> <compressed bytes>"."""
+    def __init__(self, path, offset, size, level=None):
+        self.path = path
+        self.offset = offset
+        self.limit = None if size is None else offset + size
+        self.id = makeid()
+        self.seq = 0
+        self.canceled = False
+        self.compressor = None if level is None else zlib.compressobj(level)
+        self.raw = 0
+        self.compressed = 0
+        # Opened here so the start command can report errors.
+        self.fd = os.open(path, os.O_RDONLY)
+
+        # allow up to `window_size` unacknowledged chunks
+        self.window_size = FILE_STREAM_WINDOW
+        self.sema = asyncio.BoundedSemaphore(self.window_size)
+        self.task = asyncio.create_task(self.mainloop())
+
+    def emit(self, message):
+        q = lock()
+        send_esc(q, f'%notif stream {self.id} {message}')
+        unlock(q)
+
+    def ack(self, count):
+        # release up to `count` permits (never exceed window_size)
+        for _ in range(count):
+            try:
+                self.sema.release()
+            except ValueError:
+                break
+
+    def cancel(self):
+        # Stop at the next chunk rather than canceling the task so a read in progress
+        # finishes before the file is closed.
+        self.canceled = True
+        try:
+            self.sema.release()
+        except ValueError:
+            pass
+
+    def read_chunk(self, length):
+        """Returns (bytes read, payload to send). Runs in the executor."""
+        data = os.pread(self.fd, length, self.offset)
+        if not data or self.compressor is None:
+            return len(data), data
+        payload = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.raw += len(data)
+        self.compressed += len(payload)
+        return len(data), payload
+
+    async def mainloop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.canceled:
+                length = FILE_STREAM_CHUNK_SIZE
+                if self.limit is not None:
+                    length = min(length, self.limit - self.offset)
+                if length <= 0:
+                    break
+                await self.sema.acquire()
+                if self.canceled:
+                    break
+                count, payload = await loop.run_in_executor(None, self.read_chunk, length)
+                if not count:
+                    break
+                self.emit(f'{self.seq} {self.offset} {base64.b64encode(payload).decode("ascii")}')
+                self.seq += 1
+                self.offset += count
+            if not self.canceled:
+                if self.compressor is None:
+                    self.emit(f'eof {self.seq} {self.offset}')
+                else:
+                    self.emit(f'eof {self.seq} {self.offset} {self.raw} {self.compressed}')
+        except Exception as e:
+            log(f'[FileStream {self.id}] error: {traceback.format_exc()}')
+            self.emit(f'error {file_error_status(e)}')
+        finally:
+            os.close(self.fd)
+            FILE_STREAMS.pop(self.id, None)
+            if self.compressor is not None:
+                record_compression("fetch", self.raw, self.compressed)
+
+async def handle_file_stream(q, identifier, args):
+    """Operate on streaming fetches, which run in the background.
+
+    stream start <path> [<offset> [<size>]] [zlib=<level>]
+    stream ack <id> <count>
+    stream stop <id>
+    """
+    log(f'handle_file_stream {identifier} {args}')
+    operation = args[0] if args else None
+    if operation == "start":
+        path = None
+        try:
+            path = make_path(args[1])
+            numbers = [arg for arg in args[2:] if not arg.startswith("zlib=")]
+            offset = int(numbers[0]) if len(numbers) > 0 else 0
+            size = int(numbers[1]) if len(numbers) > 1 else None
+            stream = FileStream(path, offset, size, compression_level(args[2:]))
+        except Exception as e:
+            file_error(q, identifier, e, path)
+            return
+        FILE_STREAMS[stream.id] = stream
+        send_esc(q, stream.id)
+    elif operation == "ack":
+        try:
+            stream_id, count = args[1], int(args[2])
+        except (IndexError, ValueError):
+            end(q, identifier, 1)
+            return
+        stream = FILE_STREAMS.get(stream_id)
+        if stream:
+            stream.ack(count)
+    elif operation == "stop":
+        if len(args) < 2:
+            end(q, identifier, 1)
+            return
+        stream = FILE_STREAMS.get(args[1])
+        if stream:
+            stream.cancel()
+    else:
+        end(q, identifier, 1)
+        return
+    end(q, identifier, 0)
+
+class Upload:
+    """A file being uploaded in chunks, written straight to a temporary file beside it.
+
+    The temporary file's name comes from the destination and the expected SHA-256, so beginning
+    the same upload again, even from a new framer, resumes where it left off.
+
+    If compressed, each chunk's data (and each new-bytes delta op) is raw deflate data that
+    inflates on its own, as produced by a compressobj with wbits=-15 and a Z_FULL_FLUSH after
+    every chunk. That keeps resent and resumed chunks independent of each other.
+
+    Unless appending, commit renames the temporary file over the destination rather than
+    writing into it as `file create` does. The result is owned by the framer's user, keeps the
+    old file's mode, and is no longer the file that other hard links to the old one refer to.
+    A symlink is followed, so the file it points to is the one replaced."""
+    def __init__(self, path, size, digest, append, compressed=False):
+        self.path = path
+        self.size = size
+        self.digest = digest.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', self.digest):
+            raise ValueError(f'not a SHA-256 digest: {digest}')
+        self.append = append
+        self.compressed = compressed
+        self.id = makeid()
+        # The file to replace on commit, with symlinks resolved so the temporary file is created
+        # beside it and the rename replaces it rather than the link.
+        self.target = os.path.realpath(path)
+        directory, name = os.path.split(self.target)
+        self.temp = os.path.join(directory, f'.{name}.{self.digest[:16]}.upload')
+        self.fd = os.open(self.temp, os.O_RDWR | os.O_CREAT, 0o666)
+        self.received = os.fstat(self.fd).st_size
+        if self.received > size:
+            os.ftruncate(self.fd, 0)
+            self.received = 0
+        # SHA-256 of the first `hashed` bytes, or None if a chunk was rewritten.
+        self.hasher = hashlib.sha256()
+        self.hashed = 0
+        # Held while a command works on the upload, since writes run in the executor.
+        self.lock = asyncio.Lock()
+
+    def hash_file(self):
+        """Hashes the temporary file from where the hasher left off. Runs in the executor."""
+        if self.hasher is None:
+            self.hasher = hashlib.sha256()
+            self.hashed = 0
+        while self.hashed < self.received:
+            data = os.pread(self.fd, min(UPLOAD_HASH_BLOCK_SIZE, self.received - self.hashed), self.hashed)
+            if not data:
+                break
+            self.hasher.update(data)
+            self.hashed += len(data)
+
+    def write(self, offset, data):
+        """Writes a chunk. Chunks may be resent but must not leave a gap."""
+        if offset > self.received or offset + len(data) > self.size:
+            raise ValueError(f'chunk at {offset} of length {len(data)} is out of order or too long')
+        os.pwrite(self.fd, data, offset)
+        if self.hasher is not None and offset == self.hashed:
+            self.hasher.update(data)
+            self.hashed += len(data)
+        elif offset < self.hashed:
+            self.hasher = None
+        self.received = max(self.received, offset + len(data))
+
+    def payload(self, encoded):
+        """Yields the data in a base64 chunk a piece at a time, inflating it if compressed.
+
+        Small pieces keep the copies of unconsumed input short and let the event loop run
+        between them."""
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS) if self.compressed else None
+        compressed = 0
+        raw = 0
+        for start in range(0, len(encoded), UPLOAD_DECODE_BLOCK_SIZE):
+            data = base64.b64decode(encoded[start:start + UPLOAD_DECODE_BLOCK_SIZE])
+            if inflater is None:
+                yield data
+                continue
+            compressed += len(data)
+            while data:
+                piece = inflater.decompress(data, UPLOAD_HASH_BLOCK_SIZE)
+                data = inflater.unconsumed_tail
+                raw += len(piece)
+                yield piece
+        if inflater is not None:
+            piece = inflater.flush()
+            raw += len(piece)
+            yield piece
+            record_compression("upload", raw, compressed)
+
+    def write_payload(self, offset, encoded):
+        """Writes a base64 chunk at offset. Returns the offset after it."""
+        for piece in self.payload(encoded):
+            self.write(offset, piece)
+            offset += len(piece)
+        return offset
+
+    def apply_delta(self, offset, ops):
+        """Writes a delta starting at offset. Runs in the executor.
+
+        Each op is "<source offset>:<length>", which copies bytes the destination already has, or
+        "+<base64>", which writes new bytes."""
+        with contextlib.ExitStack() as stack:
+            basis = None
+            for op in ops:
+                if op.startswith("+"):
+                    offset = self.write_payload(offset, op[1:])
+                    continue
+                if basis is None:
+                    basis = stack.enter_context(open(self.path, "rb"))
+                source, length = (int(value) for value in op.split(":"))
+                basis.seek(source)
+                while length > 0:
+                    data = basis.read(min(length, UPLOAD_HASH_BLOCK_SIZE))
+                    if not data:
+                        raise ValueError(f'copy from {source} runs past the end of {self.path}')
+                    self.write(offset, data)
+                    offset += len(data)
+                    length -= len(data)
+
+    def copy_to_destination(self):
+        """Appends the temporary file to the destination. Runs in the executor."""
+        with open(self.path, "ab") as f:
+            offset = 0
+            while offset < self.received:
+                data = os.pread(self.fd, UPLOAD_HASH_BLOCK_SIZE, offset)
+                if not data:
+                    break
+                f.write(data)
+                offset += len(data)
+
+    async def commit(self):
+        """Checks the size and hash, then moves the data into place. Returns a status."""
+        loop = asyncio.get_running_loop()
+        if self.received != self.size:
+            return UPLOAD_INCOMPLETE
+        if self.hasher is None or self.hashed != self.received:
+            await loop.run_in_executor(None, self.hash_file)
+        if self.hasher.hexdigest() != self.digest:
+            self.abort()
+            return UPLOAD_CORRUPT
+        await loop.run_in_executor(None, os.fsync, self.fd)
+        if self.append:
+            await loop.run_in_executor(None, self.copy_to_destination)
+            self.abort()
+            return 0
+        self.close()
+        try:
+            # Keep the mode of a file being replaced, as writing it in place would.
+            os.chmod(self.temp, stat.S_IMODE(os.stat(self.target).st_mode))
+        except OSError:
+            pass
+        os.replace(self.temp, self.target)
+        return 0
+
+    def close(self):
+        """Closes the temporary file, keeping it so the upload can be resumed."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def abort(self):
+        self.close()
+        try:
+            os.unlink(self.temp)
+        except OSError:
+            pass
+
+async def handle_file_upload(q, identifier, args):
+    """Operate on chunked uploads.
+
+    upload begin <path> <size> <sha256 hex> [append] [zlib]
+                                                        replies with the id and the offset to resume at
+    upload chunk <id> <offset> <base64 data>
+    upload delta <id> <offset> <op>...                  applies ops from a `file signature` match
+    upload commit <id>                                  replies like `file create`; an incomplete
+                                                        upload can be continued afterwards
+    upload abort <id>
+    """
+    log(f'handle_file_upload {identifier} {args[:3]}')
+    operation = args[0]
+    if operation == "begin":
+        path = make_path(args[1])
+        try:
+            upload = Upload(path, int(args[2]), args[3], "append" in args[4:], "zlib" in args[4:])
+            await asyncio.get_running_loop().run_in_executor(None, upload.hash_file)
+        except Exception as e:
+            file_error(q, identifier, e, path)
+            return
+        for other in list(UPLOADS.values()):
+            if other.temp == upload.temp:
+                other.close()
+                del UPLOADS[other.id]
+        UPLOADS[upload.id] = upload
+        send_esc(q, f'{upload.id} {upload.received}')
+        end(q, identifier, 0)
+        return
+    upload = UPLOADS.get(args[1]) if len(args) > 1 else None
+    if upload is None:
+        end(q, identifier, 1)
+        return
+    async with upload.lock:
+        if UPLOADS.get(upload.id) is not upload:
+            # Committed or aborted while this command waited.
+            end(q, identifier, 1)
+            return
+        try:
+            if operation == "chunk":
+                await asyncio.get_running_loop().run_in_executor(
+                    None, upload.write_payload, int(args[2]), "".join(args[3:]))
+                end(q, identifier, 0)
+            elif operation == "delta":
+                await asyncio.get_running_loop().run_in_executor(
+                    None, upload.apply_delta, int(args[2]), args[3:])
+                end(q, identifier, 0)
+            elif operation == "commit":
+                status = await upload.commit()
+                # An incomplete upload stays open for more chunks.
+                if status != UPLOAD_INCOMPLETE:
+                    del UPLOADS[upload.id]
+                if status == 0:
+                    send_remote_file(q, upload.path)
+                end(q, identifier, status)
+            elif operation == "abort":
+                del UPLOADS[upload.id]
+                upload.abort()
+                end(q, identifier, 0)
+            else:
+                end(q, identifier, 1)
+        except Exception as e:
+            if operation == "commit":
+                upload.close()
+                UPLOADS.pop(upload.id, None)
+            file_error(q, identifier, e, upload.path)
+
+def signature_block_size(size):
+    """Picks a block size near the square root of the file size, as rsync does."""
+    block_size = -(-int(size ** 0.5) // 1024) * 1024
+    return min(max(block_size, SIGNATURE_MIN_BLOCK_SIZE), SIGNATURE_MAX_BLOCK_SIZE)
+
+def file_signature(path, block_size):
+    """Returns (block size, file size, signature lines) for `file signature`. Runs in the executor."""
+    lines = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if block_size is None:
+            block_size = signature_block_size(size)
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines.append(f'{zlib.adler32(block):08x} {hashlib.blake2b(block, digest_size=16).hexdigest()}')
+    return block_size, size, lines
+
+async def handle_file_signature(q, identifier, path, block_size):
+    """Sends "<block size> <file size>" and then "<adler32> <blake2b-128>" in hex for each block.
+
+    Adler-32 is the standard checksum, which the client can roll over its copy of the file to
+    find blocks the remote file already has. It then sends the new contents as an upload whose
+    `upload delta` ops copy those blocks instead of resending them.
+
+    A block size the client asks for must be positive and at most SIGNATURE_MAX_BLOCK_SIZE."""
+    log(f'handle_file_signature {identifier} {path} {block_size}')
+    try:
+        if block_size is not None:
+            block_size = int(block_size)
+            if not 0 < block_size <= SIGNATURE_MAX_BLOCK_SIZE:
+                raise ValueError(f'block size {block_size} is out of range')
+        block_size, size, lines = await asyncio.get_running_loop().run_in_executor(
+            None, file_signature, path, block_size)
+    except Exception as e:
+        file_error(q, identifier, e, path)
+        return
+    send_esc(q, f'{block_size} {size}')
+    for line in lines:
+        send_esc(q, line)
+    end(q, identifier, 0)
+
 async def handle_file_rm(q, identifier, path, recursive):
     log(f'handle_file_rm {identifier} {path} {recursive}')
     try:
@@ -1201,7 +2105,7 @@ async def handle_file_create(q, identifier, path, content):
         send_remote_file(q, path)
         end(q, identifier, 0)
     except Exception as e:
-        file_error(identifier, e, path)
+        file_error(q, identifier, e, path)
 
 async def handle_file_append(q, identifier, path, content):
     log(f'handle_file_append {identifier} {path} length={len(content)} bytes')
@@ -1284,22 +2188,55 @@ async def handle_deregister(identifier, args):
     end(q,identifier, 0)
     await deregister(pid)
 
+def set_poll_options(args):
+    """Applies options given to poll and autopoll. "percore" adds per-core CPU utilization,
+    "resources" adds per-process resource usage, and min=<seconds> and max=<seconds> bound the
+    delay between autopolls."""
+    global CPU_PER_CORE
+    global RESOURCES
+    global AUTOPOLL_MIN_DELAY
+    global AUTOPOLL_MAX_DELAY
+    if "percore" in args:
+        CPU_PER_CORE = True
+    if "resources" in args:
+        RESOURCES = True
+    bounds = {"min": AUTOPOLL_MIN_DELAY, "max": AUTOPOLL_MAX_DELAY}
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep or key not in bounds:
+            continue
+        try:
+            bounds[key] = float(value)
+        except ValueError:
+            log(f'set_poll_options: ignoring {arg}')
+    if 0 < bounds["min"] <= bounds["max"]:
+        AUTOPOLL_MIN_DELAY = bounds["min"]
+        AUTOPOLL_MAX_DELAY = bounds["max"]
+        if AUTOPOLL_EVENT is not None:
+            AUTOPOLL_EVENT.set()
+    else:
+        log(f'set_poll_options: ignoring invalid bounds {bounds}')
+
 async def handle_autopoll(identifier, args):
     log(f'handle_autopoll({identifier}, {args})')
+    set_poll_options(args)
     q = begin(identifier)
     end(q,identifier, 0)
     global AUTOPOLL
     if AUTOPOLL:
         return
     AUTOPOLL = 1
+    if AUTOPOLL_EVENT is not None:
+        AUTOPOLL_EVENT.set()
 
     global AUTOPOLL_TASK
     if AUTOPOLL_TASK is not None:
         return
-    AUTOPOLL_TASK = asyncio.create_task(autopoll(1.0))
+    AUTOPOLL_TASK = asyncio.create_task(autopoll())
 
 async def handle_poll(identifier, args):
     log(f'handle_poll({identifier}, {args})')
+    set_poll_options(args)
     output = await poll()
     log(f'handle_poll({identifier}, {args}): read {len(output)} categories of output')
     q = begin(identifier)
@@ -1351,6 +2288,19 @@ async def handle_kill(identifier, args):
     end(q,identifier, 0)
     return False
 
+async def handle_stats(identifier, args):
+    """Reports WRITE_STATS and COMPRESSION_STATS as JSON. Pass "reset" to zero the counters
+    afterwards."""
+    q = begin(identifier)
+    send_esc(q, json.dumps(dict(WRITE_STATS, compression=COMPRESSION_STATS)))
+    end(q, identifier, 0)
+    if args and args[0] == "reset":
+        for key in WRITE_STATS:
+            WRITE_STATS[key] = 0
+        for counts in COMPRESSION_STATS.values():
+            counts["raw"] = 0
+            counts["compressed"] = 0
+
 async def handle_quit(identifier, args):
     q = begin(identifier)
     end(q,identifier, 0)
@@ -1373,20 +2323,99 @@ async def start_process(args):
     PROCESSES[runid] = proc
     return runid
 
+class OutputCoalescer:
+    """Merges a process's output into as few %output frames as possible.
+
+    The first output after a quiet period is sent right away so echo stays
+    responsive. Output arriving within OUTPUT_COALESCE_DELAY of the previous
+    frame is held and sent as one frame when the delay ends, or sooner if
+    READ_SIZE_MAX bytes pile up.
+
+    TTY modes are checked when output starts and once more after it has been
+    quiet for TTY_SETTLE_DELAY, since programs change modes around their
+    output (e.g., before prompting for a password). Checking on every read
+    costs a tcgetattr per chunk."""
+    def __init__(self, proc, islogin):
+        self.proc = proc
+        self.islogin = islogin
+        # [channel, bytearray] in the order the output arrived.
+        self.pending = []
+        self.pending_size = 0
+        self.last_frame = 0
+        self.flush_handle = None
+        self.settle_handle = None
+        self.frames_since_tty_check = 0
+
+    def add(self, channel, value):
+        # Output often means a job started or finished.
+        wake_autopoll()
+        if self.pending and self.pending[-1][0] == channel:
+            self.pending[-1][1].extend(value)
+        else:
+            self.pending.append([channel, bytearray(value)])
+        self.pending_size += len(value)
+        if self.flush_handle is not None:
+            if self.pending_size >= READ_SIZE_MAX:
+                self.flush()
+            return
+        delay = self.last_frame + OUTPUT_COALESCE_DELAY - time.monotonic()
+        if delay <= 0:
+            self.flush()
+        else:
+            self.flush_handle = asyncio.get_event_loop().call_later(delay, self.flush)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+        self.pending_size = 0
+        for channel, data in pending:
+            print_output(makeid(), self.proc.pid, channel, self.islogin, bytes(data))
+        self.last_frame = time.monotonic()
+
+        if self.settle_handle is None:
+            self.check_tty()
+        else:
+            self.settle_handle.cancel()
+            self.frames_since_tty_check += 1
+        self.settle_handle = asyncio.get_event_loop().call_later(TTY_SETTLE_DELAY, self.settle)
+
+    def settle(self):
+        self.settle_handle = None
+        if self.frames_since_tty_check:
+            self.check_tty()
+
+    def check_tty(self):
+        self.frames_since_tty_check = 0
+        log("OutputCoalescer: poll tty")
+        try:
+            poll_tty(self.proc)
+        except Exception as e:
+            log(f'OutputCoalescer->poll_tty threw {e}: {traceback.format_exc()}')
+
+    def close(self):
+        """Sends pending output and stops timers."""
+        self.flush()
+        if self.settle_handle is not None:
+            self.settle_handle.cancel()
+            self.settle_handle = None
+
 def make_monitor_process(proc, islogin):
+    coalescer = OutputCoalescer(proc, islogin)
     def monitor_process(channel, value):
         log(f'monitor_process called with channel={channel} islogin={islogin} value={value}')
         if len(value) == 0:
+            # Output must precede %terminate.
+            coalescer.close()
             global COMPLETED
             log(f'add {proc.pid} to list of completed PIDs')
             COMPLETED.append(proc.pid)
             return cleanup()
-        print_output(makeid(), proc.pid, channel, islogin, value)
-        log("make_monitor_process: poll")
-        try:
-            poll_tty(proc)
-        except Exception as e:
-            log(f'make_monitor_process->poll_tty threw {e}: {traceback.format_exc()}')
+        coalescer.add(channel, value)
         return None
     return monitor_process
 
@@ -1442,6 +2471,7 @@ async def cleanup():
         q = lock()
         send_esc(q, f'%terminate {proc.pid} {proc.return_code}')
         unlock(q)
+        wake_autopoll()
 
 async def handle(args):
     log(f'handle {args}')
@@ -1575,7 +2605,8 @@ HANDLERS = {
     "file": handle_file,
     "eval": handle_eval,
     "getenv": handle_getenv,
-    "runpy": handle_runpy
+    "runpy": handle_runpy,
+    "stats": handle_stats
 }
 
 def main():
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Measures Selection.async_get_string on a large box selection.
+
+The selection is a box spanning many lines plus a character selection
+elsewhere, so it goes through Selection.async_enumerate_ranges rather than
+the single-sub-selection fast path. iTerm2 is simulated by the fake
+connection used by the tests, so the numbers measure client-side work and
+the number of round trips, not iTerm2's latency.
+
+Run from api/library/python/iterm2:
+
+    python3 benchmarks/selection_benchmark.py [number of lines]
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import iterm2.selection
+import iterm2.util
+from tests.fakes import FakeBuffer, FakeConnection
+
+WIDTH = 80
+
+
+def make_selection(lines):
+    """A box from columns 10-39 over `lines` lines plus a line selection."""
+    box = iterm2.selection.SubSelection(
+        iterm2.util.WindowedCoordRange(
+            iterm2.util.CoordRange(
+                iterm2.util.Point(10, 0),
+                iterm2.util.Point(40, lines - 1)),
+            iterm2.util.Range(10, 30)),
+        iterm2.selection.SelectionMode.BOX,
+        False)
+    tail = iterm2.selection.SubSelection(
+        iterm2.util.WindowedCoordRange(
+            iterm2.util.CoordRange(
+                iterm2.util.Point(0, lines + 1),
+                iterm2.util.Point(20, lines + 1))),
+        iterm2.selection.SelectionMode.CHARACTER,
+        False)
+    return iterm2.selection.Selection([box, tail])
+
+
+def main():
+    """Runs the benchmark and prints a summary."""
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    buffer = FakeBuffer(
+        ["{:08d} ".format(i) + "x" * (WIDTH - 9) for i in range(lines + 2)])
+    connection = FakeConnection(buffer.respond)
+    selection = make_selection(lines)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    text = asyncio.run(
+        selection.async_get_string(connection, "session", WIDTH))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("lines selected:   {}".format(lines))
+    print("characters:       {}".format(len(text)))
+    print("round trips:      {}".format(len(connection.requests)))
+    print("max in flight:    {}".format(connection.max_in_flight))
+    print("elapsed:          {:.2f}s".format(elapsed))
+    print("peak traced heap: {:.1f} MiB".format(peak / 1048576))
+
+
+if __name__ == "__main__":
+    main()
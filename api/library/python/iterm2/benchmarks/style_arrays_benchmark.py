@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Compares finding styled cells with LineContents.style_at and with
+ScreenContents.to_arrays.
+
+Each run builds a buffer of 80-column lines split into a number of style runs
+and counts the bold cells with standard foreground color 1.
+
+Run from api/library/python/iterm2 with NumPy installed:
+
+    python3 benchmarks/style_arrays_benchmark.py [number of lines]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import iterm2.api_pb2
+import iterm2.screen
+
+COLUMNS = 80
+
+
+def make_contents(lines, runs_per_line):
+    """Returns ScreenContents with the given number of runs per line."""
+    proto = iterm2.api_pb2.GetBufferResponse()
+    for _ in range(lines):
+        line = proto.contents.add()
+        for i in range(runs_per_line):
+            style = line.style.add()
+            style.repeats = COLUMNS // runs_per_line
+            style.fgStandard = i % 8
+            style.bold = i % 2 == 0
+    return iterm2.screen.ScreenContents(proto)
+
+
+def count_with_style_at(contents):
+    """Counts matching cells one CellStyle at a time."""
+    count = 0
+    for i in range(contents.number_of_lines):
+        line = contents.line(i)
+        for x in range(COLUMNS):
+            style = line.style_at(x)
+            if style is None:
+                break
+            color = style.fg_color
+            if color.is_standard and color.standard == 1 and style.bold:
+                count += 1
+    return count
+
+
+def count_with_arrays(contents):
+    """Counts matching cells with NumPy."""
+    cells = contents.to_arrays().cells
+    kind = iterm2.screen.StyleArrays.ColorKind.STANDARD
+    bold = iterm2.screen.StyleArrays.Flag.BOLD
+    return int(((cells["fg_kind"] == kind) &
+                (cells["fg"] == 1) &
+                (cells["flags"] & bold != 0)).sum())
+
+
+def timed(function, contents):
+    """Returns the result of function(contents) and the seconds it took."""
+    start = time.perf_counter()
+    result = function(contents)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Runs the benchmark and prints a table."""
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print("{:>14} {:>12} {:>12}".format("runs per line", "style_at", "to_arrays"))
+    for runs_per_line in (1, 3, 10, 40):
+        contents = make_contents(lines, runs_per_line)
+        expected, slow = timed(count_with_style_at, contents)
+        actual, fast = timed(count_with_arrays, contents)
+        assert expected == actual
+        print("{:>14} {:>11.3f}s {:>11.3f}s".format(runs_per_line, slow, fast))
+
+
+if __name__ == "__main__":
+    main()
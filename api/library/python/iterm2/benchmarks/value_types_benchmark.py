@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Measures the memory and construction time of small value types.
+
+Scripts that walk large buffers or selections create these objects by the
+million, so their per-instance size matters.
+
+Run from api/library/python/iterm2:
+
+    python3 benchmarks/value_types_benchmark.py [number of objects]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import iterm2.api_pb2
+import iterm2.screen
+import iterm2.session
+import iterm2.util
+
+STYLE = iterm2.api_pb2.CellStyle()
+
+
+def make_factories():
+    """Returns (name, zero-argument constructor) pairs."""
+    util = iterm2.util
+    return [
+        ("Point", lambda: util.Point(1, 2)),
+        ("Size", lambda: util.Size(80, 24)),
+        ("Range", lambda: util.Range(3, 4)),
+        ("CoordRange", lambda: util.CoordRange(
+            util.Point(0, 1), util.Point(2, 3))),
+        ("WindowedCoordRange", lambda: util.WindowedCoordRange(
+            util.CoordRange(util.Point(0, 1), util.Point(2, 3)),
+            util.Range(0, 2))),
+        ("Frame", lambda: util.Frame(util.Point(0, 0), util.Size(1, 1))),
+        ("CellStyle", lambda: iterm2.screen.CellStyle(STYLE)),
+        ("CellStyle.Color", lambda: iterm2.screen.CellStyle.Color(standard=1)),
+        ("SessionLineInfo", lambda: iterm2.session.SessionLineInfo(
+            (24, 1000, 0, 1000))),
+    ]
+
+
+def measure(factory, count):
+    """Returns bytes per object, allocations per object, and seconds."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    objects = [factory() for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    after, _ = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    del objects
+    return (after - before) / count, blocks / count, elapsed
+
+
+def main():
+    """Runs the benchmark and prints a table."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print("{:<20} {:>12} {:>12} {:>10}".format(
+        "type", "bytes/obj", "blocks/obj", "seconds"))
+    for name, factory in make_factories():
+        size, blocks, elapsed = measure(factory, count)
+        print("{:<20} {:>12.1f} {:>12.2f} {:>10.2f}".format(
+            name, size, blocks, elapsed))
+
+
+if __name__ == "__main__":
+    main()
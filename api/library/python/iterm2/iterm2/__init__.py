@@ -20,7 +20,7 @@ from iterm2.colorpresets import (
 
 from iterm2.connection import Connection, run_until_complete, run_forever, add_disconnect_callback
 
-from iterm2.customcontrol import CustomControlSequenceMonitor
+from iterm2.customcontrol import CustomControlSequenceMonitor, CustomControlSequenceRouter
 
 from iterm2.filepanel import OpenPanel, SavePanel
 
@@ -33,11 +33,13 @@ from iterm2.lifecycle import (
     EachSessionOnceMonitor, SessionTerminationMonitor, LayoutChangeMonitor,
     NewSessionMonitor)
 
+from iterm2.monitor import OverflowPolicy, MonitorQueue, BoundedMonitor
+
 from iterm2.mainmenu import MenuItemState, MainMenu, MenuItemException, MenuItemIdentifier
 
 from iterm2.keyboard import (
     Modifier, Keycode, Keystroke, KeystrokePattern, KeystrokeMonitor,
-    KeystrokeFilter)
+    KeystrokeFilter, KeySequenceMatcher)
 
 from iterm2.preferences import PreferenceKey, async_get_preference, async_set_preference
 
@@ -48,12 +50,13 @@ from iterm2.profile import (
     TitleComponents, WriteOnlyProfile)
 
 from iterm2.prompt import (
-    Prompt, PromptMonitor, PromptState, async_get_last_prompt,
-    async_list_prompts, async_get_prompt_by_id)
+    Prompt, PromptMonitor, PromptState, OutputChunk, async_get_last_prompt,
+    async_list_prompts, async_get_prompt_by_id, async_get_prompts)
 
-from iterm2.registration import RPC, ContextMenuProviderRPC, TitleProviderRPC, StatusBarRPC, Reference
+from iterm2.registration import RPC, ContextMenuProviderRPC, TitleProviderRPC, StatusBarRPC, Reference, RPCProcessPool
+from iterm2.recorder import RotatingGzipWriter, SessionRecorder
 
-from iterm2.screen import ScreenStreamer, LineContents, ScreenContents
+from iterm2.screen import ScreenStreamer, LineContents, ScreenContents, ScreenContentsCache, StyleArrays
 
 from iterm2.selection import SelectionMode, SubSelection, Selection
 
@@ -84,8 +87,12 @@ from iterm2.window import (
     CreateTabException, CreateWindowException, SetPropertyException,
     GetPropertyException, Window)
 
+from iterm2.workspace import (
+    PaneSpec, SplitSpec, TabSpec, WindowSpec, Workspace, WorkspaceSpec,
+    WorkspaceStep)
+
 from iterm2._version import __version__
 
 from iterm2.rpc import RPCException
 
-from iterm2.variables import VariableMonitor, VariableScopes
+from iterm2.variables import VariableMonitor, MultiVariableMonitor, VariableScopes
@@ -3,17 +3,21 @@
 This module is the starting point for getting access to windows and other
 application-global data.
 """
+import asyncio
 import json
 import typing
 
+import iterm2.api_pb2
 import iterm2.broadcast
 import iterm2.capabilities
 import iterm2.connection
 import iterm2.notifications
 import iterm2.rpc
+import iterm2.screen
 import iterm2.session
 import iterm2.tab
 import iterm2.tmux
+import iterm2.transaction
 import iterm2.window
 
 
@@ -103,6 +107,15 @@ class App(
         self.app_active = None
         self.current_terminal_window_id = None
 
+        # Focus changes are numbered as they arrive. A window's selected tab
+        # is its tab that was most recently selected, and likewise for a
+        # tab's active session. This lets layout changes be resolved without
+        # asking iTerm2 for the focus state again, even when a focus
+        # notification arrives before the layout change that explains it.
+        self.__focus_sequence_number = 0
+        self.__tab_selection_order: typing.Dict[str, int] = {}
+        self.__session_activation_order: typing.Dict[str, int] = {}
+
     async def async_activate(
             self,
             raise_all_windows: bool = True,
@@ -188,10 +201,84 @@ class App(
         return None
 
     async def async_refresh_focus(self) -> None:
-        """Updates state about which objects have focus."""
+        """Updates state about which objects have focus.
+
+        You generally don't need to call this because focus changes are
+        tracked from notifications.
+        """
         focus_info = await iterm2.rpc.async_get_focus_info(self.connection)
         for notif in focus_info.focus_response.notifications:
-            await self._async_focus_change(self.connection, notif)
+            self._record_focus_change(notif)
+        self._apply_focus()
+
+    def _record_focus_change(self, sub_notif) -> None:
+        """Updates the record of what is in focus."""
+        if sub_notif.HasField("application_active"):
+            self.app_active = sub_notif.application_active
+        elif sub_notif.HasField("window"):
+            # Ignore window resigned key notifications because we track the
+            # current terminal.
+            # pylint: disable=no-member
+            if (sub_notif.window.window_status !=
+                    iterm2.api_pb2.FocusChangedNotification.Window.
+                    WindowStatus.Value(
+                        "TERMINAL_WINDOW_RESIGNED_KEY")):
+                self.current_terminal_window_id = sub_notif.window.window_id
+        elif sub_notif.HasField("selected_tab"):
+            self.__focus_sequence_number += 1
+            self.__tab_selection_order[sub_notif.selected_tab] = (
+                self.__focus_sequence_number)
+            window = self.get_window_for_tab(sub_notif.selected_tab)
+            if window is not None:
+                window.selected_tab_id = sub_notif.selected_tab
+        elif sub_notif.HasField("session"):
+            self.__focus_sequence_number += 1
+            self.__session_activation_order[sub_notif.session] = (
+                self.__focus_sequence_number)
+            session = self.get_session_by_id(sub_notif.session)
+            _window, tab = self.get_window_and_tab_for_session(session)
+            if tab is not None:
+                tab.active_session_id = sub_notif.session
+
+    def _apply_focus(self) -> bool:
+        """Sets each window's selected tab and each tab's active session from
+        the recorded focus changes. Records for tabs and sessions that no
+        longer exist are discarded.
+
+        :returns: False if some window or tab has never had a focus change
+            recorded.
+        """
+        complete = True
+        tab_selection_order = {}
+        session_activation_order = {}
+        for window in self.terminal_windows:
+            selected = None
+            for tab in window.tabs:
+                order = self.__tab_selection_order.get(tab.tab_id)
+                if order is not None:
+                    tab_selection_order[tab.tab_id] = order
+                    if selected is None or order > selected[0]:
+                        selected = (order, tab.tab_id)
+
+                active = None
+                for session in tab.all_sessions:
+                    order = self.__session_activation_order.get(
+                        session.session_id)
+                    if order is not None:
+                        session_activation_order[session.session_id] = order
+                        if active is None or order > active[0]:
+                            active = (order, session.session_id)
+                if active is None:
+                    complete = False
+                else:
+                    tab.active_session_id = active[1]
+            if selected is None:
+                complete = False
+            else:
+                window.selected_tab_id = selected[1]
+        self.__tab_selection_order = tab_selection_order
+        self.__session_activation_order = session_activation_order
+        return complete
 
     async def async_refresh_broadcast_domains(self) -> None:
         """
@@ -255,13 +342,68 @@ class App(
                     return window
         return None
 
+    async def async_snapshot_screens(
+            self,
+            sessions: typing.Optional[typing.Iterable[
+                typing.Union[str, iterm2.session.Session]]] = None,
+            styles: bool = False) -> typing.Dict[
+                str, iterm2.screen.ScreenContents]:
+        """Gets what many sessions are showing at a single moment.
+
+        The requests for all sessions are sent without waiting for each other
+        inside one :class:`~iterm2.Transaction`, so the snapshot is
+        consistent and takes about one round trip regardless of how many
+        sessions there are.
+
+        :param sessions: The sessions to capture, as :class:`Session` objects
+            or session IDs. Defaults to every session in every terminal
+            window, including minimized ones.
+        :param styles: If `True`, include style information.
+
+        :returns: A dictionary from session ID to
+            :class:`~iterm2.ScreenContents`. Sessions that no longer exist are
+            left out.
+
+        :throws: :class:`~iterm2.rpc.RPCException` if something goes wrong.
+        """
+        if sessions is None:
+            session_ids = [
+                session.session_id
+                for window in self.terminal_windows
+                for tab in window.tabs
+                for session in tab.all_sessions]
+        else:
+            session_ids = [
+                session if isinstance(session, str) else session.session_id
+                for session in sessions]
+
+        async with iterm2.transaction.Transaction(self.connection):
+            results = await asyncio.gather(*[
+                iterm2.rpc.async_get_screen_contents(
+                    self.connection, session_id, None, styles)
+                for session_id in session_ids])
+
+        # pylint: disable=no-member
+        status_values = iterm2.api_pb2.GetBufferResponse.Status
+        snapshot = {}
+        for session_id, result in zip(session_ids, results):
+            status = result.get_buffer_response.status
+            if status == status_values.Value("SESSION_NOT_FOUND"):
+                continue
+            if status != status_values.Value("OK"):
+                raise iterm2.rpc.RPCException(status_values.Name(status))
+            snapshot[session_id] = iterm2.screen.ScreenContents(
+                result.get_buffer_response)
+        return snapshot
+
     async def async_refresh(
             self,
             _connection: typing.Optional[iterm2.connection.Connection] = None,
             _sub_notif: typing.Any = None) -> None:
         """Reloads the hierarchy.
 
-        Note that this calls :meth:`async_refresh_focus`.
+        Note that this calls :meth:`async_refresh_focus` if a window or tab
+        appeared without a focus notification describing it.
 
         Note: Do not use the _connection argument. It is only there to satisfy
         the expected interface for a notification callback. This is often
@@ -359,35 +501,19 @@ class App(
         self.__buried_sessions = list(
             map(get_buried_session, list_sessions_response.buried_sessions))
         self.__terminal_windows = windows
-        await self.async_refresh_focus()
+        # Focus notifications normally describe every new window and tab.
+        # Ask iTerm2 only if one was missed.
+        if not self._apply_focus():
+            await self.async_refresh_focus()
     # pylint: enable=too-many-locals
 
     async def _async_focus_change(self, _connection, sub_notif):
-        """Updates the record of what is in focus."""
-        if sub_notif.HasField("application_active"):
-            self.app_active = sub_notif.application_active
-        elif sub_notif.HasField("window"):
-            # Ignore window resigned key notifications because we track the
-            # current terminal.
-            # pylint: disable=no-member
-            if (sub_notif.window.window_status !=
-                    iterm2.api_pb2.FocusChangedNotification.Window.
-                    WindowStatus.Value(
-                        "TERMINAL_WINDOW_RESIGNED_KEY")):
-                self.current_terminal_window_id = sub_notif.window.window_id
-        elif sub_notif.HasField("selected_tab"):
-            window = self.get_window_for_tab(sub_notif.selected_tab)
-            if window is None:
-                await self.async_refresh()
-            else:
-                window.selected_tab_id = sub_notif.selected_tab
-        elif sub_notif.HasField("session"):
-            session = self.get_session_by_id(sub_notif.session)
-            window, tab = self.get_tab_and_window_for_session(session)
-            if tab is None:
-                await self.async_refresh()
-            else:
-                tab.active_session_id = sub_notif.session
+        """Updates the record of what is in focus.
+
+        A notification about a tab or session that isn't known yet is
+        recorded and takes effect with the layout change that adds it.
+        """
+        self._record_focus_change(sub_notif)
 
     async def _async_broadcast_domains_change(self, _connection, sub_notif):
         """Updates the current set of broadcast domains."""
@@ -1,13 +1,13 @@
 """Enables defining a custom control sequence."""
-import asyncio
 import re
 import typing
 
 import iterm2.connection
+import iterm2.monitor
 import iterm2.notifications
 
 
-class CustomControlSequenceMonitor:
+class CustomControlSequenceMonitor(iterm2.monitor.BoundedMonitor):
     """Registers a handler for a custom control sequence.
 
     :param connection: The connection to iTerm2.
@@ -18,6 +18,10 @@ class CustomControlSequenceMonitor:
         If it matches, the resulting `re.Match` is returned from `async_get()`.
     :param session_id: The session ID to monitor, or `None` to mean monitor all
         sessions (including those not yet created).
+    :param maxsize: The maximum number of undelivered matches to buffer, or
+        `None` for no limit.
+    :param overflow: What to do when the buffer is full. See
+        :class:`~iterm2.OverflowPolicy`.
 
     .. seealso:: Example ":ref:`create_window_example`"
 
@@ -38,13 +42,16 @@ class CustomControlSequenceMonitor:
             connection: iterm2.connection.Connection,
             identity: str,
             regex: str,
-            session_id: typing.Optional[str] = None):
+            session_id: typing.Optional[str] = None,
+            maxsize: typing.Optional[int] = iterm2.monitor.DEFAULT_MAXSIZE,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow)
         self.__connection = connection
         self.__regex = regex
         self.__identity = identity
         self.__session_id = session_id
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
 
     async def __aenter__(self):
         async def internal_callback(_connection, notification):
@@ -53,7 +60,7 @@ class CustomControlSequenceMonitor:
             match = re.search(self.__regex, notification.payload)
             if not match:
                 return
-            await self.__queue.put(match)
+            await self._queue.async_put(match)
 
         self.__token = await (
             iterm2.notifications.
@@ -71,7 +78,200 @@ class CustomControlSequenceMonitor:
             payload with the regular expression this object was initialized
             with.
         """
-        return await self.__queue.get()
+        return await super().async_get()
+
+    async def __aexit__(self, exc_type, exc, _tb):
+        try:
+            await iterm2.notifications.async_unsubscribe(
+                self.__connection,
+                self.__token)
+        except iterm2.notifications.SubscriptionException:
+            pass
+
+
+class _Route:
+    """One route registered with a :class:`CustomControlSequenceRouter`."""
+    def __init__(self, order, regex, handler):
+        self.order = order
+        self.regex = regex
+        self.handler = handler
+        self.group_name = "_route{}".format(order)
+
+    @property
+    def combinable(self) -> bool:
+        """Whether the pattern can be embedded in a combined alternation.
+
+        Named groups could collide with another route's, numbered
+        backreferences would refer to the wrong group, and flags other than
+        the default can't be applied to part of a pattern portably.
+        """
+        return (not self.regex.groupindex and
+                self.regex.flags == re.UNICODE and
+                not re.search(r"\\[1-9]", self.regex.pattern))
+
+
+class _RouteTable:
+    """The routes for one sender identity."""
+    def __init__(self):
+        self.routes: typing.List[_Route] = []
+        self.__combined = None
+        self.__combined_routes = {}
+        self.__individual_routes = []
+        self.__dirty = True
+
+    def add(self, route: _Route):
+        self.routes.append(route)
+        self.__dirty = True
+
+    def remove(self, route: _Route):
+        self.routes.remove(route)
+        self.__dirty = True
+
+    def __compile(self):
+        combinable = [route for route in self.routes if route.combinable]
+        self.__individual_routes = [
+            route for route in self.routes if not route.combinable]
+        self.__combined_routes = {
+            route.group_name: route for route in combinable}
+        self.__combined = None
+        if combinable:
+            self.__combined = re.compile("|".join(
+                "(?P<{}>{})".format(route.group_name, route.regex.pattern)
+                for route in combinable))
+        self.__dirty = False
+
+    def search(
+            self,
+            payload: str) -> typing.Optional[typing.Tuple[_Route, typing.Match]]:
+        """Finds the route whose pattern matches earliest in the payload.
+
+        Ties go to the route registered first.
+        """
+        if self.__dirty:
+            self.__compile()
+        best = None
+        if self.__combined is not None:
+            combined_match = self.__combined.search(payload)
+            if combined_match:
+                route = self.__combined_routes[combined_match.lastgroup]
+                # Re-match with the route's own pattern so the handler gets
+                # its group numbering.
+                best = (route, route.regex.match(
+                    payload, combined_match.start()))
+        for route in self.__individual_routes:
+            match = route.regex.search(payload)
+            if not match:
+                continue
+            if (best is None or
+                    (match.start(), route.order) <
+                    (best[1].start(), best[0].order)):
+                best = (route, match)
+        return best
+
+
+class CustomControlSequenceRouter:
+    """Dispatches custom control sequences to many handlers using a single
+    subscription.
+
+    Each :class:`CustomControlSequenceMonitor` has its own subscription and
+    searches every payload with its own regular expression. A script that
+    handles many commands should add them as routes to a router instead. The
+    router looks up the sender identity in a dictionary and then searches the
+    payload once with an alternation of that identity's patterns, so the cost
+    of dispatching a control sequence doesn't grow with the number of routes.
+
+    At most one route handles each control sequence: the one whose pattern
+    matches earliest in the payload, or the first one added if several match
+    at the same position. Patterns with named groups, numbered
+    backreferences, or flags are supported but are searched individually.
+
+    Handlers are awaited while the notification is being dispatched, so one
+    that does lengthy work should start a task for it.
+
+    :param connection: The connection to iTerm2.
+    :param session_id: The session ID to monitor, or `None` to mean monitor all
+        sessions (including those not yet created).
+
+    Example:
+
+      .. code-block:: python
+
+          router = iterm2.CustomControlSequenceRouter(connection)
+
+          async def create_window(match, session_id):
+              await iterm2.Window.async_create(connection)
+
+          router.add_route("shared-secret", r'^create-window$', create_window)
+          async with router:
+              await iterm2.async_wait_forever()
+    """
+    def __init__(
+            self,
+            connection: iterm2.connection.Connection,
+            session_id: typing.Optional[str] = None):
+        self.__connection = connection
+        self.__session_id = session_id
+        self.__tables: typing.Dict[str, _RouteTable] = {}
+        self.__routes: typing.Dict[int, typing.Tuple[str, _Route]] = {}
+        self.__next_order = 0
+        self.__token = None
+
+    def add_route(
+            self,
+            identity: str,
+            regex: typing.Union[str, typing.Pattern],
+            handler: typing.Callable[
+                [typing.Match, str], typing.Awaitable[None]]) -> int:
+        """Adds a route. Routes may be added or removed at any time.
+
+        :param identity: The sender identity the control sequence must
+            provide.
+        :param regex: A regular expression, or a compiled pattern, used to
+            search the payload.
+        :param handler: A coroutine called with the `re.Match` and the ID of
+            the session that received the control sequence.
+
+        :returns: A token that can be passed to :meth:`remove_route`.
+
+        :throws: `re.error` if the regular expression is invalid.
+        """
+        route = _Route(self.__next_order, re.compile(regex), handler)
+        self.__next_order += 1
+        self.__tables.setdefault(identity, _RouteTable()).add(route)
+        self.__routes[route.order] = (identity, route)
+        return route.order
+
+    def remove_route(self, token: int) -> None:
+        """Removes a route.
+
+        :param token: The value returned by :meth:`add_route`.
+
+        :throws: `KeyError` if there is no such route.
+        """
+        identity, route = self.__routes.pop(token)
+        table = self.__tables[identity]
+        table.remove(route)
+        if not table.routes:
+            del self.__tables[identity]
+
+    async def __aenter__(self):
+        async def internal_callback(_connection, notification):
+            table = self.__tables.get(notification.sender_identity)
+            if table is None:
+                return
+            found = table.search(notification.payload)
+            if found is None:
+                return
+            route, match = found
+            await route.handler(match, notification.session)
+
+        self.__token = await (
+            iterm2.notifications.
+            async_subscribe_to_custom_escape_sequence_notification(
+                self.__connection,
+                internal_callback,
+                self.__session_id))
+        return self
 
     async def __aexit__(self, exc_type, exc, _tb):
         try:
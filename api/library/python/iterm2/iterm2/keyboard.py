@@ -4,11 +4,13 @@ handles keystrokes.
 """
 import asyncio
 import enum
+import traceback
 import typing
 
 import iterm2.api_pb2
 import iterm2.capabilities
 import iterm2.connection
+import iterm2.monitor
 import iterm2.notifications
 
 
@@ -201,6 +203,7 @@ class Keystroke:
             notification.charactersIgnoringModifiers)
         self.__modifiers = notification.modifiers
         self.__key_code = notification.keyCode
+        self.__session_id = notification.session
         self.__action = Keystroke.Action.NA
         if notification.HasField("action"):
             if notification.action == iterm2.api_pb2.KeystrokeNotification.Action.Value("KEY_DOWN"):
@@ -256,6 +259,26 @@ class Keystroke:
         :returns: A :class:`Keycode` object."""
         return Keycode(self.__key_code)
 
+    @property
+    def raw_modifiers(self) -> typing.List[int]:
+        """The modifiers that were pressed, as integers.
+
+        Unlike :attr:`modifiers`, this does not fail for values that
+        :class:`Modifier` does not define.
+
+        :returns: A list of integers."""
+        return list(self.__modifiers)
+
+    @property
+    def raw_keycode(self) -> int:
+        """The keycode that was pressed, as an integer.
+
+        Unlike :attr:`keycode`, this does not fail for keys that
+        :class:`Keycode` does not define.
+
+        :returns: An integer."""
+        return self.__key_code
+
     @property
     def action(self) -> Action:
         """The kind of keystroke.
@@ -263,6 +286,13 @@ class Keystroke:
         :returns: A :class:`Keystroke.Action` object."""
         return self.__action
 
+    @property
+    def session_id(self) -> str:
+        """The ID of the session that received the keystroke.
+
+        :returns: A session ID."""
+        return self.__session_id
+
 
 class KeystrokePattern:
     """Describes attributes that select keystrokes.
@@ -366,13 +396,17 @@ class KeystrokePattern:
         return proto
 
 
-class KeystrokeMonitor:
+class KeystrokeMonitor(iterm2.monitor.BoundedMonitor):
     """Monitors keystrokes in one or all sessions.
 
     :param connection: The :class:`~iterm2.Connection` to use.
     :param session: The session ID to affect, or `None` meaning all sessions.
     :param advanced: If false only key-down events are reported. If true,
         key-up and flags-changed events are also reported.
+    :param maxsize: The maximum number of keystrokes to buffer, or `None` for
+        no limit.
+    :param overflow: What to do when the buffer is full. See
+        :class:`~iterm2.OverflowPolicy`.
     .. seealso::
         * Example ":ref:`broadcast_example`"
         * Example ":ref:`escindicator_example`"
@@ -383,27 +417,29 @@ class KeystrokeMonitor:
       .. code-block:: python
 
           async with iterm2.KeystrokeMonitor(connection) as mon:
-              while True:
-                  keystroke = await mon.async_get()
+              async for keystroke in mon:
                   DoSomething(keystroke)
     """
     def __init__(
             self,
             connection: iterm2.connection.Connection,
             session: typing.Union[None, str] = None,
-            advanced: typing.Optional[bool] = False):
+            advanced: typing.Optional[bool] = False,
+            maxsize: typing.Optional[int] = iterm2.monitor.DEFAULT_MAXSIZE,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow)
         self.__connection = connection
         self.__session = session
         if advanced:
             iterm2.capabilities.check_supports_advanced_key_notifications(connection)
         self.__advanced = advanced
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
 
     async def __aenter__(self):
         # pylint: disable=unused-argument
         async def callback(connection, notification):
-            await self.__queue.put(notification)
+            await self._queue.async_put(notification)
         # pylint: enable=unused-argument
         self.__token = (
             await iterm2.notifications.
@@ -416,7 +452,7 @@ class KeystrokeMonitor:
 
     async def async_get(self) -> Keystroke:
         """Wait for and return the next keystroke."""
-        notification = await self.__queue.get()
+        notification = await super().async_get()
         return Keystroke(notification)
 
     async def __aexit__(self, exc_type, exc, _tb):
@@ -477,3 +513,259 @@ class KeystrokeFilter:
                 self.__connection, self.__token)
         except iterm2.notifications.SubscriptionException:
             pass
+
+
+class _CompiledPattern:
+    """A :class:`KeystrokePattern` reduced to sets for fast matching."""
+    def __init__(self, pattern: KeystrokePattern):
+        self.required = frozenset(m.value for m in pattern.required_modifiers)
+        self.forbidden = frozenset(
+            m.value for m in pattern.forbidden_modifiers)
+        self.keys = frozenset(
+            [("keycode", k.value) for k in pattern.keycodes] +
+            [("characters", c) for c in pattern.characters] +
+            [("ignoring", c) for c in pattern.characters_ignoring_modifiers])
+        self.signature = (self.required, self.forbidden, self.keys)
+
+    def modifiers_match(self, modifiers: typing.FrozenSet[int]) -> bool:
+        """Returns whether modifiers satisfy the pattern's constraints."""
+        return (self.required <= modifiers and
+                not self.forbidden & modifiers)
+
+
+def _keys_of(keystroke: Keystroke):
+    """Returns the keys under which a trie node indexes its children."""
+    return (("keycode", keystroke.raw_keycode),
+            ("characters", keystroke.characters),
+            ("ignoring", keystroke.characters_ignoring_modifiers))
+
+
+class _TrieNode:
+    """A node in a :class:`KeySequenceMatcher`'s trie."""
+    def __init__(self):
+        self.handler = None
+        self.children: typing.Dict[tuple, "_TrieNode"] = {}
+        # Maps a key to the (order, pattern, child) triples whose pattern
+        # names that key.
+        self.index: typing.Dict[tuple, list] = {}
+
+    def add_child(self, pattern: _CompiledPattern, order: int) -> "_TrieNode":
+        """Returns the child for a pattern, creating it if needed."""
+        child = self.children.get(pattern.signature)
+        if child is None:
+            child = _TrieNode()
+            self.children[pattern.signature] = child
+            for key in pattern.keys:
+                self.index.setdefault(key, []).append((order, pattern, child))
+        return child
+
+    def child_for(self, keystroke: Keystroke) -> typing.Optional["_TrieNode"]:
+        """Returns the child whose pattern matches the keystroke.
+
+        If several match, the one added first wins.
+        """
+        modifiers = frozenset(keystroke.raw_modifiers)
+        best = None
+        for key in _keys_of(keystroke):
+            for order, pattern, child in self.index.get(key, ()):
+                if best is not None and best[0] <= order:
+                    break
+                if pattern.modifiers_match(modifiers):
+                    best = (order, child)
+                    break
+        return best[1] if best else None
+
+
+class _SequenceState:
+    """The progress of one session through the trie."""
+    def __init__(self):
+        self.node = None
+        self.keystrokes: typing.List[Keystroke] = []
+        self.deadline = None
+
+
+class KeySequenceMatcher:
+    """Calls handlers when sequences of keystrokes are typed.
+
+    Sequences, such as a leader key followed by a command key, are compiled
+    into a trie. Each session tracks its position in the trie independently,
+    so the work done per keystroke depends only on the length of the
+    sequences and not on how many there are.
+
+    Keystrokes are observed with a :class:`KeystrokeMonitor`, so they are
+    also handled normally by iTerm2 and typing isn't delayed while a sequence
+    is in progress. A keystroke that doesn't continue the sequence in progress
+    abandons it and may begin another.
+
+    If a complete sequence is also the prefix of a longer one, its handler is
+    called when the next keystroke doesn't continue the longer sequence or
+    when `timeout` elapses.
+
+    :param connection: The :class:`~iterm2.Connection` to use.
+    :param session: The session ID to monitor, or `None` meaning all sessions.
+    :param timeout: The number of seconds to wait for the next keystroke of a
+        sequence before abandoning it.
+    :param filter_leaders: If true, a :class:`KeystrokeFilter` disables
+        iTerm2's regular handling of keystrokes matching the first pattern of
+        any sequence added before the matcher is entered.
+
+    Example:
+
+      .. code-block:: python
+
+          def pattern(keycode, modifiers=[]):
+              result = iterm2.KeystrokePattern()
+              result.keycodes = [keycode]
+              result.required_modifiers = modifiers
+              return result
+
+          async def split(session_id, keystrokes):
+              session = app.get_session_by_id(session_id)
+              await session.async_split_pane(vertical=True)
+
+          matcher = iterm2.KeySequenceMatcher(connection, filter_leaders=True)
+          matcher.add_sequence(
+              [pattern(iterm2.Keycode.ANSI_A, [iterm2.Modifier.CONTROL]),
+               pattern(iterm2.Keycode.ANSI_BACKSLASH)],
+              split)
+          async with matcher:
+              await iterm2.async_wait_forever()
+    """
+    def __init__(
+            self,
+            connection: iterm2.connection.Connection,
+            session: typing.Union[None, str] = None,
+            timeout: float = 1.0,
+            filter_leaders: bool = False):
+        self.__connection = connection
+        self.__session = session
+        self.__timeout = timeout
+        self.__filter_leaders = filter_leaders
+        self.__root = _TrieNode()
+        self.__leaders: typing.List[KeystrokePattern] = []
+        self.__next_order = 0
+        self.__states: typing.Dict[str, _SequenceState] = {}
+        self.__monitor = None
+        self.__filter = None
+        self.__task = None
+
+    def add_sequence(
+            self,
+            patterns: typing.List[KeystrokePattern],
+            handler: typing.Callable[
+                [str, typing.List[Keystroke]], typing.Awaitable[None]]):
+        """Adds a sequence of keystrokes.
+
+        :param patterns: One :class:`KeystrokePattern` per keystroke in the
+            sequence.
+        :param handler: A coroutine called with the session ID and the list
+            of :class:`Keystroke` objects when the sequence is typed.
+
+        :throws: `ValueError` if `patterns` is empty or the sequence already
+            has a handler.
+        """
+        if not patterns:
+            raise ValueError("A key sequence needs at least one pattern")
+        node = self.__root
+        for pattern in patterns:
+            node = node.add_child(_CompiledPattern(pattern), self.__next_order)
+            self.__next_order += 1
+        if node.handler is not None:
+            raise ValueError("This key sequence already has a handler")
+        node.handler = handler
+        self.__leaders.append(patterns[0])
+
+    async def __aenter__(self):
+        self.__monitor = KeystrokeMonitor(self.__connection, self.__session)
+        await self.__monitor.__aenter__()
+        if self.__filter_leaders and self.__leaders:
+            self.__filter = KeystrokeFilter(
+                self.__connection, self.__leaders, self.__session)
+            await self.__filter.__aenter__()
+        self.__task = asyncio.ensure_future(self.__async_run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, _tb):
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        if self.__filter is not None:
+            await self.__filter.__aexit__(None, None, None)
+            self.__filter = None
+        await self.__monitor.__aexit__(None, None, None)
+        self.__states.clear()
+
+    async def __async_run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            deadlines = [state.deadline for state in self.__states.values()]
+            try:
+                if deadlines:
+                    keystroke = await asyncio.wait_for(
+                        self.__monitor.async_get(),
+                        max(0, min(deadlines) - loop.time()))
+                else:
+                    keystroke = await self.__monitor.async_get()
+            except asyncio.TimeoutError:
+                keystroke = None
+            # A failing handler must not stop the matcher.
+            try:
+                if keystroke is None:
+                    await self.__async_expire(loop.time())
+                else:
+                    await self.async_handle_keystroke(keystroke)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+    async def __async_expire(self, now: float):
+        expired = [
+            (session_id, state)
+            for session_id, state in self.__states.items()
+            if state.deadline <= now]
+        for session_id, state in expired:
+            del self.__states[session_id]
+            if state.node.handler is not None:
+                await state.node.handler(session_id, state.keystrokes)
+
+    async def async_handle_keystroke(self, keystroke: Keystroke) -> None:
+        """Advances the keystroke's session through the trie.
+
+        The matcher calls this for each keystroke it observes. You only need
+        to call it if you receive keystrokes some other way.
+
+        :param keystroke: The keystroke to handle. Key-up and flags-changed
+            events are ignored.
+        """
+        if keystroke.action not in (Keystroke.Action.NA,
+                                    Keystroke.Action.KEY_DOWN):
+            return
+        session_id = keystroke.session_id
+        state = self.__states.get(session_id)
+        if state is not None:
+            child = state.node.child_for(keystroke)
+            if child is not None:
+                await self.__async_advance(session_id, state, child, keystroke)
+                return
+            # The sequence in progress is abandoned. If it was complete on
+            # its own, it has matched.
+            del self.__states[session_id]
+            if state.node.handler is not None:
+                await state.node.handler(session_id, state.keystrokes)
+
+        child = self.__root.child_for(keystroke)
+        if child is not None:
+            await self.__async_advance(
+                session_id, _SequenceState(), child, keystroke)
+
+    async def __async_advance(self, session_id, state, child, keystroke):
+        state.node = child
+        state.keystrokes.append(keystroke)
+        if child.children:
+            state.deadline = (
+                asyncio.get_running_loop().time() + self.__timeout)
+            self.__states[session_id] = state
+            return
+        self.__states.pop(session_id, None)
+        await child.handler(session_id, state.keystrokes)
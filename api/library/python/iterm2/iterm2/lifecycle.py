@@ -1,7 +1,9 @@
 """Provides hooks for session life-cycle events."""
 import asyncio
+import typing
 
 import iterm2.connection
+import iterm2.monitor
 import iterm2.notifications
 
 
@@ -100,7 +102,7 @@ class EachSessionOnceMonitor:
             pass
 
 
-class SessionTerminationMonitor:
+class SessionTerminationMonitor(iterm2.monitor.BoundedMonitor):
     """
     Watches for session termination.
 
@@ -110,25 +112,33 @@ class SessionTerminationMonitor:
     until it is no longer undoable.
 
     :param connection: The :class:`~iterm2.connection.Connection` to use.
+    :param maxsize: The maximum number of undelivered session IDs to buffer, or
+        `None` for no limit. By default none are dropped.
+    :param overflow: What to do when the buffer is full. See
+        :class:`~iterm2.OverflowPolicy`.
 
     Example:
 
       .. code-block:: python
 
           async with iterm2.SessionTerminationMonitor(connection) as mon:
-              while True:
-                  session_id = await mon.async_get()
+              async for session_id in mon:
                   print("Session {} closed".format(session_id))
     """
-    def __init__(self, connection: iterm2.connection.Connection):
+    def __init__(
+            self,
+            connection: iterm2.connection.Connection,
+            maxsize: typing.Optional[int] = None,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow)
         self.__connection = connection
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
 
     async def __aenter__(self):
         async def callback(_connection, message):
             """Called when a session terminates."""
-            await self.__queue.put(message.session_id)
+            await self._queue.async_put(message.session_id)
 
         self.__token = (
             await iterm2.notifications.
@@ -141,7 +151,7 @@ class SessionTerminationMonitor:
         """
         Returns the `session_id` of a just-terminated session.
         """
-        session_id = await self.__queue.get()
+        session_id = await super().async_get()
         return session_id
 
     async def __aexit__(self, exc_type, exc, _tb):
@@ -153,21 +163,30 @@ class SessionTerminationMonitor:
             pass
 
 
-class LayoutChangeMonitor:
+class LayoutChangeMonitor(iterm2.monitor.BoundedMonitor):
     """
     Watches for changes to the composition of sessions, tabs, and windows.
 
     :param connection: The :class:`~iterm2.connection.Connection` to use.
+    :param maxsize: The maximum number of undelivered changes to buffer, or
+        `None` for no limit. By default none are dropped.
+    :param overflow: What to do when the buffer is full. See
+        :class:`~iterm2.OverflowPolicy`.
     """
-    def __init__(self, connection: iterm2.Connection):
+    def __init__(
+            self,
+            connection: iterm2.Connection,
+            maxsize: typing.Optional[int] = None,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow)
         self.__connection = connection
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
 
     async def __aenter__(self):
         async def callback(_connection, message):
             """Called when the layout changes."""
-            await self.__queue.put(message)
+            await self._queue.async_put(message)
 
         self.__token = (
             await iterm2.notifications.
@@ -201,7 +220,7 @@ class LayoutChangeMonitor:
                    print("layout changed")
 
         """
-        await self.__queue.get()
+        await super().async_get()
 
     async def __aexit__(self, exc_type, exc, _tb):
         try:
@@ -211,10 +230,14 @@ class LayoutChangeMonitor:
             pass
 
 
-class NewSessionMonitor:
+class NewSessionMonitor(iterm2.monitor.BoundedMonitor):
     """Watches for the creation of new sessions.
 
       :param connection: The :class:`~iterm2.connection.Connection` to use.
+      :param maxsize: The maximum number of undelivered session IDs to
+          buffer, or `None` for no limit. By default none are dropped.
+      :param overflow: What to do when the buffer is full. See
+          :class:`~iterm2.OverflowPolicy`.
 
       .. seealso::
           * Example ":ref:`colorhost_example`"
@@ -225,22 +248,26 @@ class NewSessionMonitor:
       .. code-block:: python
 
           async with iterm2.NewSessionMonitor(connection) as mon:
-              while True:
-                  session_id = await mon.async_get()
+              async for session_id in mon:
                   print("Session ID {} created".format(session_id))
 
         .. seealso::
             * Example ":ref:`autoalert`"
       """
-    def __init__(self, connection: iterm2.Connection):
+    def __init__(
+            self,
+            connection: iterm2.Connection,
+            maxsize: typing.Optional[int] = None,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow)
         self.__connection = connection
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
 
     async def __aenter__(self):
         async def callback(_connection, message):
             """Called when a new session is created."""
-            await self.__queue.put(message)
+            await self._queue.async_put(message)
 
         self.__token = (
             await iterm2.notifications.
@@ -251,7 +278,7 @@ class NewSessionMonitor:
 
     async def async_get(self) -> str:
         """Returns the new session ID."""
-        result = await self.__queue.get()
+        result = await super().async_get()
         session_id = result.session_id
         return session_id
 
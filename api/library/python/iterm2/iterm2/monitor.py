@@ -0,0 +1,220 @@
+"""Provides a bounded buffer shared by the notification monitors.
+
+Monitors such as :class:`~iterm2.KeystrokeMonitor` receive notifications
+from iTerm2 whether or not your script is ready for them. If the script stops
+calling `async_get()` notifications accumulate, so each monitor keeps them in
+a bounded buffer with a policy that says what to do when it fills up.
+"""
+import asyncio
+import collections
+import enum
+import typing
+
+#: The number of undelivered notifications a monitor keeps by default.
+DEFAULT_MAXSIZE = 1024
+
+
+class OverflowPolicy(enum.Enum):
+    """Describes what a monitor does when its buffer is full."""
+    DROP_OLDEST = 0  #: Discard the oldest undelivered item to make room for the new one.
+    KEEP_LATEST = 1  #: Discard all undelivered items, keeping only the new one.
+    #: Wait for the consumer to make room. Each notification is delivered in
+    #: its own task, so this suspends only that task; other handlers and
+    #: iTerm2 are not slowed down. The suspended tasks, and the notifications
+    #: they hold, accumulate without limit, so BLOCK does not bound memory.
+    BLOCK = 2
+
+
+class MonitorQueue:
+    """An asyncio queue with a size limit, an overflow policy, and optional
+    coalescing.
+
+    You probably don't need to create this yourself. Monitors use it
+    internally.
+
+    :param maxsize: The maximum number of undelivered items, or `None` for no
+        limit.
+    :param overflow: What to do when an item arrives and the queue is full.
+    :param coalesce_key: If not `None`, a function that computes a key from an
+        item. An item whose key matches an undelivered item replaces it in
+        place rather than being appended.
+    """
+    def __init__(
+            self,
+            maxsize: typing.Optional[int] = DEFAULT_MAXSIZE,
+            overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+            coalesce_key: typing.Optional[
+                typing.Callable[[typing.Any], typing.Hashable]] = None):
+        assert maxsize is None or maxsize > 0
+        self.__maxsize = maxsize
+        self.__overflow = overflow
+        self.__coalesce_key = coalesce_key
+        # Each entry is a two-element list [key, item] so coalescing can
+        # replace the item without moving the entry.
+        self.__entries: typing.Deque[list] = collections.deque()
+        self.__entries_by_key: typing.Dict[typing.Hashable, list] = {}
+        self.__getters: typing.Deque[asyncio.Future] = collections.deque()
+        self.__putters: typing.Deque[asyncio.Future] = collections.deque()
+        self.__dropped_count = 0
+        self.__coalesced_count = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def maxsize(self) -> typing.Optional[int]:
+        """The maximum number of undelivered items, or `None` if unlimited."""
+        return self.__maxsize
+
+    @property
+    def overflow(self) -> OverflowPolicy:
+        """The policy applied when the queue is full."""
+        return self.__overflow
+
+    @property
+    def dropped_count(self) -> int:
+        """The number of items discarded because the queue was full."""
+        return self.__dropped_count
+
+    @property
+    def coalesced_count(self) -> int:
+        """The number of items that replaced an undelivered item."""
+        return self.__coalesced_count
+
+    def full(self) -> bool:
+        """Returns whether the queue is at its size limit."""
+        return (self.__maxsize is not None and
+                len(self.__entries) >= self.__maxsize)
+
+    def empty(self) -> bool:
+        """Returns whether there are no undelivered items."""
+        return not self.__entries
+
+    async def async_put(self, item: typing.Any) -> None:
+        """Adds an item, applying the coalescing and overflow policies."""
+        key = None
+        if self.__coalesce_key is not None:
+            key = self.__coalesce_key(item)
+
+        waited = False
+        while True:
+            # Check again after each wait: another putter with the same key
+            # may have added an entry in the meantime.
+            if self.__coalesce(key, item):
+                if waited and not self.full():
+                    # Pass on the wakeup this putter didn't use.
+                    self.__wake(self.__putters)
+                return
+            if not self.full():
+                break
+            if self.__overflow == OverflowPolicy.BLOCK:
+                future = asyncio.get_running_loop().create_future()
+                self.__putters.append(future)
+                try:
+                    await future
+                except asyncio.CancelledError:
+                    if future in self.__putters:
+                        self.__putters.remove(future)
+                    elif not self.full():
+                        self.__wake(self.__putters)
+                    raise
+                waited = True
+            elif self.__overflow == OverflowPolicy.KEEP_LATEST:
+                self.__dropped_count += len(self.__entries)
+                self.__entries.clear()
+                self.__entries_by_key.clear()
+            else:
+                self.__remove_entry(self.__entries.popleft())
+                self.__dropped_count += 1
+
+        entry = [key, item]
+        self.__entries.append(entry)
+        if self.__coalesce_key is not None:
+            self.__entries_by_key[key] = entry
+        self.__wake(self.__getters)
+
+    async def async_get(self) -> typing.Any:
+        """Removes and returns the oldest undelivered item, waiting for one to
+        arrive if necessary."""
+        while not self.__entries:
+            future = asyncio.get_running_loop().create_future()
+            self.__getters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future in self.__getters:
+                    self.__getters.remove(future)
+                raise
+        entry = self.__entries.popleft()
+        self.__remove_entry(entry)
+        self.__wake(self.__putters)
+        return entry[1]
+
+    def __coalesce(self, key, item) -> bool:
+        """Replaces the undelivered item with the same key, if there is one.
+        Returns whether it did."""
+        if self.__coalesce_key is None:
+            return False
+        entry = self.__entries_by_key.get(key)
+        if entry is None:
+            return False
+        entry[1] = item
+        self.__coalesced_count += 1
+        return True
+
+    def __remove_entry(self, entry):
+        if self.__coalesce_key is not None:
+            del self.__entries_by_key[entry[0]]
+
+    @staticmethod
+    def __wake(waiters):
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+
+class BoundedMonitor:
+    """Base class for monitors that buffer notifications in a
+    :class:`MonitorQueue`.
+
+    Subclasses put notifications in `self._queue` and may override
+    `async_get()` to transform what it returns. Instances support
+    `async for`, which calls `async_get()` repeatedly.
+
+    :param maxsize: The maximum number of undelivered notifications, or `None`
+        for no limit.
+    :param overflow: What to do when a notification arrives and the buffer is
+        full.
+    :param coalesce_key: If not `None`, notifications with equal keys replace
+        undelivered ones instead of being queued behind them.
+    """
+    def __init__(
+            self,
+            maxsize: typing.Optional[int] = DEFAULT_MAXSIZE,
+            overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+            coalesce_key: typing.Optional[
+                typing.Callable[[typing.Any], typing.Hashable]] = None):
+        self._queue = MonitorQueue(maxsize, overflow, coalesce_key)
+
+    @property
+    def dropped_count(self) -> int:
+        """The number of notifications discarded because the buffer was full.
+        """
+        return self._queue.dropped_count
+
+    @property
+    def coalesced_count(self) -> int:
+        """The number of notifications that replaced an undelivered one."""
+        return self._queue.coalesced_count
+
+    async def async_get(self) -> typing.Any:
+        """Waits for and returns the next value."""
+        return await self._queue.async_get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.async_get()
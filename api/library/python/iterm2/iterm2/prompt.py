@@ -1,20 +1,74 @@
 """Provides information about the shell prompt."""
 import asyncio
+import collections
 import enum
 import typing
 
 import iterm2.api_pb2
 import iterm2.capabilities
 import iterm2.connection
+import iterm2.monitor
 import iterm2.notifications
 import iterm2.rpc
+import iterm2.screen
+import iterm2.session
+import iterm2.util
 
 class PromptState(enum.Enum):
     """Describes the states that a command prompt can take."""
     UNKNOWN = -1  #: This version of iTerm2 does not report prompt state (you should upgrade)
     EDITING = 0  #: User is editing the command at the prompt
     RUNNING = 1  #: The last entered command is still executing, and has not finished yet.
-    FINISHED = 3  #: The last entered command has finished but there hasn't been a new prompt yet (rare).
+    FINISHED = 2  #: The last entered command has finished but there hasn't been a new prompt yet (rare).
+
+
+class OutputChunk:
+    """A block of consecutive lines of a command's output.
+
+    Produced by :meth:`Prompt.async_iter_output`.
+    """
+    def __init__(
+            self,
+            first_line_number: int,
+            lines: typing.List[iterm2.screen.LineContents],
+            lines_lost: int):
+        self.__first_line_number = first_line_number
+        self.__lines = lines
+        self.__lines_lost = lines_lost
+
+    def __repr__(self):
+        return "<OutputChunk first_line={} lines={} lost={}>".format(
+            self.__first_line_number, len(self.__lines), self.__lines_lost)
+
+    @property
+    def first_line_number(self) -> int:
+        """The absolute line number of the first line in this chunk."""
+        return self.__first_line_number
+
+    @property
+    def lines(self) -> typing.List[iterm2.screen.LineContents]:
+        """The lines in this chunk."""
+        return self.__lines
+
+    @property
+    def text(self) -> str:
+        """The lines joined into a string.
+
+        Lines with a hard newline are followed by a newline; soft-wrapped
+        lines are joined to the next line."""
+        parts = []
+        for line in self.__lines:
+            parts.append(line.string)
+            if line.hard_eol:
+                parts.append("\n")
+        return "".join(parts)
+
+    @property
+    def lines_lost(self) -> int:
+        """The number of output lines immediately before this chunk that were
+        no longer available because they scrolled off the head of scrollback
+        history."""
+        return self.__lines_lost
 
 
 class Prompt:
@@ -75,6 +129,114 @@ class Prompt:
             return self.__proto.unique_prompt_id
         return None
 
+    async def async_iter_output(
+            self,
+            connection: iterm2.connection.Connection,
+            session_id: str,
+            chunk_lines: int = 1000,
+            prefetch: int = 1,
+            styles: bool = False) -> typing.AsyncIterator[OutputChunk]:
+        """
+        Streams the output of this prompt's command in chunks.
+
+        Rather than fetching the whole of :attr:`output_range` in a single
+        request, the output is fetched `chunk_lines` lines at a time. While
+        you process one chunk the following ones are already being fetched.
+
+        Output that scrolled off the head of scrollback history can not be
+        fetched. In that case the first chunk available after the gap reports
+        the number of missing lines in :attr:`OutputChunk.lines_lost`.
+
+        :param connection: The connection to iTerm2.
+        :param session_id: The session ID the prompt belongs to.
+        :param chunk_lines: The maximum number of lines per chunk.
+        :param prefetch: The number of chunks to request ahead of the one
+            being consumed.
+        :param styles: Whether to fetch the style of each cell, which is
+            needed for :meth:`~iterm2.LineContents.style_at` but makes large
+            outputs slower to fetch.
+
+        :returns: An async iterator of :class:`OutputChunk`.
+
+        :throws: :class:`~iterm2.rpc.RPCException` if something goes wrong.
+
+        Example:
+
+          .. code-block:: python
+
+              async for chunk in prompt.async_iter_output(
+                      connection, session.session_id):
+                  if chunk.lines_lost:
+                      print(f"[{chunk.lines_lost} lines lost]")
+                  print(chunk.text, end="")
+        """
+        assert chunk_lines > 0
+        assert prefetch >= 0
+        output_range = self.output_range
+        start, end = output_range.start, output_range.end
+        limit = end.y + 1 if end.x > 0 else end.y
+
+        line_info = await iterm2.session.async_get_line_info(
+            connection, session_id)
+        first = start.y
+        lines_lost = 0
+        if line_info.overflow > first:
+            lines_lost = min(line_info.overflow, limit) - first
+            first = line_info.overflow
+            start = iterm2.util.Point(0, first)
+
+        def chunk_range(first_line):
+            last_line = first_line + chunk_lines
+            chunk_start = start if first_line == start.y else (
+                iterm2.util.Point(0, first_line))
+            chunk_end = end if last_line >= limit else (
+                iterm2.util.Point(0, last_line))
+            return iterm2.util.WindowedCoordRange(
+                iterm2.util.CoordRange(chunk_start, chunk_end))
+
+        async def async_fetch(first_line):
+            response = await iterm2.rpc.async_get_screen_contents(
+                connection, session_id, chunk_range(first_line), styles)
+            # pylint: disable=no-member
+            if (response.get_buffer_response.status !=
+                    iterm2.api_pb2.GetBufferResponse.Status.Value("OK")):
+                raise iterm2.rpc.RPCException(
+                    iterm2.api_pb2.GetBufferResponse.Status.Name(
+                        response.get_buffer_response.status))
+            return iterm2.screen.ScreenContents(response.get_buffer_response)
+
+        pending: typing.List[typing.Tuple[int, asyncio.Task]] = []
+        next_line = first
+        try:
+            while True:
+                while next_line < limit and len(pending) <= prefetch:
+                    pending.append(
+                        (next_line,
+                         asyncio.ensure_future(async_fetch(next_line))))
+                    next_line += chunk_lines
+                if not pending:
+                    if lines_lost:
+                        yield OutputChunk(next_line, [], lines_lost)
+                    return
+                requested_line, task = pending.pop(0)
+                contents = await task
+                lines = [contents.line(i)
+                         for i in range(contents.number_of_lines)]
+                # History may have overflowed since the request was sent, in
+                # which case lines are missing from the head of the chunk.
+                expected = min(requested_line + chunk_lines, limit) - (
+                    requested_line)
+                returned_line = requested_line
+                if len(lines) < expected:
+                    lines_lost += expected - len(lines)
+                    returned_line += expected - len(lines)
+                if lines or lines_lost:
+                    yield OutputChunk(returned_line, lines, lines_lost)
+                    lines_lost = 0
+        finally:
+            for _, task in pending:
+                task.cancel()
+
 async def async_get_last_prompt(
         connection: iterm2.connection.Connection,
         session_id: str) -> typing.Union[None, Prompt]:
@@ -157,7 +319,89 @@ async def async_list_prompts(
     raise iterm2.rpc.RPCException(
         iterm2.api_pb2.GetPromptResponse.Status.Name(status))
 
-class PromptMonitor:
+class _FinishedPromptCache:
+    """Finished prompts by (session ID, prompt unique ID).
+
+    Finished prompts never change, but a long-running script may list a great
+    many of them, so only the `MAXSIZE` most recently used are kept. The cache
+    is discarded when the connection closes.
+    """
+    MAXSIZE = 4096
+    instance: typing.Optional['_FinishedPromptCache'] = None
+
+    def __init__(self):
+        self.__prompts: typing.MutableMapping[
+            typing.Tuple[str, str], Prompt] = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.__prompts)
+
+    def get(self, key: typing.Tuple[str, str]) -> typing.Optional[Prompt]:
+        """Returns the cached prompt, or `None` if there isn't one."""
+        prompt = self.__prompts.get(key)
+        if prompt is not None:
+            self.__prompts.move_to_end(key)
+        return prompt
+
+    def put(self, key: typing.Tuple[str, str], prompt: Prompt):
+        """Adds a prompt, evicting the least recently used if full."""
+        self.__prompts[key] = prompt
+        self.__prompts.move_to_end(key)
+        while len(self.__prompts) > self.MAXSIZE:
+            self.__prompts.popitem(last=False)
+
+def _get_finished_prompt_cache() -> _FinishedPromptCache:
+    """Returns the cache singleton, creating it if needed."""
+    if _FinishedPromptCache.instance is None:
+        _FinishedPromptCache.instance = _FinishedPromptCache()
+        iterm2.connection.add_disconnect_callback(
+            _invalidate_finished_prompt_cache)
+    return _FinishedPromptCache.instance
+
+def _invalidate_finished_prompt_cache():
+    _FinishedPromptCache.instance = None
+
+async def async_get_prompts(
+        connection: iterm2.connection.Connection,
+        session_id: str,
+        first: typing.Optional[str] = None,
+        last: typing.Optional[str] = None) -> typing.List[Prompt]:
+    """
+    Fetches the prompts in a session.
+
+    This is equivalent to calling :func:`async_list_prompts` followed by
+    :func:`async_get_prompt_by_id` for each prompt, but the requests are sent
+    concurrently. Prompts whose command has finished can not change, so they
+    are cached, up to a limit, and only fetched once.
+
+    :param connection: The connection to iTerm2.
+    :param session_id: The Session ID the prompts belong to.
+    :param first: If not None, list no prompts before the one with
+         this unique ID.
+    :param last: If not None, list no prompts after the one with
+         this unique ID.
+    :returns: List of prompts in the order they appear in the session.
+        Prompts that are no longer available are omitted.
+
+    :throws: :class:`RPCException` if something goes wrong.
+    """
+    prompt_ids = await async_list_prompts(connection, session_id, first, last)
+    cache = _get_finished_prompt_cache()
+
+    async def async_get(prompt_id):
+        cached = cache.get((session_id, prompt_id))
+        if cached is not None:
+            return cached
+        prompt = await async_get_prompt_by_id(
+            connection, session_id, prompt_id)
+        if prompt is not None and prompt.state == PromptState.FINISHED:
+            cache.put((session_id, prompt_id), prompt)
+        return prompt
+
+    prompts = await asyncio.gather(*map(async_get, prompt_ids))
+    return [prompt for prompt in prompts if prompt is not None]
+
+class PromptMonitor(iterm2.monitor.BoundedMonitor):
     """
     An asyncio context manager to watch for changes to the prompt.
 
@@ -170,6 +414,11 @@ class PromptMonitor:
 
     :param connection: The :class:`~iterm2.connection.Connection` to use.
     :param session_id: The string session ID to monitor.
+    :param modes: The kinds of events to report. Defaults to `[PROMPT]`.
+    :param maxsize: The maximum number of undelivered events to buffer, or
+        `None` for no limit.
+    :param overflow: What to do when the buffer is full. See
+        :class:`~iterm2.OverflowPolicy`.
 
     Example:
 
@@ -194,14 +443,17 @@ class PromptMonitor:
             self,
             connection: iterm2.connection.Connection,
             session_id: str,
-            modes: typing.Optional[typing.List[Mode]] = None):
+            modes: typing.Optional[typing.List[Mode]] = None,
+            maxsize: typing.Optional[int] = iterm2.monitor.DEFAULT_MAXSIZE,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow)
         if modes is None:
             modes = [PromptMonitor.Mode.PROMPT]
         self.connection = connection
         self.session_id = session_id
         self.__modes = modes
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
         if (modes != [PromptMonitor.Mode.PROMPT] and
                 not iterm2.capabilities.supports_prompt_monitor_modes(
                     connection)):
@@ -214,7 +466,7 @@ class PromptMonitor:
     async def __aenter__(self):
         async def callback(_connection, message):
             """Called when a new prompt is shown."""
-            await self.__queue.put(message)
+            await self._queue.async_put(message)
 
         self.__token = (
             await iterm2.notifications.async_subscribe_to_prompt_notification(
@@ -247,7 +499,7 @@ class PromptMonitor:
         return (triple[0], triple[1])
 
     async def _async_get(self) -> typing.Tuple['PromptMonitor.Mode', typing.Any]:
-        message = await self.__queue.get()
+        message = await super().async_get()
         if not iterm2.capabilities.supports_prompt_monitor_modes(
                 self.connection):
             return (PromptMonitor.Mode.PROMPT, None, None)
@@ -0,0 +1,407 @@
+"""Records the output of sessions to compressed files as it scrolls into
+history."""
+import asyncio
+import collections
+import gzip
+import os
+import queue
+import re
+import threading
+import typing
+
+import iterm2.api_pb2
+import iterm2.connection
+import iterm2.notifications
+import iterm2.rpc
+import iterm2.screen
+import iterm2.session
+import iterm2.util
+
+
+class RotatingGzipWriter:
+    """Appends text to a gzip-compressed file, rotating it when it grows too
+    large.
+
+    When more than `max_bytes` of text have been written to `path`, it is
+    renamed to `path` with `.1` inserted before `.gz`, any existing `.1` file
+    becomes `.2`, and so on. At most `backup_count` old files are kept.
+
+    If `path` already exists, its compressed size counts toward `max_bytes`,
+    since the size of its text isn't known without decompressing it.
+
+    This class is not thread-safe. :class:`SessionRecorder` uses it from its
+    writer thread.
+
+    :param path: The file to write. It should end in `.gz`.
+    :param max_bytes: The number of bytes of UTF-8 text after which to rotate,
+        or 0 to never rotate.
+    :param backup_count: The number of rotated files to keep.
+    """
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.__path = path
+        self.__max_bytes = max_bytes
+        self.__backup_count = backup_count
+        self.__file = None
+        self.__bytes_written = (
+            os.path.getsize(path) if os.path.exists(path) else 0)
+
+    @property
+    def path(self) -> str:
+        """The file currently being written."""
+        return self.__path
+
+    def backup_path(self, index: int) -> str:
+        """Returns the name of the `index`-th most recent rotated file."""
+        base, ext = os.path.splitext(self.__path)
+        return "{}.{}{}".format(base, index, ext)
+
+    def write(self, text: str) -> None:
+        """Appends text, rotating first if the file is full."""
+        data = text.encode("utf-8")
+        if (self.__max_bytes and self.__bytes_written and
+                self.__bytes_written + len(data) > self.__max_bytes):
+            self.rotate()
+        if self.__file is None:
+            # Appending to an existing file adds a gzip member, which
+            # decompresses as a continuation of the earlier ones.
+            self.__file = gzip.open(self.__path, "ab")
+        self.__file.write(data)
+        self.__bytes_written += len(data)
+
+    def rotate(self) -> None:
+        """Closes the current file and shifts the rotated files."""
+        self.close()
+        self.__bytes_written = 0
+        if not os.path.exists(self.__path):
+            return
+        if self.__backup_count <= 0:
+            os.remove(self.__path)
+            return
+        for index in range(self.__backup_count - 1, 0, -1):
+            source = self.backup_path(index)
+            if os.path.exists(source):
+                os.replace(source, self.backup_path(index + 1))
+        os.replace(self.__path, self.backup_path(1))
+
+    def flush(self) -> None:
+        """Writes buffered data to the file."""
+        if self.__file is not None:
+            self.__file.flush()
+
+    def close(self) -> None:
+        """Closes the file. Writing again reopens it."""
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class _SessionProgress:
+    """What has been recorded for one session."""
+    def __init__(self):
+        # The absolute line number of the first line not yet recorded, or
+        # None until the session's first pass establishes a starting point.
+        self.next_line: typing.Optional[int] = None
+        self.lines_recorded = 0
+        self.lines_lost = 0
+        self.task: typing.Optional[asyncio.Task] = None
+        self.dirty = False
+        # Set when the session terminates while a pass is under way, so the
+        # pass forgets the session and closes its file when it finishes.
+        self.ended = False
+
+
+class SessionRecorder:
+    """Archives the output of sessions as it scrolls into history.
+
+    The recorder subscribes to screen updates. When a session's screen
+    changes it compares the session's absolute line count with the last line
+    it recorded and fetches only the lines that have scrolled into history
+    since then. Lines still on the screen may change, so they are recorded
+    once they scroll off. Updates that arrive while a session is being
+    fetched are coalesced into one more fetch.
+
+    Each session's lines are written to `<session ID>.txt.gz` in `directory`
+    by a background thread, so compression and disk I/O don't hold up the
+    event loop. Wrapped lines are joined, and each hard newline is written as
+    a newline.
+
+    If a session produces output faster than it can be recorded, lines that
+    fall out of a full history are lost. They are counted by
+    :meth:`lines_lost`. At most `max_pending_writes` chunks of text wait for
+    the writer thread; beyond that, fetching waits for it to catch up.
+
+    A session's file is closed when the session terminates. At most
+    `max_open_files` files are open at once; the least recently written is
+    closed to make room, and reopened if the session writes again.
+
+    If writing fails, recording stops and the error is raised on leaving the
+    `async with` block.
+
+    :param connection: The connection to iTerm2.
+    :param directory: The directory in which to write files. It is created if
+        needed.
+    :param session_id: The session to record, or `None` for all sessions,
+        including those created later.
+    :param include_history: If `True`, a session's existing history is
+        recorded the first time it changes. Otherwise only lines that scroll
+        into history after that are recorded.
+    :param max_bytes: Uncompressed bytes after which a session's file is
+        rotated, or 0 to never rotate.
+    :param backup_count: The number of rotated files to keep per session.
+    :param lines_per_request: The most lines fetched by one request.
+    :param max_pending_writes: The most chunks of text queued for the writer
+        thread.
+    :param max_open_files: The most files kept open at once.
+
+    Example:
+
+      .. code-block:: python
+
+          async with iterm2.SessionRecorder(connection, "/var/log/iterm2"):
+              await iterm2.async_wait_forever()
+    """
+    def __init__(
+            self,
+            connection: iterm2.connection.Connection,
+            directory: str,
+            session_id: typing.Optional[str] = None,
+            include_history: bool = False,
+            max_bytes: int = 64 * 1024 * 1024,
+            backup_count: int = 5,
+            lines_per_request: int = 1000,
+            max_pending_writes: int = 1024,
+            max_open_files: int = 64):
+        self.__connection = connection
+        self.__directory = directory
+        self.__session_id = session_id
+        self.__include_history = include_history
+        self.__max_bytes = max_bytes
+        self.__backup_count = backup_count
+        self.__lines_per_request = lines_per_request
+        self.__max_open_files = max_open_files
+        self.__progress: typing.Dict[str, _SessionProgress] = {}
+        # Holds (session ID, text) to write, (session ID, None) to close a
+        # session's file, or None to stop.
+        self.__writes: queue.Queue = queue.Queue(max_pending_writes)
+        self.__writer_thread = None
+        self.__writer_error = None
+        self.__token = None
+        self.__terminate_token = None
+
+    def path_for_session(self, session_id: str) -> str:
+        """Returns the file to which a session's output is written."""
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)
+        return os.path.join(self.__directory, safe_name + ".txt.gz")
+
+    def lines_recorded(self, session_id: str) -> int:
+        """Returns the number of lines recorded for a session so far.
+
+        A session's counts are discarded when it terminates."""
+        progress = self.__progress.get(session_id)
+        return 0 if progress is None else progress.lines_recorded
+
+    def lines_lost(self, session_id: str) -> int:
+        """Returns the number of lines that left history before they could be
+        recorded."""
+        progress = self.__progress.get(session_id)
+        return 0 if progress is None else progress.lines_lost
+
+    async def __aenter__(self):
+        os.makedirs(self.__directory, exist_ok=True)
+        self.__writer_thread = threading.Thread(
+            target=self.__write_in_background,
+            name="iterm2-session-recorder",
+            daemon=True)
+        self.__writer_thread.start()
+
+        async def async_on_update(_connection, notification):
+            self.__schedule(notification.session)
+
+        async def async_on_terminate(_connection, notification):
+            await self.__async_session_ended(notification.session_id)
+
+        self.__token = await (
+            iterm2.notifications.
+            async_subscribe_to_screen_update_notification(
+                self.__connection,
+                async_on_update,
+                self.__session_id))
+        self.__terminate_token = await (
+            iterm2.notifications.
+            async_subscribe_to_terminate_session_notification(
+                self.__connection,
+                async_on_terminate))
+        return self
+
+    async def __aexit__(self, exc_type, exc, _tb):
+        for token in (self.__token, self.__terminate_token):
+            try:
+                await iterm2.notifications.async_unsubscribe(
+                    self.__connection, token)
+            except iterm2.notifications.SubscriptionException:
+                pass
+        tasks = [
+            progress.task for progress in self.__progress.values()
+            if progress.task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.__async_enqueue(None)
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.__writer_thread.join)
+        if self.__writer_error is not None:
+            raise self.__writer_error
+
+    def __schedule(self, session_id):
+        if self.__writer_error is not None:
+            return
+        progress = self.__progress.get(session_id)
+        if progress is None:
+            progress = _SessionProgress()
+            self.__progress[session_id] = progress
+        if progress.task is not None:
+            # A pass is under way. Run another when it finishes.
+            progress.dirty = True
+            return
+        progress.task = asyncio.ensure_future(
+            self.__async_record(session_id, progress))
+
+    async def __async_record(self, session_id, progress):
+        try:
+            while True:
+                progress.dirty = False
+                await self.__async_record_new_lines(session_id, progress)
+                if not progress.dirty:
+                    return
+        except iterm2.rpc.RPCException:
+            # The session probably ended. A later update starts over.
+            pass
+        finally:
+            progress.task = None
+            if progress.ended:
+                await self.__async_forget(session_id, progress)
+
+    async def __async_session_ended(self, session_id):
+        progress = self.__progress.get(session_id)
+        if progress is None:
+            return
+        if progress.task is not None:
+            # Keep the entry so __aexit__ waits for the pass, which forgets
+            # the session when it finishes.
+            progress.ended = True
+        else:
+            await self.__async_forget(session_id, progress)
+
+    async def __async_forget(self, session_id, progress):
+        if self.__progress.get(session_id) is progress:
+            del self.__progress[session_id]
+        await self.__async_enqueue((session_id, None))
+
+    async def __async_enqueue(self, item):
+        try:
+            self.__writes.put_nowait(item)
+        except queue.Full:
+            # Wait for the writer thread without blocking the event loop.
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.__writes.put, item)
+
+    async def __async_record_new_lines(self, session_id, progress):
+        line_info = await iterm2.session.async_get_line_info(
+            self.__connection, session_id)
+        first_available = line_info.overflow
+        end_of_history = (line_info.overflow +
+                          line_info.scrollback_buffer_height)
+        if progress.next_line is None:
+            progress.next_line = (
+                first_available if self.__include_history
+                else end_of_history)
+        if progress.next_line < first_available:
+            progress.lines_lost += first_available - progress.next_line
+            progress.next_line = first_available
+
+        while (progress.next_line < end_of_history and
+               self.__writer_error is None):
+            first = progress.next_line
+            last = min(end_of_history, first + self.__lines_per_request)
+            text, count = await self.__async_fetch(session_id, first, last)
+            # Lines missing from the response scrolled out of history after
+            # line_info was fetched.
+            progress.lines_lost += (last - first) - count
+            progress.lines_recorded += count
+            progress.next_line = last
+            if text:
+                await self.__async_enqueue((session_id, text))
+
+    async def __async_fetch(self, session_id, first, last):
+        """Returns the text of lines [first, last) and how many were
+        available."""
+        result = await iterm2.rpc.async_get_screen_contents(
+            self.__connection,
+            session_id,
+            iterm2.util.WindowedCoordRange(
+                iterm2.util.CoordRange(
+                    iterm2.util.Point(0, first),
+                    iterm2.util.Point(0, last))))
+        # pylint: disable=no-member
+        status = result.get_buffer_response.status
+        if status != iterm2.api_pb2.GetBufferResponse.Status.Value("OK"):
+            raise iterm2.rpc.RPCException(
+                iterm2.api_pb2.GetBufferResponse.Status.Name(status))
+        contents = iterm2.screen.ScreenContents(result.get_buffer_response)
+        parts = []
+        for i in range(contents.number_of_lines):
+            line = contents.line(i)
+            parts.append(line.string)
+            if line.hard_eol:
+                parts.append("\n")
+        return "".join(parts), contents.number_of_lines
+
+    def __write_in_background(self):
+        writers: typing.Dict[str, RotatingGzipWriter] = {}
+        # The IDs of sessions whose writers have a file open, least recently
+        # written first.
+        open_ids: typing.MutableMapping[str, None] = collections.OrderedDict()
+        unflushed: typing.Set[str] = set()
+        try:
+            while True:
+                item = self.__writes.get()
+                if item is None:
+                    break
+                session_id, text = item
+                if text is None:
+                    writer = writers.pop(session_id, None)
+                    if writer is not None:
+                        writer.close()
+                    open_ids.pop(session_id, None)
+                    unflushed.discard(session_id)
+                    continue
+                writer = writers.get(session_id)
+                if writer is None:
+                    writer = RotatingGzipWriter(
+                        self.path_for_session(session_id),
+                        self.__max_bytes,
+                        self.__backup_count)
+                    writers[session_id] = writer
+                writer.write(text)
+                open_ids[session_id] = None
+                open_ids.move_to_end(session_id)
+                unflushed.add(session_id)
+                if len(open_ids) > self.__max_open_files:
+                    # The writer keeps its size, so it rotates correctly
+                    # when it reopens.
+                    oldest, _ = open_ids.popitem(last=False)
+                    writers[oldest].close()
+                    unflushed.discard(oldest)
+                # Flush when caught up so files are current while idle,
+                # without paying for a flush on every write when busy.
+                if self.__writes.empty():
+                    for unflushed_id in unflushed:
+                        writers[unflushed_id].flush()
+                    unflushed.clear()
+        except Exception as exception:  # pylint: disable=broad-except
+            self.__writer_error = exception
+            # Keep taking items so that nothing waiting to enqueue blocks
+            # forever.
+            while self.__writes.get() is not None:
+                pass
+        finally:
+            for writer in writers.values():
+                writer.close()
@@ -1,11 +1,16 @@
 """Defines interfaces for registering functions."""
+import asyncio
+import concurrent.futures
+import functools
 import inspect
 import json
+import os
 import traceback
 import typing
 import websockets
 
 import iterm2.capabilities
+import iterm2.connection
 import iterm2.notifications
 import iterm2.rpc
 
@@ -42,6 +47,160 @@ async def generic_handle_rpc(coro, connection, notif):
         await iterm2.rpc.async_send_rpc_result(
             connection, rpc_notif.request_id, False, result)
 
+def _invoke_in_worker(func, params):
+    """Runs in a worker process. Calls func, which may be a coroutine."""
+    if inspect.iscoroutinefunction(func):
+        return asyncio.run(func(**params))
+    return func(**params)
+
+
+def _warm_up_worker():
+    """Runs in a worker process. Forces the worker to start."""
+    return os.getpid()
+
+
+class RPCProcessPool:
+    """A pool of worker processes that runs CPU-bound RPCs.
+
+    Pass an instance as the `executor` argument of the `async_register` value
+    added by :func:`~iterm2.registration.RPC`. The decorated function then
+    runs in a worker process, so it does not block the event loop that
+    delivers keystrokes, screen updates, and other notifications.
+
+    Functions run in a pool must be defined at module level so they can be
+    found by name in the worker process. Their arguments and return value must
+    be picklable. The function may be a coroutine, but it runs in its own
+    event loop in the worker and can not use the connection to iTerm2.
+
+    Because worker processes import your script's main module, the call to
+    :func:`~iterm2.run_forever` must be guarded by
+    `if __name__ == "__main__":`.
+
+    :param max_workers: The maximum number of worker processes, or `None` to
+        use the number of CPUs.
+    :param warm_up: If `True`, all workers are started when the first RPC
+        using this pool is registered, rather than on first invocation.
+
+    Example:
+
+      .. code-block:: python
+
+          pool = iterm2.RPCProcessPool(max_workers=2)
+
+          @iterm2.RPC
+          def pretty_print(text):
+              return json.dumps(json.loads(text), indent=2)
+
+          async def main(connection):
+              await pretty_print.async_register(connection, executor=pool)
+
+          if __name__ == "__main__":
+              iterm2.run_forever(main)
+    """
+    #: The pool used for `executor="process"`.
+    default: typing.Optional['RPCProcessPool'] = None
+
+    def __init__(
+            self,
+            max_workers: typing.Optional[int] = None,
+            warm_up: bool = True):
+        self.__max_workers = max_workers or os.cpu_count() or 1
+        self.__warm_up = warm_up
+        self.__executor: typing.Optional[
+            concurrent.futures.ProcessPoolExecutor] = None
+        self.__warmed_up = False
+
+    @property
+    def max_workers(self) -> int:
+        """Returns the maximum number of worker processes."""
+        return self.__max_workers
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.__max_workers)
+            self.__warmed_up = False
+        return self.__executor
+
+    async def async_warm_up(self) -> None:
+        """Starts all the worker processes if they are not already running.
+
+        This is called for you when an RPC is registered if the pool was
+        created with `warm_up` set.
+        """
+        if self.__warmed_up:
+            return
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[loop.run_in_executor(executor, _warm_up_worker)
+              for _ in range(self.__max_workers)])
+        self.__warmed_up = True
+
+    async def async_call(
+            self,
+            func: typing.Callable,
+            params: typing.Dict[str, typing.Any]) -> typing.Any:
+        """Runs `func(**params)` in a worker process and returns its result.
+
+        :param func: A picklable module-level function or coroutine.
+        :param params: Keyword arguments. Values must be picklable.
+
+        :returns: The return value of `func`.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            functools.partial(_invoke_in_worker, func, params))
+
+    async def _async_prepare(self) -> None:
+        """Called when an RPC using this pool is registered."""
+        if self.__warm_up:
+            await self.async_warm_up()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the worker processes.
+
+        The pool may be used again afterwards; new workers will be started as
+        needed.
+
+        :param wait: If `True`, wait for pending calls to finish.
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait)
+            self.__executor = None
+        self.__warmed_up = False
+
+
+def _get_default_process_pool() -> RPCProcessPool:
+    """Returns the pool used for `executor="process"`, creating it if needed."""
+    if RPCProcessPool.default is None:
+        RPCProcessPool.default = RPCProcessPool()
+        iterm2.connection.add_disconnect_callback(
+            _invalidate_default_process_pool)
+    return RPCProcessPool.default
+
+
+def _invalidate_default_process_pool():
+    pool = RPCProcessPool.default
+    RPCProcessPool.default = None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def _process_pool_for_executor(
+        executor: typing.Union[None, str, RPCProcessPool]) -> typing.Optional[
+            RPCProcessPool]:
+    """Converts the `executor` argument of `async_register` to a pool."""
+    if executor is None:
+        return None
+    if isinstance(executor, RPCProcessPool):
+        return executor
+    if executor == "process":
+        return _get_default_process_pool()
+    raise ValueError("Unsupported executor {}".format(repr(executor)))
+
+
 class Reference:  # pylint: disable=too-few-public-methods
     """Defines a reference to a variable for use in the @RPC decorator.
 
@@ -79,6 +238,13 @@ def RPC(func):  # pylint: disable=invalid-name
     If not given, the default timeout will be used. When waiting for an RPC to
     return, iTerm2 will stop waiting for the RPC after the timeout elapses.
 
+    `async_register` also takes an optional `executor` argument. CPU-bound
+    functions block the event loop while they run, delaying notifications
+    and other RPCs. Pass `executor="process"` to run the function in a shared
+    pool of worker processes, or pass an :class:`RPCProcessPool` to control
+    the number of workers. The decorated function may then be a regular
+    (non-async) function. See :class:`RPCProcessPool` for restrictions.
+
     Do not use default values for arguments in your decorated coroutine, with
     one exception: a special kind of default value of type
     :class:`iterm2.Reference`. It names a variable that is visible in the
@@ -115,15 +281,25 @@ def RPC(func):  # pylint: disable=invalid-name
           # Remember to call async_register!
           await split_current_session_n_times.async_register(connection)
     """
-    async def async_register(connection, timeout=None):
+    async def async_register(connection, timeout=None, executor=None):
         signature = inspect.signature(func)
         defaults = {}
         for key, value in signature.parameters.items():
             if isinstance(value.default, Reference):
                 defaults[key] = value.default.name
 
+        pool = _process_pool_for_executor(executor)
+        if pool is None:
+            coro = func
+        else:
+            await pool._async_prepare()  # pylint: disable=protected-access
+
+            async def coro(**kwargs):
+                """handle_rpc->generic_handle_rpc->coro->pool->func"""
+                return await pool.async_call(func, kwargs)
+
         async def handle_rpc(connection, notif):
-            await generic_handle_rpc(func, connection, notif)
+            await generic_handle_rpc(coro, connection, notif)
 
         func.rpc_token = (
             await iterm2.notifications.
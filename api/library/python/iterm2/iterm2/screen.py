@@ -3,15 +3,20 @@ import asyncio
 import typing
 
 import iterm2.api_pb2
+import iterm2.connection
 import iterm2.notifications
 import iterm2.rpc
 import iterm2.util
 
-from enum import Enum
+from enum import Enum, IntEnum, IntFlag
 from iterm2.api_pb2 import CellStyle as ProtoCellStyle, RGBColor as ProtoRGBColor, URL as ProtoURL, AlternateColor as ProtoAlternateColor, ImagePlaceholderType as ProtoImagePlaceholderType
 
 class CellStyle:
+    __slots__ = ("_proto",)
+
     class RGBColor:
+        __slots__ = ("_color",)
+
         def __init__(self, color: ProtoRGBColor):
             """
             Initialize RGBColor, which defines a color in sRGB with 8-bit
@@ -49,6 +54,8 @@ class CellStyle:
             return self._color.blue
 
     class URL:
+        __slots__ = ("_url",)
+
         def __init__(self, url: ProtoURL):
             """
             Initialize URL.
@@ -81,6 +88,8 @@ class CellStyle:
         SYSTEM_MESSAGE = ProtoAlternateColor.SYSTEM_MESSAGE  #: A message from the terminal emulator itself (e.g., a "session ended" message).
 
     class Color:
+        __slots__ = ("_standard", "_alternate", "_rgb", "_placement")
+
         def __init__(self,
                      standard: typing.Optional[int] = None,
                      alternate: typing.Optional['CellStyle.AlternateColor'] = None,
@@ -325,20 +334,40 @@ class LineContents:
     """Describes the contents of a line."""
     def __init__(self, proto):
         self.__proto = proto
+        # Per-cell tables are built on first use. Callers that only want the
+        # text, or a substring, never pay for them.
+        self.__offset_of_cell = None
+        self.__length_of_cell = None
+        self.__styles = None
+
+    def __build_cell_tables(self):
         self.__offset_of_cell = [0]
         self.__length_of_cell = []
-        self.__styles = []
         offset = 0
-        for cppc in proto.code_points_per_cell:
+        for cppc in self.__proto.code_points_per_cell:
             for i in range(cppc.repeats):  # pylint: disable=unused-variable
                 offset += cppc.num_code_points
                 self.__offset_of_cell.append(offset)
                 self.__length_of_cell.append(cppc.num_code_points)
-        for style in proto.style:
+
+    def __build_styles(self):
+        self.__styles = []
+        for style in self.__proto.style:
             cs = CellStyle(style)
             for i in range(style.repeats):  # pylint: disable=unused-variable
                 self.__styles.append(cs)
 
+    def __offset_of(self, x: int) -> int:
+        """Returns the offset into the text of cell `x` without expanding the
+        run-length encoded cell sizes."""
+        offset = 0
+        for cppc in self.__proto.code_points_per_cell:
+            if x <= cppc.repeats:
+                return offset + x * cppc.num_code_points
+            x -= cppc.repeats
+            offset += cppc.repeats * cppc.num_code_points
+        return offset
+
     @property
     def string(self) -> str:
         """
@@ -353,16 +382,43 @@ class LineContents:
         :returns: A string giving the contents of the cell at that index, or
             empty string if none.
         """
+        if self.__offset_of_cell is None:
+            self.__build_cell_tables()
         offset = self.__offset_of_cell[x]
         limit = offset + self.__length_of_cell[x]
         return self.__proto.text[offset:limit]
 
+    def substring(self, start: int, end: typing.Optional[int] = None) -> str:
+        """Returns the text of a run of cells.
+
+        :param start: The index of the first cell.
+        :param end: The index of the first cell after the run, or `None` to
+            include every cell through the end of the line.
+        :returns: The text of cells `start` up to `end`. Indices beyond the
+            last cell are clamped, so this may be empty.
+        """
+        count = self.number_of_cells
+        if end is None or end > count:
+            end = count
+        start = min(max(start, 0), count)
+        if end <= start:
+            return ""
+        return self.__proto.text[self.__offset_of(start):self.__offset_of(end)]
+
+    @property
+    def number_of_cells(self) -> int:
+        """
+        :returns: The number of cells described by this line."""
+        return sum(cppc.repeats for cppc in self.__proto.code_points_per_cell)
+
     def style_at(self, x: int) -> typing.Optional[CellStyle]:
         """Returns the style of the cell at index `x`.
 
         :param x: The index to look up.
         :returns: A `CellStyle` describing the style of the cell at that index or None if `x` is out of range. Note that `x` will be considered out-of-range for uninitialized cells (those that have not been modified since the screen was cleared).
         """
+        if self.__styles is None:
+            self.__build_styles()
         if x >= 0 and x < len(self.__styles):
             return self.__styles[x]
         return None
@@ -379,6 +435,156 @@ class LineContents:
                 "CONTINUATION_HARD_EOL"))
 
 
+def _import_numpy():
+    """Imports NumPy, which is needed only by array exports."""
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as exception:
+        raise ImportError(
+            "NumPy is required to export screen contents as arrays. "
+            "Install it with `pip install iterm2[numpy]`.") from exception
+    return numpy
+
+
+class StyleArrays:
+    """The cell styles of a :class:`ScreenContents` as NumPy arrays.
+
+    Create one with :meth:`ScreenContents.to_arrays`.
+
+    :attr:`cells` is a structured array with one element per cell, shaped
+    lines × columns. Its fields are:
+
+    * `fg_kind`, `bg_kind`: A :class:`StyleArrays.ColorKind` saying how to
+      interpret the color value.
+    * `fg`, `bg`: The color value.
+    * `flags`: A bitwise OR of :class:`StyleArrays.Flag` values.
+    * `url`: 0 if the cell has no URL, otherwise 1 plus the URL's index in
+      :attr:`urls`.
+
+    For example, to find bold cells with a red standard foreground color:
+
+      .. code-block:: python
+
+          arrays = contents.to_arrays()
+          cells = arrays.cells
+          mask = ((cells["fg_kind"] == iterm2.StyleArrays.ColorKind.STANDARD) &
+                  (cells["fg"] == 1) &
+                  (cells["flags"] & iterm2.StyleArrays.Flag.BOLD != 0))
+    """
+
+    class ColorKind(IntEnum):
+        """How to interpret a color value in :attr:`StyleArrays.cells`."""
+        NONE = 0  #: No color. Also used for cells past the end of a line.
+        STANDARD = 1  #: An index into the 256-color palette.
+        ALTERNATE = 2  #: A :class:`CellStyle.AlternateColor` value.
+        RGB = 3  #: A 24-bit color as `0xRRGGBB`.
+        PLACEMENT = 4  #: An image placeholder's coordinate.
+
+    class Flag(IntFlag):
+        """Bits of the `flags` field of :attr:`StyleArrays.cells`."""
+        BOLD = 1 << 0
+        FAINT = 1 << 1
+        ITALIC = 1 << 2
+        BLINK = 1 << 3
+        UNDERLINE = 1 << 4
+        STRIKETHROUGH = 1 << 5
+        INVISIBLE = 1 << 6
+        INVERSE = 1 << 7
+        GUARDED = 1 << 8
+
+    FIELDS = [
+        ("fg_kind", "u1"),
+        ("fg", "u4"),
+        ("bg_kind", "u1"),
+        ("bg", "u4"),
+        ("flags", "u2"),
+        ("url", "u4")]
+    """The fields of :attr:`cells`, as a NumPy dtype specification."""
+
+    def __init__(self, cells, lengths, urls: typing.List[CellStyle.URL]):
+        self.__cells = cells
+        self.__lengths = lengths
+        self.__urls = urls
+
+    @property
+    def cells(self):
+        """A structured array of cell styles shaped lines × columns."""
+        return self.__cells
+
+    @property
+    def lengths(self):
+        """An array giving the number of styled cells on each line.
+
+        Cells after them are uninitialized or were not fetched with style, and
+        have all fields set to 0."""
+        return self.__lengths
+
+    @property
+    def urls(self) -> typing.List[CellStyle.URL]:
+        """The distinct URLs in :attr:`cells`. URL id `n` is `urls[n - 1]`."""
+        return self.__urls
+
+
+def _field_numbers(mapping):
+    """Converts a dict keyed by CellStyle field name to one keyed by number."""
+    fields = ProtoCellStyle.DESCRIPTOR.fields_by_name
+    return {fields[name].number: value for name, value in mapping.items()}
+
+
+_FLAG_BITS = _field_numbers({
+    "bold": int(StyleArrays.Flag.BOLD),
+    "faint": int(StyleArrays.Flag.FAINT),
+    "italic": int(StyleArrays.Flag.ITALIC),
+    "blink": int(StyleArrays.Flag.BLINK),
+    "underline": int(StyleArrays.Flag.UNDERLINE),
+    "strikethrough": int(StyleArrays.Flag.STRIKETHROUGH),
+    "invisible": int(StyleArrays.Flag.INVISIBLE),
+    "inverse": int(StyleArrays.Flag.INVERSE),
+    "guarded": int(StyleArrays.Flag.GUARDED)})
+# Maps a color field's number to (index in the record, kind).
+_COLOR_FIELDS = _field_numbers({
+    "fgStandard": (0, int(StyleArrays.ColorKind.STANDARD)),
+    "fgAlternate": (0, int(StyleArrays.ColorKind.ALTERNATE)),
+    "fgRgb": (0, int(StyleArrays.ColorKind.RGB)),
+    "fgAlternatePlacementX": (0, int(StyleArrays.ColorKind.PLACEMENT)),
+    "bgStandard": (2, int(StyleArrays.ColorKind.STANDARD)),
+    "bgAlternate": (2, int(StyleArrays.ColorKind.ALTERNATE)),
+    "bgRgb": (2, int(StyleArrays.ColorKind.RGB)),
+    "bgAlternatePlacementY": (2, int(StyleArrays.ColorKind.PLACEMENT))})
+_URL_FIELD = ProtoCellStyle.DESCRIPTOR.fields_by_name["url"].number
+
+
+def _style_record(style, url_ids, urls):
+    """Returns a StyleArrays.FIELDS tuple for a CellStyle proto.
+
+    Only the fields that are set are visited, which is much faster than
+    testing each one."""
+    record = [0, 0, 0, 0, 0, 0]
+    for field, value in style.ListFields():
+        number = field.number
+        bit = _FLAG_BITS.get(number)
+        if bit is not None:
+            if value:
+                record[4] |= bit
+            continue
+        color = _COLOR_FIELDS.get(number)
+        if color is not None:
+            index, kind = color
+            record[index] = kind
+            if kind == StyleArrays.ColorKind.RGB:
+                value = (value.red << 16) | (value.green << 8) | value.blue
+            record[index + 1] = value
+        elif number == _URL_FIELD:
+            key = (value.url, value.identifier)
+            url_id = url_ids.get(key)
+            if url_id is None:
+                urls.append(CellStyle.URL(value))
+                url_id = len(urls)
+                url_ids[key] = url_id
+            record[5] = url_id
+    return tuple(record)
+
+
 class ScreenContents:
     """Describes screen contents."""
     def __init__(self, proto):
@@ -413,6 +619,72 @@ class ScreenContents:
         """
         return LineContents(self.__proto.contents[index])
 
+    def to_arrays(self, columns: typing.Optional[int] = None) -> StyleArrays:
+        """Decodes the cell styles into NumPy arrays.
+
+        This is much faster than calling :meth:`LineContents.style_at` for
+        every cell, because the run-length encoded styles are expanded by
+        NumPy rather than into a Python object per cell. The contents must
+        have been fetched with style information; otherwise every cell is
+        unstyled.
+
+        NumPy is an optional dependency. Install it with
+        `pip install iterm2[numpy]`.
+
+        :param columns: The width of the arrays. Longer lines are truncated.
+            Defaults to the length of the longest line.
+
+        :returns: A :class:`StyleArrays`.
+
+        :throws: ImportError if NumPy is not installed.
+        """
+        numpy = _import_numpy()
+        urls = []
+        url_ids = {}
+        # Terminals reuse a handful of styles, so decode each one only once.
+        # The serialized form includes `repeats`, which is harmless.
+        known_records = {}
+        line_runs = []
+        for line in self.__proto.contents:
+            runs = []
+            for style in line.style:
+                key = style.SerializeToString()
+                record = known_records.get(key)
+                if record is None:
+                    record = _style_record(style, url_ids, urls)
+                    known_records[key] = record
+                runs.append((record, style.repeats))
+            line_runs.append(runs)
+        lengths = [sum(count for _, count in runs) for runs in line_runs]
+        if columns is None:
+            columns = max(lengths, default=0)
+
+        # Truncate each line to `columns` and pad it with an unstyled run so
+        # that expanding all the runs at once yields the cells in row-major
+        # order.
+        padding = (0, 0, 0, 0, 0, 0)
+        records = []
+        repeats = []
+        for runs in line_runs:
+            remaining = columns
+            for record, count in runs:
+                if remaining <= 0:
+                    break
+                records.append(record)
+                repeats.append(min(count, remaining))
+                remaining -= count
+            if remaining > 0:
+                records.append(padding)
+                repeats.append(remaining)
+        cells = numpy.repeat(
+            numpy.array(records, dtype=numpy.dtype(StyleArrays.FIELDS)),
+            numpy.array(repeats, dtype=numpy.int64))
+        cells = cells.reshape((len(line_runs), columns))
+        return StyleArrays(
+            cells,
+            numpy.minimum(numpy.array(lengths, dtype=numpy.int64), columns),
+            urls)
+
     @property
     def cursor_coord(self) -> iterm2.util.Point:
         """Returns the location of the cursor.
@@ -508,3 +780,187 @@ class ScreenStreamer:
         raise iterm2.rpc.RPCException(
             iterm2.api_pb2.GetBufferResponse.Status.Name(
                 result.get_buffer_response.status))
+
+
+class _CachedSession:
+    """The cache's state for one session."""
+    def __init__(self):
+        self.generation = 0
+        self.token = None
+        self.subscribed: typing.Optional[asyncio.Future] = None
+        # Maps style to a future for the contents at `generation`.
+        self.fetches: typing.Dict[bool, asyncio.Future] = {}
+        self.eviction: typing.Optional[asyncio.TimerHandle] = None
+
+
+class ScreenContentsCache:
+    """Shares screen contents among callers until the screen changes.
+
+    When several parts of a script fetch the screen contents of a session
+    after the same update, each would otherwise make its own request. This
+    cache subscribes to screen updates for each session it is asked about
+    and counts them in a per-session generation number. Requests made in the
+    same generation share a single fetch, even while it is still in flight.
+
+    A session that hasn't been asked about for `idle_timeout` seconds is
+    evicted and its subscription cancelled.
+
+    You can create your own cache or use the shared one by passing
+    `cached=True` to :meth:`~iterm2.Session.async_get_screen_contents`.
+
+    :param connection: The connection to iTerm2.
+    :param idle_timeout: Seconds after the last request for a session before
+        it is evicted.
+    """
+    #: The cache returned by :func:`get_shared_screen_contents_cache`.
+    instance: typing.Optional['ScreenContentsCache'] = None
+
+    def __init__(self, connection, idle_timeout: float = 30.0):
+        self.__connection = connection
+        self.__idle_timeout = idle_timeout
+        self.__sessions: typing.Dict[str, _CachedSession] = {}
+
+    @property
+    def connection(self):
+        """The connection this cache fetches with."""
+        return self.__connection
+
+    def generation(self, session_id: str) -> typing.Optional[int]:
+        """Returns the number of screen updates seen for a session.
+
+        :param session_id: The session ID.
+        :returns: The generation number, or `None` if the session isn't
+            cached.
+        """
+        entry = self.__sessions.get(session_id)
+        return None if entry is None else entry.generation
+
+    async def async_get(
+            self,
+            session_id: str,
+            style: bool = True) -> ScreenContents:
+        """Returns the contents of the mutable area of a session's screen.
+
+        :param session_id: The session ID.
+        :param style: If `True`, include style information. Contents fetched
+            with style are also used to answer requests without it.
+
+        :returns: A :class:`ScreenContents`. Callers in the same generation
+            get the same object, so don't modify it.
+
+        :throws: :class:`~iterm2.rpc.RPCException` if something goes wrong.
+        """
+        entry = self.__sessions.get(session_id)
+        if entry is None:
+            entry = _CachedSession()
+            self.__sessions[session_id] = entry
+        self.__touch(session_id, entry)
+
+        if entry.subscribed is None:
+            entry.subscribed = asyncio.ensure_future(
+                self.__async_subscribe(session_id, entry))
+        try:
+            await asyncio.shield(entry.subscribed)
+        except iterm2.notifications.SubscriptionException:
+            if self.__sessions.get(session_id) is entry:
+                self.__evict(session_id)
+            raise
+
+        fetch = entry.fetches.get(style) or entry.fetches.get(True)
+        if fetch is None or (fetch.done() and (
+                fetch.cancelled() or fetch.exception() is not None)):
+            fetch = asyncio.ensure_future(
+                self.__async_fetch(session_id, style))
+            entry.fetches[style] = fetch
+        # Shield the shared fetch so a caller that is cancelled doesn't
+        # cancel it for everyone else.
+        return await asyncio.shield(fetch)
+
+    async def async_close(self) -> None:
+        """Evicts every session and cancels the subscriptions."""
+        for session_id in list(self.__sessions):
+            await self.__async_evict(session_id)
+
+    def discard(self) -> None:
+        """Forgets every session without unsubscribing.
+
+        Use this instead of :meth:`async_close` once the connection has
+        closed, when there is nobody left to unsubscribe from.
+        """
+        for session_id in list(self.__sessions):
+            self.__evict(session_id)
+
+    async def __async_subscribe(self, session_id, entry):
+        async def async_on_update(_connection, _message):
+            entry.generation += 1
+            entry.fetches = {}
+
+        entry.token = await (
+            iterm2.notifications.
+            async_subscribe_to_screen_update_notification(
+                self.__connection,
+                async_on_update,
+                session_id))
+
+    async def __async_fetch(self, session_id, style):
+        # pylint: disable=no-member
+        result = await iterm2.rpc.async_get_screen_contents(
+            self.__connection,
+            session_id,
+            None,
+            style)
+        if (result.get_buffer_response.status == iterm2.
+                api_pb2.GetBufferResponse.Status.Value("OK")):
+            return ScreenContents(result.get_buffer_response)
+        raise iterm2.rpc.RPCException(
+            iterm2.api_pb2.GetBufferResponse.Status.Name(
+                result.get_buffer_response.status))
+
+    def __touch(self, session_id, entry):
+        if entry.eviction is not None:
+            entry.eviction.cancel()
+        entry.eviction = asyncio.get_running_loop().call_later(
+            self.__idle_timeout,
+            lambda: asyncio.ensure_future(self.__async_evict(session_id)))
+
+    def __evict(self, session_id):
+        entry = self.__sessions.pop(session_id)
+        if entry.eviction is not None:
+            entry.eviction.cancel()
+        return entry
+
+    async def __async_evict(self, session_id):
+        if session_id not in self.__sessions:
+            return
+        entry = self.__evict(session_id)
+        if entry.subscribed is None:
+            return
+        try:
+            await entry.subscribed
+            await iterm2.notifications.async_unsubscribe(
+                self.__connection, entry.token)
+        except iterm2.notifications.SubscriptionException:
+            pass
+
+
+def get_shared_screen_contents_cache(connection) -> ScreenContentsCache:
+    """Returns the :class:`ScreenContentsCache` shared by everything that uses
+    `connection`, creating it if needed.
+
+    The shared cache is discarded when the connection closes. If it was made
+    for a different connection, it is closed and replaced."""
+    cache = ScreenContentsCache.instance
+    if cache is not None and cache.connection is not connection:
+        asyncio.ensure_future(cache.async_close())
+        cache = None
+    if cache is None:
+        cache = ScreenContentsCache(connection)
+        ScreenContentsCache.instance = cache
+        iterm2.connection.add_disconnect_callback(
+            _invalidate_shared_screen_contents_cache)
+    return cache
+
+def _invalidate_shared_screen_contents_cache():
+    if ScreenContentsCache.instance is not None:
+        ScreenContentsCache.instance.discard()
+    ScreenContentsCache.instance = None
@@ -1,11 +1,11 @@
 """Provides interfaces for interacting with selected text regions."""
+import asyncio
 import enum
-import itertools
-from operator import itemgetter
 import typing
 
 import iterm2.api_pb2
 import iterm2.connection
+import iterm2.rpc
 import iterm2.screen
 import iterm2.util
 
@@ -106,15 +106,13 @@ class SubSelection:
                 api_pb2.GetBufferResponse.Status.Value("OK")):
             screen_contents = iterm2.screen.ScreenContents(
                 result.get_buffer_response)
-            built_string = ""
-            i = 0
-            while i < screen_contents.number_of_lines:
+            parts = []
+            for i in range(screen_contents.number_of_lines):
                 line = screen_contents.line(i)
-                i += 1
-                built_string += line.string
+                parts.append(line.string)
                 if line.hard_eol:
-                    built_string += "\n"
-            return built_string
+                    parts.append("\n")
+            return "".join(parts)
         raise iterm2.rpc.RPCException(
             iterm2.api_pb2.GetBufferResponse.Status.Name(
                 result.get_buffer_response.status))
@@ -122,29 +120,38 @@ class SubSelection:
     # pylint: disable=invalid-name
     def enumerate_ranges(self, callback):
         """Invoke callback for each selected range."""
-        if self.__windowed_coord_range.hasWindow:
-            right = self.__windowed_coord_range.right
-            start_x = self.__windowed_coord_range.start.x
-            y = self.__windowed_coord_range.coordRange.start.y
-            while y < self.__windowed_coord_range.coordRange.end.y:
-                callback(iterm2.util.CoordRange(
-                    iterm2.util.Point(start_x, y),
-                    iterm2.util.Point(right, y)))
-                start_x = self.__windowed_coord_range.left
-
-                y += 1
-
-            callback(iterm2.util.CoordRange(
-                iterm2.util.Point(
-                    start_x,
-                    self.__windowed_coord_range.coordRange.end.y),
-                iterm2.util.Point(
-                    self.__windowed_coord_range.end.x,
-                    self.__windowed_coord_range.coordRange.end.y)))
-        else:
-            callback(self.__windowed_coord_range.coordRange, self)
+        for coord_range in self._row_ranges():
+            callback(coord_range)
     # pylint: enable=invalid-name
 
+    def _row_ranges(self) -> typing.Iterator[iterm2.util.CoordRange]:
+        """Yields the selected ranges.
+
+        A windowed range gives one range per row. Otherwise the whole range
+        is yielded.
+        """
+        windowed_coord_range = self.__windowed_coord_range
+        if not windowed_coord_range.hasWindow:
+            yield windowed_coord_range.coordRange
+            return
+        right = windowed_coord_range.right
+        start_x = windowed_coord_range.start.x
+        y = windowed_coord_range.coordRange.start.y
+        while y < windowed_coord_range.coordRange.end.y:
+            yield iterm2.util.CoordRange(
+                iterm2.util.Point(start_x, y),
+                iterm2.util.Point(right, y))
+            start_x = windowed_coord_range.left
+            y += 1
+
+        yield iterm2.util.CoordRange(
+            iterm2.util.Point(
+                start_x,
+                windowed_coord_range.coordRange.end.y),
+            iterm2.util.Point(
+                windowed_coord_range.end.x,
+                windowed_coord_range.coordRange.end.y))
+
 
 class Selection:
     """
@@ -168,28 +175,6 @@ class Selection:
         """Returns the set of subselections."""
         return self.__sub_selections
 
-    async def _async_get_content_in_range(
-            self, connection, session_id, coord_range):
-        """Returns the string in the given range."""
-        result = await iterm2.rpc.async_get_screen_contents(
-            connection,
-            session_id,
-            coord_range)
-        # pylint: disable=no-member
-        if (result.get_buffer_response.status == iterm2.
-                api_pb2.GetBufferResponse.Status.Value("OK")):
-            screen_contents = iterm2.screen.ScreenContents(
-                result.get_buffer_response)
-            built_string = ""
-            i = 0
-            while i < screen_contents.number_of_lines:
-                line = screen_contents.line(i)
-                i += 1
-                built_string += line.string
-                if line.hard_eol:
-                    built_string += "\n"
-            return built_string
-
     async def async_get_string(
             self,
             connection: iterm2.connection.Connection,
@@ -206,18 +191,18 @@ class Selection:
             return await self.__sub_selections[0].async_get_string(
                 connection, session_id)
 
-        result = ""
-
-        async def handle_range(coord_range, eol):
-            content = await self._async_get_content_in_range(
-                connection, session_id, coord_range)
-            nonlocal result
-            result += content
-            if eol and not content.endswith("\n"):
-                result += "\n"
+        intervals, connectors = self._intervals(width)
+        rows = await _async_get_rows(
+            connection, session_id, _rows_spanned(intervals, width))
 
-        await self.async_enumerate_ranges(width, handle_range)
-        return result
+        parts = []
+        for idx, (start, end) in enumerate(intervals):
+            content = _text_in_interval(rows, start, end, width)
+            parts.extend(content)
+            eol = end not in connectors and idx + 1 < len(intervals)
+            if eol and not (content and content[-1].endswith("\n")):
+                parts.append("\n")
+        return "".join(parts)
 
     async def async_enumerate_ranges(self, width, callback):
         """
@@ -231,105 +216,145 @@ class Selection:
 
         :returns: A string with the selected text.
         """
-        # pylint: disable=too-many-locals
-        if len(self.__sub_selections) == 0:
-            return
-
-        # Ranges ending at connectors don't get a newline following.
-        connectors = set()
-        indexes = set()
-        for outer in self.__sub_selections:
-            if outer.connected:
-                the_position = (
-                    outer.windowed_coord_range.coordRange.end.x +
-                    outer.windowed_coord_range.coordRange.end.y * width)
-                connectors |= {the_position}
-
-            the_range = iterm2.util.Range(0, 0)
-
-            # It's OK to disable it because handle_range does not escape the
-            # loop where outer iterates subselections.
-            # pylint: disable=cell-var-from-loop
-            def handle_range(outer_range):
-                # pylint: disable=invalid-name
-                nonlocal indexes
-                nonlocal the_range
-                nonlocal connectors
-                the_range = iterm2.util.Range(
-                    outer_range.start.x + outer_range.start.y * width,
-                    outer_range.length(width))
-
-                indexes_to_add = the_range.toSet
-                indexes_to_remove = set()
-
-                def f(values):
-                    i, x = values
-                    return i-x
-
-                # Iterate contiguous ranges
-                indexes_of_interest = indexes.intersection(indexes_to_add)
-                # pylint: disable=unused-variable
-                for k, g in itertools.groupby(
-                        enumerate(sorted(indexes_of_interest)), f):
-                    # range exists in both indexes and the_range
-                    values_in_range = map(itemgetter(1), g)
-                    indexes_to_remove |= set(values_in_range)
-                    indexes_to_add -= set(values_in_range)
-                indexes -= indexes_to_remove
-                indexes |= indexes_to_add
-
-                # In multipart windowed ranges, add connectors for the endpoint
-                # of all but the last # range. Each enumerated range is on its
-                # own line.
-                if (outer.windowed_coord_range.hasWindow and
-                        outer_range.end == outer.windowed_coord_range.
-                        coordRange.end and
-                        the_range.length > 0):
-                    connectors |= {the_range.max}
-
-            outer.enumerate_ranges(handle_range)
-
-        # The ranges may be out of order so put them in an array and then sort
-        # it.
-        all_ranges = []
-
-        # pylint: disable=invalid-name
-        def f(values):
-            i, x = values
-            return i - x
-        # pylint: enable=invalid-name
-
-        # Iterate contiguous ranges
-        # pylint: disable=unused-variable
-        for k, range_group in itertools.groupby(enumerate(sorted(indexes)), f):
-            # range exists in both indexes and the_range
-            values_in_range = list(map(itemgetter(1), range_group))
+        intervals, connectors = self._intervals(width)
+        for idx, (start, end) in enumerate(intervals):
+            eol = end not in connectors and idx + 1 < len(intervals)
             coord_range = iterm2.util.CoordRange(
+                iterm2.util.Point(start % width, start // width),
                 iterm2.util.Point(
-                    min(values_in_range) % width,
-                    min(values_in_range) // width),
-                iterm2.util.Point(
-                    max(values_in_range) % width,
-                    max(values_in_range) // width))
-            all_ranges.append(coord_range)
-
-        def range_key(a_range):
-            return a_range.start.y * width + a_range.start.x
-
-        sorted_ranges = sorted(all_ranges, key=range_key)
-        for idx, the_range in enumerate(sorted_ranges):
-            end_index = (
-                the_range.start.x +
-                the_range.start.y * width +
-                the_range.length(width))
-            eol = (end_index not in connectors) and idx + 1 < len(
-                sorted_ranges)
-            the_range.end.x += 1
+                    (end - 1) % width + 1, (end - 1) // width))
             stop = await callback(
-                iterm2.util.WindowedCoordRange(the_range), eol)
+                iterm2.util.WindowedCoordRange(coord_range), eol)
             if stop:
                 break
 
+    def _intervals(
+            self,
+            width: int) -> typing.Tuple[
+                typing.List[typing.Tuple[int, int]], typing.Set[int]]:
+        """Computes the selected cells as sorted, disjoint intervals.
+
+        Cells are numbered y * width + x. Overlapping or adjacent ranges are
+        merged.
+
+        :returns: A list of half-open `(start, end)` intervals and the set of
+            interval ends that are not followed by a newline.
+        """
+        # Ranges ending at connectors don't get a newline following.
+        connectors = set()
+        ranges = []
+        for sub_selection in self.__sub_selections:
+            if sub_selection.connected:
+                windowed_coord_range = sub_selection.windowed_coord_range
+                connectors.add(
+                    windowed_coord_range.coordRange.end.x +
+                    windowed_coord_range.coordRange.end.y * width)
+            # pylint: disable=protected-access
+            for coord_range in sub_selection._row_ranges():
+                start = coord_range.start.x + coord_range.start.y * width
+                end = coord_range.end.x + coord_range.end.y * width
+                if end <= start:
+                    continue
+                # Each row of a windowed range is on its own line, so only
+                # connected sub-selections suppress the newline.
+                ranges.append((start, end))
+
+        ranges.sort()
+        intervals = []
+        for start, end in ranges:
+            if intervals and start <= intervals[-1][1]:
+                if end > intervals[-1][1]:
+                    intervals[-1] = (intervals[-1][0], end)
+            else:
+                intervals.append((start, end))
+        return intervals, connectors
+
+
+#: The most rows fetched by one request when extracting a selection.
+ROWS_PER_REQUEST = 1000
+
+
+def _rows_spanned(
+        intervals: typing.List[typing.Tuple[int, int]],
+        width: int) -> typing.List[typing.Tuple[int, int]]:
+    """Returns the half-open spans of rows touched by sorted intervals."""
+    spans = []
+    for start, end in intervals:
+        first = start // width
+        last = (end - 1) // width + 1
+        if spans and first <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(last, spans[-1][1]))
+        else:
+            spans.append((first, last))
+    return spans
+
+
+async def _async_get_rows(
+        connection: iterm2.connection.Connection,
+        session_id: str,
+        spans: typing.List[typing.Tuple[int, int]]
+        ) -> typing.Dict[int, iterm2.screen.LineContents]:
+    """Fetches whole rows, issuing the requests concurrently.
+
+    :returns: A dictionary from line number to contents. Rows that are no
+        longer in history are absent.
+    """
+    chunks = []
+    for first, last in spans:
+        for y in range(first, last, ROWS_PER_REQUEST):
+            chunks.append((y, min(y + ROWS_PER_REQUEST, last)))
+
+    async def async_fetch(first, last):
+        result = await iterm2.rpc.async_get_screen_contents(
+            connection,
+            session_id,
+            iterm2.util.WindowedCoordRange(
+                iterm2.util.CoordRange(
+                    iterm2.util.Point(0, first),
+                    iterm2.util.Point(0, last))))
+        # pylint: disable=no-member
+        if (result.get_buffer_response.status != iterm2.
+                api_pb2.GetBufferResponse.Status.Value("OK")):
+            raise iterm2.rpc.RPCException(
+                iterm2.api_pb2.GetBufferResponse.Status.Name(
+                    result.get_buffer_response.status))
+        return iterm2.screen.ScreenContents(result.get_buffer_response)
+
+    contents = await asyncio.gather(
+        *[async_fetch(first, last) for first, last in chunks])
+
+    rows = {}
+    for (first, last), screen_contents in zip(chunks, contents):
+        # Lines lost from history are missing from the start of the
+        # response.
+        n = screen_contents.number_of_lines
+        for i in range(n):
+            rows[last - n + i] = screen_contents.line(i)
+    return rows
+
+
+def _text_in_interval(
+        rows: typing.Dict[int, iterm2.screen.LineContents],
+        start: int,
+        end: int,
+        width: int) -> typing.List[str]:
+    """Slices the text of cells `start` up to `end` out of fetched rows.
+
+    A newline follows each row that ends with a hard newline if the interval
+    extends to the end of that row.
+    """
+    parts = []
+    for y in range(start // width, (end - 1) // width + 1):
+        line = rows.get(y)
+        if line is None:
+            continue
+        first_x = max(start - y * width, 0)
+        last_x = min(end - y * width, width)
+        parts.append(line.substring(first_x, last_x))
+        if last_x == width and line.hard_eol:
+            parts.append("\n")
+    return parts
+
 
 MODE_MAP = {
     iterm2.api_pb2.SelectionMode.Value("CHARACTER"):
@@ -142,6 +142,9 @@ class Splitter:
 
 class SessionLineInfo:
     """Describes a session's geometry."""
+
+    __slots__ = ("__line_info",)
+
     def __init__(self, line_info):
         self.__line_info = line_info
 
@@ -170,6 +173,40 @@ class SessionLineInfo:
         return self.__line_info[3]
 
 
+async def async_get_line_info(
+        connection: iterm2.connection.Connection,
+        session_id: str) -> SessionLineInfo:
+    """
+    Fetches the number of lines that are visible, in history, and that have
+    been removed after history became full.
+
+    This is the same as :meth:`Session.async_get_line_info` but does not
+    require a :class:`Session` object.
+
+    :param connection: The connection to iTerm2.
+    :param session_id: The session ID.
+
+    :returns: Information about the session's wrapped lines of text.
+
+    :throws: :class:`~iterm2.rpc.RPCException` if something goes wrong.
+    """
+    response = await iterm2.rpc.async_get_property(
+        connection,
+        "number_of_lines",
+        session_id=session_id)
+    status = response.get_property_response.status
+    # pylint: disable=no-member
+    if status != iterm2.api_pb2.GetPropertyResponse.Status.Value("OK"):
+        raise iterm2.rpc.RPCException(
+            iterm2.api_pb2.GetPropertyResponse.Status.Name(status))
+    dictionary = json.loads(response.get_property_response.json_value)
+    values = (dictionary["grid"],
+              dictionary["history"],
+              dictionary["overflow"],
+              dictionary["first_visible"])
+    return SessionLineInfo(values)
+
+
 class Session:
     """
     Represents an iTerm2 session.
@@ -326,14 +363,24 @@ class Session:
         """
         return self.__session_id
 
-    async def async_get_screen_contents(self) -> iterm2.screen.ScreenContents:
+    async def async_get_screen_contents(
+            self,
+            cached: bool = False) -> iterm2.screen.ScreenContents:
         """
         Returns the contents of the mutable area of the screen.
 
+        :param cached: If `True`, use the shared
+            :class:`~iterm2.ScreenContentsCache` so that callers asking after
+            the same screen update share one request. The returned object may
+            be shared, so don't modify it.
+
         :returns: A :class:`iterm2.screen.ScreenContents`, containing the
             screen contents.
         :throws: :class:`~iterm2.rpc.RPCException` if something goes wrong.
         """
+        if cached:
+            return await iterm2.screen.get_shared_screen_contents_cache(
+                self.connection).async_get(self.session_id)
         # pylint: disable=no-member
         result = await iterm2.rpc.async_get_screen_contents(
             self.connection,
@@ -849,21 +896,7 @@ class Session:
 
         .. seealso:: Example ":ref:`zoom_on_screen_example`"
         """
-        response = await iterm2.rpc.async_get_property(
-            self.connection,
-            "number_of_lines",
-            session_id=self.session_id)
-        status = response.get_property_response.status
-        # pylint: disable=no-member
-        if status != iterm2.api_pb2.GetPropertyResponse.Status.Value("OK"):
-            raise iterm2.rpc.RPCException(
-                iterm2.api_pb2.GetPropertyResponse.Status.Name(status))
-        dictionary = json.loads(response.get_property_response.json_value)
-        values = (dictionary["grid"],
-                  dictionary["history"],
-                  dictionary["overflow"],
-                  dictionary["first_visible"])
-        return SessionLineInfo(values)
+        return await async_get_line_info(self.connection, self.session_id)
 
     async def async_set_name(self, name: str):
         """Changes the session's name.
@@ -11,6 +11,8 @@ class Size:
 
     Can be used where api_pb2.Size is accepted."""
 
+    __slots__ = ("__width", "__height")
+
     def __init__(self, width: int, height: int):
         """Constructs a new size.
 
@@ -75,6 +77,8 @@ class Point:
 
     Can be used where api_pb2.Point is accepted."""
 
+    __slots__ = ("__x", "__y")
+
     def __init__(self, x: int, y: int):
         """Constructs a new point.
 
@@ -141,11 +145,14 @@ class Point:
         return NotImplemented
 
     def __hash__(self):
-        return hash(tuple(sorted(self.__dict__.items())))
+        return hash((self.x, self.y))
 
 
 class Frame:
     """Describes a bounding rectangle. 0,0 is the bottom left coordinate."""
+
+    __slots__ = ("__origin", "__size")
+
     def __init__(self, origin: Point = Point(0, 0), size: Size = Size(0, 0)):
         """Constructs a new frame."""
         self.__origin = origin
@@ -262,6 +269,9 @@ class CoordRange:
 
     :param start: The start point.
     :param end: The first point after the start point not in the range."""
+
+    __slots__ = ("__start", "__end")
+
     def __init__(self, start: Point, end: Point):
         self.__start = start
         self.__end = end
@@ -307,6 +317,9 @@ class Range:
 
     :param location: The first value in the range.
     :param length: The number of values in the range."""
+
+    __slots__ = ("__location", "__length")
+
     def __init__(self, location: int, length: int):
         self.__location = location
         self.__length = length
@@ -357,6 +370,9 @@ class WindowedCoordRange:
     :param columnRange: The range of columns to intersect with `coordRange` to
         get the described region, or `None` if unwindowed.
     """
+
+    __slots__ = ("___coord_range", "__column_range")
+
     def __init__(
             self,
             coordRange: CoordRange,
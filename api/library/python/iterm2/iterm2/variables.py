@@ -9,6 +9,7 @@ import json
 import typing
 
 import iterm2.connection
+import iterm2.monitor
 import iterm2.notifications
 
 
@@ -20,19 +21,32 @@ class VariableScopes(enum.Enum):
     APP = iterm2.api_pb2.VariableScope.Value("APP")  #: Whole-app scope
 
 
-class VariableMonitor:
+def _variable_change_key(notification) -> typing.Tuple[int, str, str]:
+    """Coalescing key for a VariableChangedNotification."""
+    return (notification.scope, notification.identifier, notification.name)
+
+
+class VariableMonitor(iterm2.monitor.BoundedMonitor):
     """
     Watches for changes to a variable.
 
     `VariableMonitor` is a context manager that helps observe changes in iTerm2
     Variables.
 
+    Changes are coalesced: if the variable changes again before you call
+    `async_get()`, only the latest value is delivered. When the identifier is
+    "all" the latest value is kept separately for each object.
+
    :param connection: The connection to iTerm2.
    :param scope: The scope in which the variable should be evaluated.
    :param name: The variable name.
    :param identifier: A tab, window, or session identifier. Must correspond to
        the passed-in scope. If the scope is `APP` this should be None. If the
        scope is `SESSION` or `WINDOW` the identifier may be "all" or "active".
+   :param maxsize: The maximum number of undelivered changes to buffer, or
+       `None` for no limit.
+   :param overflow: What to do when the buffer is full. See
+       :class:`~iterm2.OverflowPolicy`.
 
     .. seealso::
         * Example ":ref:`colorhost_example`"
@@ -47,8 +61,7 @@ class VariableMonitor:
                   iterm2.VariableScopes.SESSION,
                   "jobName",
                   my_session.session_id) as mon:
-              while True:
-                  new_value = await mon.async_get()
+              async for new_value in mon:
                   DoSomething(new_value)
         """
     def __init__(
@@ -56,18 +69,21 @@ class VariableMonitor:
             connection: iterm2.connection.Connection,
             scope: VariableScopes,
             name: str,
-            identifier: typing.Optional[str]):
+            identifier: typing.Optional[str],
+            maxsize: typing.Optional[int] = iterm2.monitor.DEFAULT_MAXSIZE,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow, _variable_change_key)
         self.__connection = connection
         self.__scope = scope
         self.__name = name
         self.__identifier = identifier
         self.__token = None
-        self.__queue: asyncio.Queue = asyncio.Queue()
 
     async def __aenter__(self):
         async def callback(_connection, message):
             """Called when a variable changes."""
-            await self.__queue.put(message)
+            await self._queue.async_put(message)
 
         self.__token = await (
             iterm2.notifications.
@@ -81,7 +97,7 @@ class VariableMonitor:
 
     async def async_get(self) -> typing.Any:
         """Returns the new value of the variable."""
-        result = await self.__queue.get()
+        result = await super().async_get()
         json_new_value = result.json_new_value
         return json.loads(json_new_value)
 
@@ -91,3 +107,104 @@ class VariableMonitor:
                 self.__connection, self.__token)
         except iterm2.notifications.SubscriptionException:
             pass
+
+
+class MultiVariableMonitor(iterm2.monitor.BoundedMonitor):
+    """
+    Watches for changes to many variables in many scopes at once.
+
+    This is like :class:`VariableMonitor` but it accepts a collection of
+    (scope, identifier, name) triples. The subscriptions are sent to iTerm2
+    concurrently rather than one after another, and all changes are delivered
+    through a single stream.
+
+    Changes are coalesced: if a variable changes again before you read it,
+    only its latest value is delivered.
+
+    :param connection: The connection to iTerm2.
+    :param variables: An iterable of (scope, identifier, name) triples. The
+        scope is a :class:`VariableScopes`. The identifier is a tab, window, or
+        session identifier, "all", "active", or `None` for the `APP` scope.
+    :param maxsize: The maximum number of undelivered changes to buffer, or
+        `None` for no limit.
+    :param overflow: What to do when the buffer is full. See
+        :class:`~iterm2.OverflowPolicy`.
+
+    Example:
+
+      .. code-block:: python
+
+          variables = [
+              (iterm2.VariableScopes.SESSION, "all", name)
+              for name in ["jobName", "path", "hostname"]]
+          async with iterm2.MultiVariableMonitor(connection, variables) as mon:
+              async for scope, identifier, name, value in mon:
+                  DoSomething(identifier, name, value)
+    """
+    def __init__(
+            self,
+            connection: iterm2.connection.Connection,
+            variables: typing.Iterable[
+                typing.Tuple[VariableScopes, typing.Optional[str], str]],
+            maxsize: typing.Optional[int] = iterm2.monitor.DEFAULT_MAXSIZE,
+            overflow: iterm2.monitor.OverflowPolicy = (
+                iterm2.monitor.OverflowPolicy.DROP_OLDEST)):
+        super().__init__(maxsize, overflow, _variable_change_key)
+        self.__connection = connection
+        # Remove duplicates but keep the caller's order.
+        self.__variables = list(dict.fromkeys(variables))
+        self.__tokens: typing.List[typing.Any] = []
+
+    async def __aenter__(self):
+        async def callback(_connection, message):
+            """Called when any of the variables changes."""
+            await self._queue.async_put(message)
+
+        results = await asyncio.gather(
+            *[iterm2.notifications.
+              async_subscribe_to_variable_change_notification(
+                  self.__connection,
+                  callback,
+                  scope.value,
+                  name,
+                  identifier)
+              for scope, identifier, name in self.__variables],
+            return_exceptions=True)
+        self.__tokens = [
+            result for result in results
+            if not isinstance(result, BaseException)]
+        for result in results:
+            if isinstance(result, BaseException):
+                await self.__async_unsubscribe_all()
+                raise result
+        return self
+
+    async def async_get(self) -> typing.Tuple[
+            VariableScopes, str, str, typing.Any]:
+        """Returns the next change.
+
+        :returns: A tuple of (scope, identifier, name, new value). The
+            identifier is that of the object whose variable changed, even if
+            you subscribed with "all".
+        """
+        result = await super().async_get()
+        return (VariableScopes(result.scope),
+                result.identifier,
+                result.name,
+                json.loads(result.json_new_value))
+
+    async def __async_unsubscribe_all(self):
+        tokens = self.__tokens
+        self.__tokens = []
+        results = await asyncio.gather(
+            *[iterm2.notifications.async_unsubscribe(self.__connection, token)
+              for token in tokens],
+            return_exceptions=True)
+        for result in results:
+            if (isinstance(result, BaseException) and
+                    not isinstance(
+                        result, iterm2.notifications.SubscriptionException)):
+                raise result
+
+    async def __aexit__(self, exc_type, exc, _tb):
+        await self.__async_unsubscribe_all()
@@ -0,0 +1,533 @@
+"""Creates windows, tabs and split panes from a declarative description."""
+import asyncio
+import time
+import typing
+
+import iterm2.api_pb2
+import iterm2.connection
+import iterm2.profile
+import iterm2.rpc
+import iterm2.session
+import iterm2.window
+
+
+class PaneSpec:
+    """Describes one session in a :class:`WorkspaceSpec`.
+
+    :param profile: The name of the profile to use, or `None` for the
+        default profile.
+    :param command: A command to run in lieu of the shell. Mutually exclusive
+        with `profile_customizations`.
+    :param profile_customizations: Changes to make to the profile for this
+        session only. Mutually exclusive with `command`.
+    :param weight: The share of its splitter's space this pane gets, relative
+        to its siblings.
+    """
+    def __init__(
+            self,
+            profile: typing.Optional[str] = None,
+            command: typing.Optional[str] = None,
+            profile_customizations: typing.Optional[
+                iterm2.profile.LocalWriteOnlyProfile] = None,
+            weight: float = 1.0):
+        self.__profile = profile
+        self.__command = command
+        self.__profile_customizations = profile_customizations
+        self.__weight = weight
+
+    @property
+    def profile(self) -> typing.Optional[str]:
+        """The name of the profile to use, or `None` for the default."""
+        return self.__profile
+
+    @property
+    def command(self) -> typing.Optional[str]:
+        """The command to run in lieu of the shell, or `None`."""
+        return self.__command
+
+    @property
+    def profile_customizations(
+            self) -> typing.Optional[iterm2.profile.LocalWriteOnlyProfile]:
+        """Changes to make to the profile for this session, or `None`."""
+        return self.__profile_customizations
+
+    @property
+    def weight(self) -> float:
+        """The share of its splitter's space this pane gets."""
+        return self.__weight
+
+    def _custom_dict(self) -> typing.Optional[typing.Dict[str, str]]:
+        """Returns profile overrides in the form the RPCs expect."""
+        if self.__command is not None:
+            lwop = iterm2.profile.LocalWriteOnlyProfile()
+            lwop.set_use_custom_command(
+                iterm2.profile.Profile.USE_CUSTOM_COMMAND_ENABLED)
+            lwop.set_command(self.__command)
+            return lwop.values
+        if self.__profile_customizations is not None:
+            return self.__profile_customizations.values
+        return None
+
+
+class SplitSpec:
+    """Describes panes separated by dividers that are all aligned the same
+    way, like :class:`~iterm2.Splitter`.
+
+    :param vertical: If `True` the dividers are vertical, so the children are
+        side by side. Otherwise they are stacked.
+    :param children: At least two :class:`PaneSpec` or :class:`SplitSpec`
+        objects, from left to right or top to bottom. A child
+        :class:`SplitSpec` must have the opposite orientation, as it does in
+        iTerm2's own split trees.
+    :param weight: The share of its parent's space this splitter gets,
+        relative to its siblings.
+
+    :throws: ValueError if the children are invalid.
+    """
+    def __init__(
+            self,
+            vertical: bool,
+            children: typing.Sequence[typing.Union[PaneSpec, 'SplitSpec']],
+            weight: float = 1.0):
+        if len(children) < 2:
+            raise ValueError("A split needs at least two children")
+        for child in children:
+            if isinstance(child, SplitSpec) and child.vertical == vertical:
+                raise ValueError(
+                    "Nested splits must alternate between vertical and "
+                    "horizontal")
+        self.__vertical = vertical
+        self.__children = list(children)
+        self.__weight = weight
+
+    @property
+    def vertical(self) -> bool:
+        """Are the dividers in this splitter vertical?"""
+        return self.__vertical
+
+    @property
+    def children(self) -> typing.List[typing.Union[PaneSpec, 'SplitSpec']]:
+        """The panes and splitters in this splitter."""
+        return self.__children
+
+    @property
+    def weight(self) -> float:
+        """The share of its parent's space this splitter gets."""
+        return self.__weight
+
+
+class TabSpec:
+    """Describes a tab in a :class:`WorkspaceSpec`.
+
+    :param root: A :class:`PaneSpec` for a tab with a single session, or a
+        :class:`SplitSpec` for a tab with split panes.
+    """
+    def __init__(self, root: typing.Union[PaneSpec, SplitSpec]):
+        self.__root = root
+
+    @property
+    def root(self) -> typing.Union[PaneSpec, SplitSpec]:
+        """The pane or splitter filling the tab."""
+        return self.__root
+
+
+class WindowSpec:
+    """Describes a window in a :class:`WorkspaceSpec`.
+
+    :param tabs: The window's tabs, in order. There must be at least one.
+
+    :throws: ValueError if there are no tabs.
+    """
+    def __init__(self, tabs: typing.Sequence[TabSpec]):
+        if not tabs:
+            raise ValueError("A window needs at least one tab")
+        self.__tabs = list(tabs)
+
+    @property
+    def tabs(self) -> typing.List[TabSpec]:
+        """The window's tabs."""
+        return self.__tabs
+
+
+class WorkspaceStep:
+    """How long one step of :meth:`WorkspaceSpec.async_create` took."""
+    def __init__(self, name: str, requests: int, seconds: float):
+        self.__name = name
+        self.__requests = requests
+        self.__seconds = seconds
+
+    @property
+    def name(self) -> str:
+        """A description of the step, such as `"create windows"`."""
+        return self.__name
+
+    @property
+    def requests(self) -> int:
+        """The number of requests sent to iTerm2 during the step."""
+        return self.__requests
+
+    @property
+    def seconds(self) -> float:
+        """The time from sending the first request to the last response."""
+        return self.__seconds
+
+    def __repr__(self):
+        return "<WorkspaceStep {} requests={} seconds={:.3f}>".format(
+            self.__name, self.__requests, self.__seconds)
+
+
+class Workspace:
+    """The windows, tabs and sessions created by
+    :meth:`WorkspaceSpec.async_create`.
+
+    IDs are listed in the same order as in the :class:`WorkspaceSpec`. To get
+    :class:`~iterm2.Session` and other objects, refresh the
+    :class:`~iterm2.App` with :meth:`~iterm2.App.async_refresh` and look the
+    IDs up.
+    """
+    def __init__(self, window_ids, tab_ids, session_ids, steps):
+        self.__window_ids = window_ids
+        self.__tab_ids = tab_ids
+        self.__session_ids = session_ids
+        self.__steps = steps
+
+    @property
+    def window_ids(self) -> typing.List[str]:
+        """The ID of each window."""
+        return self.__window_ids
+
+    @property
+    def tab_ids(self) -> typing.List[typing.List[str]]:
+        """The IDs of each window's tabs."""
+        return self.__tab_ids
+
+    @property
+    def session_ids(self) -> typing.List[typing.List[typing.List[str]]]:
+        """The session IDs of each tab of each window.
+
+        A tab's sessions are in the order its :class:`PaneSpec` objects appear
+        in a depth-first walk of its :class:`SplitSpec` tree."""
+        return self.__session_ids
+
+    @property
+    def steps(self) -> typing.List[WorkspaceStep]:
+        """How long each step took, in the order they ran."""
+        return self.__steps
+
+    @property
+    def seconds(self) -> float:
+        """The total time taken by all the steps."""
+        return sum(step.seconds for step in self.__steps)
+
+
+def _first_pane(node):
+    """Returns the PaneSpec in the top left of a node."""
+    while isinstance(node, SplitSpec):
+        node = node.children[0]
+    return node
+
+
+def _pane_count(node):
+    if isinstance(node, PaneSpec):
+        return 1
+    return sum(_pane_count(child) for child in node.children)
+
+
+def _distribute(total, weights):
+    """Divides `total` cells in proportion to `weights`, giving each at least
+    one cell and keeping the sum equal to `total` where possible."""
+    weight_sum = sum(weights)
+    result = []
+    given = 0
+    cumulative = 0.0
+    for weight in weights:
+        cumulative += weight
+        share = max(1, round(total * cumulative / weight_sum) - given)
+        result.append(share)
+        given += share
+    return result
+
+
+class _TabState:
+    """A tab being created."""
+    def __init__(self, spec: TabSpec):
+        self.spec = spec
+        self.tab_id: typing.Optional[str] = None
+        self.session_ids: typing.List[typing.Optional[str]] = (
+            [None] * _pane_count(spec.root))
+
+
+class _SplitJob:
+    """Children [lo, hi) of `node` occupy the session `owner`. The first pane
+    of child `lo` is pane number `first_pane` of the tab."""
+    def __init__(self, tab, node, lo, hi, owner, first_pane):
+        # pylint: disable=too-many-arguments
+        self.tab = tab
+        self.node = node
+        self.lo = lo  # pylint: disable=invalid-name
+        self.hi = hi  # pylint: disable=invalid-name
+        self.owner = owner
+        self.first_pane = first_pane
+
+
+class WorkspaceSpec:
+    """Describes windows, tabs and split panes to create all at once.
+
+    Creating a workspace with :meth:`~iterm2.Window.async_create`,
+    :meth:`~iterm2.Window.async_create_tab` and
+    :meth:`~iterm2.Session.async_split_pane` waits for each call to finish,
+    and each of them also reloads the :class:`~iterm2.App`.
+    :meth:`async_create` instead sends independent requests together and
+    doesn't reload anything.
+
+    :param windows: The windows to create.
+
+    Example:
+
+      .. code-block:: python
+
+          spec = iterm2.WorkspaceSpec([
+              iterm2.WindowSpec([
+                  iterm2.TabSpec(iterm2.SplitSpec(vertical=True, children=[
+                      iterm2.PaneSpec(command="/usr/bin/top", weight=2),
+                      iterm2.SplitSpec(vertical=False, children=[
+                          iterm2.PaneSpec(profile="Logs"),
+                          iterm2.PaneSpec(profile="Logs")])])),
+                  iterm2.TabSpec(iterm2.PaneSpec())])])
+          workspace = await spec.async_create(connection)
+          for step in workspace.steps:
+              print(step)
+    """
+    def __init__(self, windows: typing.Sequence[WindowSpec]):
+        self.__windows = list(windows)
+
+    @property
+    def windows(self) -> typing.List[WindowSpec]:
+        """The windows to create."""
+        return self.__windows
+
+    async def async_create(
+            self, connection: iterm2.connection.Connection) -> Workspace:
+        """Creates the windows, tabs and sessions.
+
+        First the windows are created, then the remaining tabs, then the
+        split panes. Every split in a tab divides a pane into two halves of
+        the panes remaining to be made, so no pane is split more than about
+        log2(n) times and all splits at the same depth, in every tab, are
+        sent together. Finally each tab with split panes is laid out once,
+        giving every pane and splitter space in proportion to its weight.
+
+        If a step fails, whatever was already created is left open.
+
+        :param connection: The connection to iTerm2.
+
+        :returns: A :class:`Workspace` with the new IDs and the timing of
+            each step.
+
+        :throws: :class:`~iterm2.CreateWindowException`,
+            :class:`~iterm2.CreateTabException`,
+            :class:`~iterm2.SplitPaneException` or
+            :class:`~iterm2.RPCException` if something goes wrong.
+        """
+        steps: typing.List[WorkspaceStep] = []
+        windows = [
+            [_TabState(tab) for tab in window.tabs]
+            for window in self.__windows]
+
+        async def async_step(name, coros):
+            if not coros:
+                return []
+            start = time.monotonic()
+            results = await asyncio.gather(*coros)
+            steps.append(WorkspaceStep(
+                name, len(coros), time.monotonic() - start))
+            return results
+
+        window_ids = await async_step("create windows", [
+            self.__async_create_tab(connection, None, None, tabs[0])
+            for tabs in windows])
+        await async_step("create tabs", [
+            self.__async_create_tab(connection, window_id, index, tab)
+            for window_id, tabs in zip(window_ids, windows)
+            for index, tab in enumerate(tabs) if index > 0])
+
+        all_tabs = [tab for tabs in windows for tab in tabs]
+        jobs = [
+            _SplitJob(tab, tab.spec.root, 0, len(tab.spec.root.children),
+                      tab.session_ids[0], 0)
+            for tab in all_tabs if isinstance(tab.spec.root, SplitSpec)]
+        depth = 0
+        jobs = self.__expand(jobs)
+        while jobs:
+            depth += 1
+            new_sessions = await async_step(
+                "split panes (depth {})".format(depth),
+                [self.__async_split(connection, job) for job in jobs])
+            jobs = self.__expand(self.__divide(jobs, new_sessions))
+
+        split_tabs = [
+            tab for tab in all_tabs if isinstance(tab.spec.root, SplitSpec)]
+        if split_tabs:
+            responses = await async_step("list sessions", [
+                iterm2.rpc.async_list_sessions(connection)])
+            sizes = _grid_sizes(responses[0].list_sessions_response)
+            await async_step("set tab layouts", [
+                self.__async_set_layout(connection, tab, sizes)
+                for tab in split_tabs])
+
+        return Workspace(
+            window_ids,
+            [[tab.tab_id for tab in tabs] for tabs in windows],
+            [[list(tab.session_ids) for tab in tabs] for tabs in windows],
+            steps)
+
+    @staticmethod
+    async def __async_create_tab(connection, window_id, index, tab):
+        """Creates a tab, or a window if window_id is None. Returns the window
+        ID."""
+        pane = _first_pane(tab.spec.root)
+        result = await iterm2.rpc.async_create_tab(
+            connection,
+            profile=pane.profile,
+            window=window_id,
+            index=index,
+            profile_customizations=pane._custom_dict())  # pylint: disable=protected-access
+        response = result.create_tab_response
+        # pylint: disable=no-member
+        if response.status != iterm2.api_pb2.CreateTabResponse.Status.Value(
+                "OK"):
+            exception_class = (
+                iterm2.window.CreateWindowException if window_id is None
+                else iterm2.window.CreateTabException)
+            raise exception_class(
+                iterm2.api_pb2.CreateTabResponse.Status.Name(
+                    response.status))
+        tab.tab_id = str(response.tab_id)
+        tab.session_ids[0] = response.session_id
+        return response.window_id
+
+    @staticmethod
+    def __expand(jobs):
+        """Replaces jobs for a single child that is itself a splitter with
+        jobs for that splitter's children, and drops jobs that are done."""
+        result = []
+        for job in jobs:
+            while job is not None and job.hi - job.lo == 1:
+                child = job.node.children[job.lo]
+                if isinstance(child, SplitSpec):
+                    job = _SplitJob(
+                        job.tab, child, 0, len(child.children), job.owner,
+                        job.first_pane)
+                else:
+                    job = None
+            if job is not None:
+                result.append(job)
+        return result
+
+    @staticmethod
+    def __middle(job):
+        """Returns the index of the child to split off and its first pane."""
+        mid = (job.lo + job.hi) // 2
+        first_pane = job.first_pane + sum(
+            _pane_count(child) for child in job.node.children[job.lo:mid])
+        return mid, first_pane
+
+    @staticmethod
+    async def __async_split(connection, job):
+        """Splits the job's owner, creating the session for its middle child.
+        Returns the new session's ID."""
+        mid, _ = WorkspaceSpec.__middle(job)
+        pane = _first_pane(job.node.children[mid])
+        result = await iterm2.rpc.async_split_pane(
+            connection,
+            job.owner,
+            job.node.vertical,
+            False,
+            pane.profile,
+            profile_customizations=pane._custom_dict())  # pylint: disable=protected-access
+        response = result.split_pane_response
+        # pylint: disable=no-member
+        if response.status != iterm2.api_pb2.SplitPaneResponse.Status.Value(
+                "OK"):
+            raise iterm2.session.SplitPaneException(
+                iterm2.api_pb2.SplitPaneResponse.Status.Name(response.status))
+        return response.session_id[0]
+
+    @staticmethod
+    def __divide(jobs, new_sessions):
+        """Returns the jobs for both halves of each job that was split."""
+        result = []
+        for job, session_id in zip(jobs, new_sessions):
+            mid, first_pane = WorkspaceSpec.__middle(job)
+            job.tab.session_ids[first_pane] = session_id
+            result.append(_SplitJob(
+                job.tab, job.node, job.lo, mid, job.owner, job.first_pane))
+            result.append(_SplitJob(
+                job.tab, job.node, mid, job.hi, session_id, first_pane))
+        return result
+
+    @staticmethod
+    async def __async_set_layout(connection, tab, sizes):
+        width, height = _extent(tab.spec.root, iter(tab.session_ids), sizes)
+        link = _layout(tab.spec.root, width, height, iter(tab.session_ids))
+        response = await iterm2.rpc.async_set_tab_layout(
+            connection, tab.tab_id, link.node)
+        status = response.set_tab_layout_response.status
+        # pylint: disable=no-member
+        if status != iterm2.api_pb2.SetTabLayoutResponse.Status.Value("OK"):
+            raise iterm2.rpc.RPCException(
+                iterm2.api_pb2.SetTabLayoutResponse.Status.Name(status))
+
+
+def _grid_sizes(list_sessions_response):
+    """Returns a dict mapping session IDs to (width, height)."""
+    sizes = {}
+
+    def visit(node):
+        for link in node.links:
+            if link.HasField("session"):
+                sizes[link.session.unique_identifier] = (
+                    link.session.grid_size.width,
+                    link.session.grid_size.height)
+            else:
+                visit(link.node)
+
+    for window in list_sessions_response.windows:
+        for tab in window.tabs:
+            visit(tab.root)
+    return sizes
+
+
+def _extent(node, session_ids, sizes):
+    """Returns the (width, height) in cells that a node currently
+    occupies."""
+    if isinstance(node, PaneSpec):
+        return sizes.get(next(session_ids), (1, 1))
+    extents = [_extent(child, session_ids, sizes) for child in node.children]
+    widths = [width for width, _ in extents]
+    heights = [height for _, height in extents]
+    if node.vertical:
+        return sum(widths), max(heights)
+    return max(widths), sum(heights)
+
+
+def _layout(node, width, height, session_ids):
+    """Returns a SplitTreeLink giving `node` a size of width x height, divided
+    among its children by weight."""
+    link = iterm2.api_pb2.SplitTreeNode.SplitTreeLink()
+    if isinstance(node, PaneSpec):
+        link.session.unique_identifier = next(session_ids)
+        link.session.grid_size.width = width
+        link.session.grid_size.height = height
+        return link
+    link.node.vertical = node.vertical
+    shares = _distribute(
+        width if node.vertical else height,
+        [child.weight for child in node.children])
+    for child, share in zip(node.children, shares):
+        if node.vertical:
+            child_link = _layout(child, share, height, session_ids)
+        else:
+            child_link = _layout(child, width, share, session_ids)
+        link.node.links.add().CopyFrom(child_link)
+    return link
@@ -35,7 +35,8 @@ setup(name='iterm2',
           'websockets'
       ],
       extras_require={
-          'full': ['pyobjc']
+          'full': ['pyobjc'],
+          'numpy': ['numpy']
       },
       include_package_data=True,
       zip_safe=False)
@@ -0,0 +1,315 @@
+"""Test doubles shared by the tests."""
+import asyncio
+import json
+
+import iterm2.api_pb2
+import iterm2.notifications
+
+
+class FakeConnection:
+    """Stands in for iterm2.Connection.
+
+    `respond` is called with each ClientOriginatedMessage and must fill in
+    the ServerOriginatedMessage passed to it. Responses are delivered after
+    yielding to the event loop, so concurrent requests overlap the way they
+    would over a real websocket. `max_in_flight` records the most requests
+    that were outstanding at once.
+    """
+    def __init__(self, respond, iterm2_protocol_version=(1, 99)):
+        self.respond = respond
+        self.iterm2_protocol_version = iterm2_protocol_version
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.__responses = {}
+
+    async def async_send_message(self, message):
+        self.requests.append(message)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        response = iterm2.api_pb2.ServerOriginatedMessage()
+        response.id = message.id
+        self.respond(message, response)
+        self.__responses[message.id] = response
+
+    async def async_dispatch_until_id(self, reqid):
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        return self.__responses.pop(reqid)
+
+    async def async_notify(self, notification):
+        """Delivers a Notification proto to subscribed handlers."""
+        message = iterm2.api_pb2.ServerOriginatedMessage()
+        message.notification.CopyFrom(notification)
+        # pylint: disable=protected-access
+        await iterm2.notifications._async_dispatch_helper(self, message)
+
+
+def respond_ok_to_notification_requests(request, response):
+    """A `respond` function that accepts every subscription."""
+    if request.HasField("notification_request"):
+        response.notification_response.status = (
+            iterm2.api_pb2.NotificationResponse.Status.Value("OK"))
+
+
+class FakeBuffer:
+    """A session's scrollback history and screen for FakeConnection.
+
+    `lines` holds the text of every line still in history, starting at
+    absolute line number `overflow`. The last `grid_height` lines are the
+    screen.
+    """
+    def __init__(self, lines, overflow=0, grid_height=24):
+        self.lines = list(lines)
+        self.overflow = overflow
+        self.grid_height = grid_height
+
+    @property
+    def limit(self):
+        """The absolute line number after the last line."""
+        return self.overflow + len(self.lines)
+
+    def add_line(self, proto, line_number, first_x=0, last_x=None):
+        """Appends line `line_number` to a GetBufferResponse."""
+        text = self.lines[line_number - self.overflow][first_x:last_x]
+        line = proto.contents.add()
+        line.text = text
+        if text:
+            cppc = line.code_points_per_cell.add()
+            cppc.num_code_points = 1
+            cppc.repeats = len(text)
+        line.continuation = iterm2.api_pb2.LineContents.Continuation.Value(
+            "CONTINUATION_HARD_EOL")
+
+    def respond(self, request, response):
+        """Answers buffer and line-count requests."""
+        ok_status = iterm2.api_pb2.GetBufferResponse.Status.Value("OK")
+        if request.HasField("get_property_request"):
+            response.get_property_response.status = (
+                iterm2.api_pb2.GetPropertyResponse.Status.Value("OK"))
+            response.get_property_response.json_value = json.dumps({
+                "grid": self.grid_height,
+                "history": max(0, len(self.lines) - self.grid_height),
+                "overflow": self.overflow,
+                "first_visible": self.limit - self.grid_height})
+        elif request.HasField("get_buffer_request"):
+            proto = response.get_buffer_response
+            proto.status = ok_status
+            line_range = request.get_buffer_request.line_range
+            if line_range.screen_contents_only:
+                first = max(self.overflow, self.limit - self.grid_height)
+                for y in range(first, self.limit):
+                    self.add_line(proto, y)
+                proto.num_lines_above_screen = first
+                proto.windowed_coord_range.coord_range.start.y = first
+                proto.windowed_coord_range.coord_range.end.y = self.limit
+                return
+            coord_range = line_range.windowed_coord_range.coord_range
+            columns = line_range.windowed_coord_range.columns
+            start, end = coord_range.start, coord_range.end
+            first = max(start.y, self.overflow)
+            last = min(end.y + 1 if end.x > 0 else end.y, self.limit)
+            for y in range(first, last):
+                first_x = start.x if y == start.y else 0
+                last_x = end.x if y == end.y and end.x > 0 else None
+                if columns.length:
+                    first_x = max(first_x, columns.location)
+                    right = columns.location + columns.length
+                    last_x = right if last_x is None else min(last_x, right)
+                self.add_line(proto, y, first_x, last_x)
+            # Like iTerm2, echo the requested range even if it was clipped.
+            proto.windowed_coord_range.CopyFrom(
+                line_range.windowed_coord_range)
+
+
+class FakeLayout:
+    """The windows, tabs and focus state of iTerm2 for FakeConnection.
+
+    `windows` maps window IDs to dicts mapping tab IDs to lists of session
+    IDs. `selected_tabs` maps window IDs to tab IDs and `active_sessions`
+    maps tab IDs to session IDs; windows and tabs missing from them default
+    to their first tab and session.
+    """
+    def __init__(self, windows):
+        self.windows = windows
+        self.selected_tabs = {}
+        self.active_sessions = {}
+
+    def fill_list_sessions_response(self, proto):
+        """Describes the windows in a ListSessionsResponse."""
+        for window_id, tabs in self.windows.items():
+            window = proto.windows.add()
+            window.window_id = window_id
+            for tab_id, session_ids in tabs.items():
+                tab = window.tabs.add()
+                tab.tab_id = tab_id
+                for session_id in session_ids:
+                    link = tab.root.links.add()
+                    link.session.unique_identifier = session_id
+                    link.session.grid_size.width = 80
+                    link.session.grid_size.height = 24
+
+    def focus_notifications(self):
+        """Returns FocusChangedNotifications describing the focus state."""
+        notifications = []
+        notification = iterm2.api_pb2.FocusChangedNotification()
+        notification.application_active = True
+        notifications.append(notification)
+        for window_id, tabs in self.windows.items():
+            notification = iterm2.api_pb2.FocusChangedNotification()
+            notification.selected_tab = self.selected_tabs.get(
+                window_id, next(iter(tabs)))
+            notifications.append(notification)
+            for tab_id, session_ids in tabs.items():
+                notification = iterm2.api_pb2.FocusChangedNotification()
+                notification.session = self.active_sessions.get(
+                    tab_id, session_ids[0])
+                notifications.append(notification)
+        return notifications
+
+    def layout_changed(self):
+        """Returns a Notification describing the current layout."""
+        notification = iterm2.api_pb2.Notification()
+        self.fill_list_sessions_response(
+            notification.layout_changed_notification.list_sessions_response)
+        return notification
+
+    def respond(self, request, response):
+        """Answers the requests App makes to build its hierarchy."""
+        if request.HasField("list_sessions_request"):
+            self.fill_list_sessions_response(response.list_sessions_response)
+        elif request.HasField("focus_request"):
+            response.focus_response.notifications.extend(
+                self.focus_notifications())
+        elif request.HasField("get_broadcast_domains_request"):
+            response.get_broadcast_domains_response.SetInParent()
+        else:
+            respond_ok_to_notification_requests(request, response)
+
+
+class FakeSplitPanes:
+    """Creates windows, tabs and split panes the way iTerm2 does, for
+    FakeConnection.
+
+    Each tab's split tree is a dict with keys "vertical" and "children",
+    whose elements are session IDs or nested dicts. Splitting a session adds
+    a sibling if its splitter has the requested orientation, or only one
+    child, and otherwise replaces it with a nested splitter. Splitting halves
+    the session and fails with CANNOT_SPLIT if a half would be smaller than
+    `min_size` cells. `profiles` maps session IDs to the profile they were
+    created with and `layouts` collects SetTabLayoutRequests.
+    """
+    def __init__(self, width=80, height=24, min_size=4):
+        self.width = width
+        self.height = height
+        self.min_size = min_size
+        self.windows = {}
+        self.trees = {}
+        self.sizes = {}
+        self.profiles = {}
+        self.layouts = []
+        self.__next_id = 0
+
+    def __new_id(self):
+        self.__next_id += 1
+        return self.__next_id
+
+    def __new_session(self, profile, size):
+        session_id = "s{}".format(self.__new_id())
+        self.profiles[session_id] = profile
+        self.sizes[session_id] = size
+        return session_id
+
+    def __find_parent(self, node, session_id):
+        for child in node["children"]:
+            if child == session_id:
+                return node
+            if isinstance(child, dict):
+                parent = self.__find_parent(child, session_id)
+                if parent is not None:
+                    return parent
+        return None
+
+    def __create_tab(self, request, response):
+        status = iterm2.api_pb2.CreateTabResponse.Status
+        window_id = request.window_id or "w{}".format(self.__new_id())
+        tab_id = self.__new_id()
+        profile = request.profile_name if request.HasField(
+            "profile_name") else None
+        session_id = self.__new_session(profile, [self.width, self.height])
+        tabs = self.windows.setdefault(window_id, [])
+        tabs.insert(request.tab_index if request.HasField("tab_index")
+                    else len(tabs), tab_id)
+        self.trees[tab_id] = {"vertical": False, "children": [session_id]}
+        response.status = status.Value("OK")
+        response.window_id = window_id
+        response.tab_id = tab_id
+        response.session_id = session_id
+
+    def __split_pane(self, request, response):
+        status = iterm2.api_pb2.SplitPaneResponse.Status
+        vertical = (request.split_direction ==
+                    iterm2.api_pb2.SplitPaneRequest.VERTICAL)
+        parent = None
+        for tree in self.trees.values():
+            parent = self.__find_parent(tree, request.session)
+            if parent is not None:
+                break
+        if parent is None:
+            response.status = status.Value("SESSION_NOT_FOUND")
+            return
+        size = self.sizes[request.session]
+        axis = 0 if vertical else 1
+        if size[axis] // 2 < self.min_size:
+            response.status = status.Value("CANNOT_SPLIT")
+            return
+        new_size = list(size)
+        new_size[axis] = size[axis] // 2
+        size[axis] -= new_size[axis]
+        profile = request.profile_name if request.HasField(
+            "profile_name") else None
+        new_session = self.__new_session(profile, new_size)
+        index = parent["children"].index(request.session)
+        if len(parent["children"]) == 1:
+            parent["vertical"] = vertical
+        if parent["vertical"] == vertical:
+            parent["children"].insert(index + 1, new_session)
+        else:
+            parent["children"][index] = {
+                "vertical": vertical,
+                "children": [request.session, new_session]}
+        response.status = status.Value("OK")
+        response.session_id.append(new_session)
+
+    def __fill_node(self, proto, node):
+        proto.vertical = node["vertical"]
+        for child in node["children"]:
+            link = proto.links.add()
+            if isinstance(child, dict):
+                self.__fill_node(link.node, child)
+            else:
+                link.session.unique_identifier = child
+                link.session.grid_size.width = self.sizes[child][0]
+                link.session.grid_size.height = self.sizes[child][1]
+
+    def respond(self, request, response):
+        """Answers create tab, split pane, list sessions and set tab layout
+        requests."""
+        if request.HasField("create_tab_request"):
+            self.__create_tab(
+                request.create_tab_request, response.create_tab_response)
+        elif request.HasField("split_pane_request"):
+            self.__split_pane(
+                request.split_pane_request, response.split_pane_response)
+        elif request.HasField("list_sessions_request"):
+            for window_id, tab_ids in self.windows.items():
+                window = response.list_sessions_response.windows.add()
+                window.window_id = window_id
+                for tab_id in tab_ids:
+                    tab = window.tabs.add()
+                    tab.tab_id = str(tab_id)
+                    self.__fill_node(tab.root, self.trees[tab_id])
+        elif request.HasField("set_tab_layout_request"):
+            self.layouts.append(request.set_tab_layout_request)
+            response.set_tab_layout_response.status = (
+                iterm2.api_pb2.SetTabLayoutResponse.Status.Value("OK"))
@@ -0,0 +1,112 @@
+"""Tests for iterm2.app module."""
+import asyncio
+
+import iterm2.api_pb2
+from iterm2.app import App
+from tests.fakes import FakeConnection, FakeLayout
+
+
+def focus_changed(selected_tab=None, session=None):
+    """Makes a Notification proto for a focus change."""
+    notification = iterm2.api_pb2.Notification()
+    change = notification.focus_changed_notification
+    if selected_tab is not None:
+        change.selected_tab = selected_tab
+    if session is not None:
+        change.session = session
+    return notification
+
+
+def count_requests(connection, field):
+    """Returns the number of requests of one kind sent so far."""
+    return sum(1 for request in connection.requests if request.HasField(field))
+
+
+class TestAppFocus:
+    """Tests for focus tracking in the App class."""
+
+    def test_layout_changes_use_notifications(self):
+        """Test that focus notifications keep focus current without focus
+        requests, even if they precede the layout change."""
+        layout = FakeLayout({"w1": {"t1": ["s1", "s2"]}})
+        connection = FakeConnection(layout.respond)
+
+        async def body():
+            app = await App.async_construct(connection)
+            initial = count_requests(connection, "focus_request")
+
+            layout.windows["w1"]["t2"] = ["s3"]
+            await connection.async_notify(focus_changed(selected_tab="t2"))
+            await connection.async_notify(focus_changed(session="s3"))
+            await connection.async_notify(layout.layout_changed())
+            await connection.async_notify(focus_changed(session="s2"))
+            return app, initial
+
+        app, initial = asyncio.run(body())
+        assert initial == 1
+        assert count_requests(connection, "focus_request") == 1
+        window = app.get_window_by_id("w1")
+        assert window.selected_tab_id == "t2"
+        assert app.get_tab_by_id("t1").active_session_id == "s2"
+        assert app.get_tab_by_id("t2").active_session_id == "s3"
+
+    def test_gap_requests_focus(self):
+        """Test that a tab with no focus history causes a focus request."""
+        layout = FakeLayout({"w1": {"t1": ["s1"]}})
+        connection = FakeConnection(layout.respond)
+
+        async def body():
+            app = await App.async_construct(connection)
+            layout.windows["w2"] = {"t2": ["s2"]}
+            await connection.async_notify(layout.layout_changed())
+            return app
+
+        app = asyncio.run(body())
+        assert count_requests(connection, "focus_request") == 2
+        assert app.get_window_by_id("w2").selected_tab_id == "t2"
+        assert app.get_tab_by_id("t2").active_session_id == "s2"
+
+
+class TestSnapshotScreens:
+    """Tests for App.async_snapshot_screens."""
+
+    def test_pipelined_in_transaction(self):
+        """Test that every session is fetched concurrently in a
+        transaction."""
+        sessions = ["s{}".format(i) for i in range(200)]
+        layout = FakeLayout({"w1": {"t1": sessions[:100]},
+                             "w2": {"t2": sessions[100:]}})
+
+        def respond(request, response):
+            if request.HasField("get_buffer_request"):
+                buffer = response.get_buffer_response
+                session_id = request.get_buffer_request.session
+                if session_id == "s7":
+                    buffer.status = (
+                        iterm2.api_pb2.GetBufferResponse.Status.Value(
+                            "SESSION_NOT_FOUND"))
+                    return
+                buffer.status = (
+                    iterm2.api_pb2.GetBufferResponse.Status.Value("OK"))
+                buffer.contents.add().text = session_id
+            elif request.HasField("transaction_request"):
+                response.transaction_response.status = (
+                    iterm2.api_pb2.TransactionResponse.Status.Value("OK"))
+            else:
+                layout.respond(request, response)
+
+        connection = FakeConnection(respond)
+
+        async def body():
+            app = await App.async_construct(connection)
+            first = len(connection.requests)
+            connection.max_in_flight = 0
+            snapshot = await app.async_snapshot_screens()
+            return snapshot, connection.requests[first:]
+
+        snapshot, requests = asyncio.run(body())
+        assert len(snapshot) == 199 and "s7" not in snapshot
+        assert snapshot["s150"].line(0).string == "s150"
+        assert connection.max_in_flight == 200
+        assert requests[0].transaction_request.begin
+        assert not requests[-1].transaction_request.begin
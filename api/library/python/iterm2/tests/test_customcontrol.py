@@ -0,0 +1,106 @@
+"""Tests for iterm2.customcontrol module."""
+import asyncio
+
+import iterm2.api_pb2
+from iterm2.customcontrol import CustomControlSequenceRouter
+from tests.fakes import FakeConnection, respond_ok_to_notification_requests
+
+
+def custom_escape_sequence(identity, payload, session="s1"):
+    """Makes a Notification proto for a custom control sequence."""
+    notification = iterm2.api_pb2.Notification()
+    sequence = notification.custom_escape_sequence_notification
+    sequence.session = session
+    sequence.sender_identity = identity
+    sequence.payload = payload
+    return notification
+
+
+class TestCustomControlSequenceRouter:
+    """Tests for the CustomControlSequenceRouter class."""
+
+    def run_router(self, routes, notifications):
+        """Adds routes, delivers notifications, and returns the calls made
+        and the connection."""
+        connection = FakeConnection(respond_ok_to_notification_requests)
+        router = CustomControlSequenceRouter(connection)
+        calls = []
+
+        def make_handler(name):
+            async def handler(match, session_id):
+                calls.append((name, match.group(0), match.groups(), session_id))
+            return handler
+
+        for name, identity, regex in routes:
+            router.add_route(identity, regex, make_handler(name))
+
+        async def body():
+            async with router:
+                for notification in notifications:
+                    await connection.async_notify(notification)
+
+        asyncio.run(body())
+        return calls, connection
+
+    def test_one_subscription_for_many_routes(self):
+        """Test that routes share a subscription and dispatch by identity."""
+        routes = [("cmd{}".format(i), "secret", r"^cmd{}$".format(i))
+                  for i in range(40)]
+        routes.append(("other", "other-secret", r"^cmd7$"))
+        calls, connection = self.run_router(routes, [
+            custom_escape_sequence("secret", "cmd7"),
+            custom_escape_sequence("other-secret", "cmd7", "s2"),
+            custom_escape_sequence("secret", "cmd99"),
+            custom_escape_sequence("unknown", "cmd1")])
+        assert calls == [
+            ("cmd7", "cmd7", (), "s1"),
+            ("other", "cmd7", (), "s2")]
+        subscribes = [
+            request for request in connection.requests
+            if request.notification_request.subscribe]
+        assert len(subscribes) == 1
+
+    def test_groups_and_precedence(self):
+        """Test that handlers see their own groups and the earliest match
+        wins."""
+        calls, _ = self.run_router([
+            ("late", "id", r"b(\d)"),
+            ("early", "id", r"a(\d)"),
+            ("tie", "id", r"a\d"),
+        ], [custom_escape_sequence("id", "xa1b2")])
+        assert calls == [("early", "a1", ("1",), "s1")]
+
+    def test_individually_searched_patterns(self):
+        """Test patterns that can't be part of the alternation."""
+        calls, _ = self.run_router([
+            ("plain", "id", r"zzz"),
+            ("named", "id", r"(?P<word>\w+)=(?P=word)"),
+            ("flags", "id", r"(?i)^HELLO"),
+        ], [
+            custom_escape_sequence("id", "x abc=abc"),
+            custom_escape_sequence("id", "hello zzz")])
+        assert calls == [
+            ("named", "abc=abc", ("abc",), "s1"),
+            ("flags", "hello", (), "s1")]
+
+    def test_remove_route(self):
+        """Test that removed routes are no longer dispatched to."""
+        connection = FakeConnection(respond_ok_to_notification_requests)
+        router = CustomControlSequenceRouter(connection)
+        calls = []
+
+        async def handler(match, _session_id):
+            calls.append(match.group(0))
+
+        token = router.add_route("id", r"^a$", handler)
+        router.add_route("id", r"^b$", handler)
+
+        async def body():
+            async with router:
+                await connection.async_notify(custom_escape_sequence("id", "a"))
+                router.remove_route(token)
+                await connection.async_notify(custom_escape_sequence("id", "a"))
+                await connection.async_notify(custom_escape_sequence("id", "b"))
+
+        asyncio.run(body())
+        assert calls == ["a", "b"]
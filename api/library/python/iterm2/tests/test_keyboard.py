@@ -0,0 +1,174 @@
+"""Tests for iterm2.keyboard module."""
+import asyncio
+
+import iterm2.api_pb2
+from iterm2.keyboard import (
+    Keycode, KeySequenceMatcher, Keystroke, KeystrokePattern, Modifier)
+from tests.fakes import FakeConnection, respond_ok_to_notification_requests
+
+
+def pattern(keycode, modifiers=()):
+    """A pattern matching one key with the given modifiers."""
+    result = KeystrokePattern()
+    result.keycodes = [keycode]
+    result.required_modifiers = list(modifiers)
+    return result
+
+
+def keystroke_notification(keycode, modifiers=(), session="s1"):
+    """Makes a KeystrokeNotification proto."""
+    notification = iterm2.api_pb2.KeystrokeNotification()
+    notification.keyCode = keycode.value
+    notification.modifiers.extend(m.value for m in modifiers)
+    notification.session = session
+    return notification
+
+
+def keystroke(keycode, modifiers=(), session="s1"):
+    """Makes a Keystroke."""
+    return Keystroke(keystroke_notification(keycode, modifiers, session))
+
+
+CTRL_A = pattern(Keycode.ANSI_A, [Modifier.CONTROL])
+
+
+class TestKeySequenceMatcher:
+    """Tests for the KeySequenceMatcher class."""
+
+    def make_matcher(self, sequences, timeout=1.0):
+        """Returns a matcher for `sequences`, a dict from name to patterns,
+        the list its handlers append (name, session, length) to, and its
+        connection."""
+        connection = FakeConnection(respond_ok_to_notification_requests)
+        matcher = KeySequenceMatcher(connection, timeout=timeout)
+        calls = []
+
+        def make_handler(name):
+            async def handler(session_id, keystrokes):
+                calls.append((name, session_id, len(keystrokes)))
+            return handler
+
+        for name, patterns in sequences.items():
+            matcher.add_sequence(patterns, make_handler(name))
+        return matcher, calls, connection
+
+    def test_sequences_share_prefix(self):
+        """Test dispatch of sequences with a common leader."""
+        matcher, calls, _ = self.make_matcher({
+            "split": [CTRL_A, pattern(Keycode.ANSI_BACKSLASH)],
+            "close": [CTRL_A, pattern(Keycode.ANSI_X)]})
+
+        async def body():
+            for event in [
+                    keystroke(Keycode.ANSI_X),
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL]),
+                    keystroke(Keycode.ANSI_X),
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL]),
+                    keystroke(Keycode.ANSI_Q),
+                    keystroke(Keycode.ANSI_BACKSLASH)]:
+                await matcher.async_handle_keystroke(event)
+
+        asyncio.run(body())
+        assert calls == [("close", "s1", 2)]
+
+    def test_sessions_are_independent(self):
+        """Test that each session has its own position in the trie."""
+        matcher, calls, _ = self.make_matcher({
+            "split": [CTRL_A, pattern(Keycode.ANSI_BACKSLASH)]})
+
+        async def body():
+            for event in [
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL], "s1"),
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL], "s2"),
+                    keystroke(Keycode.ANSI_BACKSLASH, session="s2"),
+                    keystroke(Keycode.ANSI_BACKSLASH, session="s1")]:
+                await matcher.async_handle_keystroke(event)
+
+        asyncio.run(body())
+        assert calls == [("split", "s2", 2), ("split", "s1", 2)]
+
+    def test_abandoned_sequence_restarts(self):
+        """Test that a key that breaks a sequence may start another."""
+        matcher, calls, _ = self.make_matcher({
+            "prefix": [CTRL_A],
+            "long": [CTRL_A, pattern(Keycode.ANSI_B), pattern(Keycode.ANSI_C)]})
+
+        async def body():
+            for event in [
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL]),
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL]),
+                    keystroke(Keycode.ANSI_B),
+                    keystroke(Keycode.ANSI_C)]:
+                await matcher.async_handle_keystroke(event)
+
+        asyncio.run(body())
+        assert calls == [("prefix", "s1", 1), ("long", "s1", 3)]
+
+    def test_unknown_keycode(self):
+        """Test that a keycode Keycode doesn't define breaks a sequence."""
+        matcher, calls, _ = self.make_matcher({
+            "split": [CTRL_A, pattern(Keycode.ANSI_BACKSLASH)]})
+        unknown = keystroke_notification(Keycode.ANSI_A)
+        unknown.keyCode = 0xFF
+
+        async def body():
+            for event in [
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL]),
+                    Keystroke(unknown),
+                    keystroke(Keycode.ANSI_BACKSLASH),
+                    keystroke(Keycode.ANSI_A, [Modifier.CONTROL]),
+                    keystroke(Keycode.ANSI_BACKSLASH)]:
+                await matcher.async_handle_keystroke(event)
+
+        asyncio.run(body())
+        assert calls == [("split", "s1", 2)]
+
+    def test_handler_exception(self):
+        """Test that the matcher keeps running after a handler raises."""
+        connection = FakeConnection(respond_ok_to_notification_requests)
+        matcher = KeySequenceMatcher(connection, timeout=1.0)
+        calls = []
+
+        async def handler(session_id, keystrokes):
+            calls.append(session_id)
+            if len(calls) == 1:
+                raise RuntimeError("handler failed")
+
+        matcher.add_sequence([CTRL_A], handler)
+
+        async def body():
+            async with matcher:
+                for session_id in ["s1", "s2"]:
+                    message = iterm2.api_pb2.Notification()
+                    message.keystroke_notification.CopyFrom(
+                        keystroke_notification(
+                            Keycode.ANSI_A, [Modifier.CONTROL], session_id))
+                    await connection.async_notify(message)
+                    await asyncio.sleep(0.01)
+
+        asyncio.run(body())
+        assert calls == ["s1", "s2"]
+
+    def test_timeout(self):
+        """Test that a pending complete sequence fires after the timeout."""
+        matcher, calls, connection = self.make_matcher({
+            "prefix": [CTRL_A],
+            "long": [CTRL_A, pattern(Keycode.ANSI_B)]}, timeout=0.01)
+
+        async def body():
+            async with matcher:
+                message = iterm2.api_pb2.Notification()
+                message.keystroke_notification.CopyFrom(
+                    keystroke_notification(
+                        Keycode.ANSI_A, [Modifier.CONTROL]))
+                await connection.async_notify(message)
+                await asyncio.sleep(0.1)
+                await connection.async_notify(message)
+                await asyncio.sleep(0)
+
+        asyncio.run(body())
+        assert calls == [("prefix", "s1", 1)]
+        subscribes = [
+            request for request in connection.requests
+            if request.notification_request.subscribe]
+        assert len(subscribes) == 1
@@ -0,0 +1,183 @@
+"""Tests for iterm2.monitor module."""
+import asyncio
+import pytest
+from iterm2.lifecycle import (
+    LayoutChangeMonitor, NewSessionMonitor, SessionTerminationMonitor)
+from iterm2.monitor import (
+    DEFAULT_MAXSIZE, BoundedMonitor, MonitorQueue, OverflowPolicy)
+
+
+def run(coro):
+    """Runs a coroutine to completion in a fresh event loop."""
+    return asyncio.run(coro)
+
+
+async def drain(queue):
+    """Returns all items currently in the queue."""
+    items = []
+    while not queue.empty():
+        items.append(await queue.async_get())
+    return items
+
+
+class TestMonitorQueue:
+    """Tests for the MonitorQueue class."""
+
+    def test_fifo(self):
+        """Test that items come out in the order they went in."""
+        async def body():
+            queue = MonitorQueue()
+            for i in range(5):
+                await queue.async_put(i)
+            return await drain(queue)
+        assert run(body()) == [0, 1, 2, 3, 4]
+
+    def test_unbounded(self):
+        """Test that maxsize=None never drops."""
+        async def body():
+            queue = MonitorQueue(maxsize=None)
+            for i in range(5000):
+                await queue.async_put(i)
+            return queue
+        queue = run(body())
+        assert len(queue) == 5000
+        assert queue.dropped_count == 0
+        assert not queue.full()
+
+    def test_drop_oldest(self):
+        """Test that DROP_OLDEST evicts from the head."""
+        async def body():
+            queue = MonitorQueue(3, OverflowPolicy.DROP_OLDEST)
+            for i in range(5):
+                await queue.async_put(i)
+            return queue, await drain(queue)
+        queue, items = run(body())
+        assert items == [2, 3, 4]
+        assert queue.dropped_count == 2
+
+    def test_keep_latest(self):
+        """Test that KEEP_LATEST discards everything but the new item."""
+        async def body():
+            queue = MonitorQueue(3, OverflowPolicy.KEEP_LATEST)
+            for i in range(4):
+                await queue.async_put(i)
+            return queue, await drain(queue)
+        queue, items = run(body())
+        assert items == [3]
+        assert queue.dropped_count == 3
+
+    def test_block(self):
+        """Test that BLOCK waits for the consumer instead of dropping."""
+        async def body():
+            queue = MonitorQueue(2, OverflowPolicy.BLOCK)
+            await queue.async_put(0)
+            await queue.async_put(1)
+            putter = asyncio.ensure_future(queue.async_put(2))
+            await asyncio.sleep(0)
+            assert not putter.done()
+            first = await queue.async_get()
+            await putter
+            return [first] + await drain(queue), queue.dropped_count
+        items, dropped = run(body())
+        assert items == [0, 1, 2]
+        assert dropped == 0
+
+    def test_blocked_putters_coalesce(self):
+        """Test that putters blocked on the same key coalesce when they wake
+        instead of both adding entries."""
+        async def body():
+            queue = MonitorQueue(2, OverflowPolicy.BLOCK,
+                                 coalesce_key=lambda item: item[0])
+            await queue.async_put(("a", 0))
+            await queue.async_put(("b", 0))
+            first = asyncio.ensure_future(queue.async_put(("k", 1)))
+            second = asyncio.ensure_future(queue.async_put(("k", 2)))
+            third = asyncio.ensure_future(queue.async_put(("c", 0)))
+            await asyncio.sleep(0)
+            assert not first.done() and not second.done()
+            items = [await queue.async_get()]
+            await asyncio.sleep(0)
+            items.append(await queue.async_get())
+            await asyncio.gather(first, second, third)
+            return queue, items + await drain(queue)
+        queue, items = run(asyncio.wait_for(body(), 5))
+        assert items == [("a", 0), ("b", 0), ("k", 2), ("c", 0)]
+        assert queue.coalesced_count == 1
+
+    def test_get_waits(self):
+        """Test that async_get blocks until an item is put."""
+        async def body():
+            queue = MonitorQueue()
+            getter = asyncio.ensure_future(queue.async_get())
+            await asyncio.sleep(0)
+            assert not getter.done()
+            await queue.async_put("x")
+            return await getter
+        assert run(body()) == "x"
+
+    def test_coalesce(self):
+        """Test that items with the same key replace each other in place."""
+        async def body():
+            queue = MonitorQueue(coalesce_key=lambda item: item[0])
+            await queue.async_put(("a", 1))
+            await queue.async_put(("b", 1))
+            await queue.async_put(("a", 2))
+            items = await drain(queue)
+            await queue.async_put(("a", 3))
+            items += await drain(queue)
+            return queue, items
+        queue, items = run(body())
+        assert items == [("a", 2), ("b", 1), ("a", 3)]
+        assert queue.coalesced_count == 1
+
+    def test_invalid_maxsize(self):
+        """Test that a zero size is rejected."""
+        with pytest.raises(AssertionError):
+            MonitorQueue(0)
+
+
+class TestBoundedMonitor:
+    """Tests for the BoundedMonitor base class."""
+
+    def test_default_async_get(self):
+        """Test that async_get returns queued values unchanged by default."""
+        async def body():
+            monitor = BoundedMonitor()
+            await monitor._queue.async_put("x")
+            return await monitor.async_get()
+        assert run(body()) == "x"
+
+    def test_async_iteration(self):
+        """Test that async for yields values from async_get."""
+        class Doubler(BoundedMonitor):
+            async def async_get(self):
+                return 2 * await super().async_get()
+
+        async def body():
+            monitor = Doubler(maxsize=2)
+            for i in range(3):
+                await monitor._queue.async_put(i)
+            values = []
+            async for value in monitor:
+                values.append(value)
+                if len(values) == 2:
+                    break
+            return monitor, values
+        monitor, values = run(body())
+        assert values == [2, 4]
+        assert monitor.dropped_count == 1
+
+    def test_lifecycle_monitors_unbounded_by_default(self):
+        """Test that lifecycle monitors drop nothing unless given a bound."""
+        async def body():
+            monitors = [
+                monitor_class(None) for monitor_class in [
+                    SessionTerminationMonitor, LayoutChangeMonitor,
+                    NewSessionMonitor]]
+            for monitor in monitors:
+                for i in range(DEFAULT_MAXSIZE + 1):
+                    await monitor._queue.async_put(i)
+            return monitors
+        for monitor in run(body()):
+            assert monitor.dropped_count == 0
+            assert len(monitor._queue) == DEFAULT_MAXSIZE + 1
@@ -0,0 +1,181 @@
+"""Tests for iterm2.prompt module."""
+import asyncio
+
+import iterm2.api_pb2
+import iterm2.connection
+import iterm2.prompt
+from iterm2.prompt import Prompt, PromptState, async_get_prompts
+from tests.fakes import FakeBuffer, FakeConnection
+
+
+class TestAsyncGetPrompts:
+    """Tests for async_get_prompts."""
+
+    @staticmethod
+    def make_connection(states):
+        """Serves prompts p0..pN with the given states."""
+        def respond(request, response):
+            if request.HasField("list_prompts_request"):
+                response.list_prompts_response.status = (
+                    iterm2.api_pb2.ListPromptsResponse.Status.Value("OK"))
+                response.list_prompts_response.unique_prompt_id.extend(
+                    "p{}".format(i) for i in range(len(states)))
+            elif request.HasField("get_prompt_request"):
+                prompt_id = request.get_prompt_request.unique_prompt_id
+                prompt = response.get_prompt_response
+                if prompt_id == "gone":
+                    prompt.status = iterm2.api_pb2.GetPromptResponse.Status.Value(
+                        "PROMPT_UNAVAILABLE")
+                    return
+                prompt.status = iterm2.api_pb2.GetPromptResponse.Status.Value(
+                    "OK")
+                prompt.unique_prompt_id = prompt_id
+                prompt.command = "cmd " + prompt_id
+                prompt.prompt_state = states[int(prompt_id[1:])].value
+        return FakeConnection(respond)
+
+    @staticmethod
+    def get_requests(connection):
+        """Returns the prompt IDs that were fetched individually."""
+        return [request.get_prompt_request.unique_prompt_id
+                for request in connection.requests
+                if request.HasField("get_prompt_request")]
+
+    def test_pipelined_and_cached(self):
+        """Test that fetches overlap and finished prompts are not refetched."""
+        states = [PromptState.FINISHED] * 4 + [PromptState.RUNNING]
+        connection = self.make_connection(states)
+
+        first = asyncio.run(async_get_prompts(connection, "session-a"))
+        assert [prompt.command for prompt in first] == [
+            "cmd p0", "cmd p1", "cmd p2", "cmd p3", "cmd p4"]
+        assert connection.max_in_flight == 5
+
+        connection.requests.clear()
+        second = asyncio.run(async_get_prompts(connection, "session-a"))
+        assert [prompt.unique_id for prompt in second] == [
+            "p0", "p1", "p2", "p3", "p4"]
+        assert self.get_requests(connection) == ["p4"]
+        assert second[0] is first[0]
+
+    def test_cache_is_per_session(self):
+        """Test that a prompt ID in another session is fetched."""
+        connection = self.make_connection([PromptState.FINISHED])
+        asyncio.run(async_get_prompts(connection, "session-b"))
+        connection.requests.clear()
+        asyncio.run(async_get_prompts(connection, "session-c"))
+        assert self.get_requests(connection) == ["p0"]
+
+    def test_cache_evicts_least_recently_used(self, monkeypatch):
+        """Test that the cache keeps only MAXSIZE prompts."""
+        monkeypatch.setattr(iterm2.prompt._FinishedPromptCache, "MAXSIZE", 2)
+        monkeypatch.setattr(iterm2.prompt._FinishedPromptCache, "instance",
+                            None)
+        connection = self.make_connection([PromptState.FINISHED] * 3)
+        asyncio.run(async_get_prompts(connection, "session-d"))
+        assert len(iterm2.prompt._get_finished_prompt_cache()) == 2
+        connection.requests.clear()
+        asyncio.run(async_get_prompts(connection, "session-d"))
+        assert self.get_requests(connection) == ["p0"]
+
+    def test_cache_discarded_on_disconnect(self, monkeypatch):
+        """Test that closing the connection empties the cache."""
+        monkeypatch.setattr(iterm2.connection, "gDisconnectCallbacks", [])
+        monkeypatch.setattr(iterm2.prompt._FinishedPromptCache, "instance",
+                            None)
+        connection = self.make_connection([PromptState.FINISHED])
+        asyncio.run(async_get_prompts(connection, "session-e"))
+        for callback in iterm2.connection.gDisconnectCallbacks:
+            callback()
+        connection.requests.clear()
+        asyncio.run(async_get_prompts(connection, "session-e"))
+        assert self.get_requests(connection) == ["p0"]
+
+
+class TestAsyncIterOutput:
+    """Tests for Prompt.async_iter_output."""
+
+    @staticmethod
+    def make_prompt(start_y, end_y):
+        """Makes a prompt whose output spans [start_y, end_y)."""
+        proto = iterm2.api_pb2.GetPromptResponse()
+        proto.output_range.start.y = start_y
+        proto.output_range.end.y = end_y
+        return Prompt(proto)
+
+    @staticmethod
+    def collect(prompt, connection, **kwargs):
+        """Returns all chunks produced by async_iter_output."""
+        async def body():
+            return [chunk async for chunk in prompt.async_iter_output(
+                connection, "session", **kwargs)]
+        return asyncio.run(body())
+
+    def test_chunks_and_prefetch(self):
+        """Test that output is split into bounded, overlapping fetches."""
+        buffer = FakeBuffer(["line {}".format(i) for i in range(100)])
+        connection = FakeConnection(buffer.respond)
+        chunks = self.collect(
+            self.make_prompt(10, 35), connection, chunk_lines=10, prefetch=2)
+        assert [chunk.first_line_number for chunk in chunks] == [10, 20, 30]
+        assert [len(chunk.lines) for chunk in chunks] == [10, 10, 5]
+        assert "".join(chunk.text for chunk in chunks) == "".join(
+            "line {}\n".format(i) for i in range(10, 35))
+        assert all(chunk.lines_lost == 0 for chunk in chunks)
+        assert connection.max_in_flight == 3
+
+    def test_styles_only_when_requested(self):
+        """Test that cell styles are requested only if asked for."""
+        buffer = FakeBuffer(["line {}".format(i) for i in range(10)])
+        connection = FakeConnection(buffer.respond)
+
+        def include_styles():
+            return [request.get_buffer_request.include_styles
+                    for request in connection.requests
+                    if request.HasField("get_buffer_request")]
+
+        self.collect(self.make_prompt(0, 10), connection, chunk_lines=5)
+        assert include_styles() == [False, False]
+        connection.requests.clear()
+        self.collect(self.make_prompt(0, 10), connection, chunk_lines=5,
+                     styles=True)
+        assert include_styles() == [True, True]
+
+    def test_reports_overflow(self):
+        """Test that lines lost from the head of history are reported."""
+        buffer = FakeBuffer(["line {}".format(i) for i in range(50, 100)],
+                            overflow=50)
+        connection = FakeConnection(buffer.respond)
+        chunks = self.collect(self.make_prompt(40, 60), connection,
+                              chunk_lines=8)
+        assert chunks[0].lines_lost == 10
+        assert chunks[0].first_line_number == 50
+        assert chunks[0].lines[0].string == "line 50"
+        assert sum(len(chunk.lines) for chunk in chunks) == 10
+
+    def test_overflow_while_streaming(self):
+        """Test that lines lost between chunk requests are reported."""
+        buffer = FakeBuffer(["line {}".format(i) for i in range(100)])
+
+        def respond(request, response):
+            buffer.respond(request, response)
+            if request.HasField("get_buffer_request"):
+                # 25 more lines scroll off after each fetch.
+                del buffer.lines[:25]
+                buffer.overflow += 25
+
+        connection = FakeConnection(respond)
+        chunks = self.collect(self.make_prompt(0, 60), connection,
+                              chunk_lines=20, prefetch=0)
+        assert [(chunk.first_line_number, len(chunk.lines), chunk.lines_lost)
+                for chunk in chunks] == [(0, 20, 0), (25, 15, 5), (50, 10, 10)]
+        assert chunks[1].lines[0].string == "line 25"
+
+    def test_entirely_lost(self):
+        """Test output that is completely gone."""
+        buffer = FakeBuffer(["x"] * 10, overflow=100)
+        connection = FakeConnection(buffer.respond)
+        chunks = self.collect(self.make_prompt(10, 20), connection)
+        assert len(chunks) == 1
+        assert chunks[0].lines == []
+        assert chunks[0].lines_lost == 10
@@ -0,0 +1,209 @@
+"""Tests for iterm2.recorder module."""
+import asyncio
+import gzip
+import os
+
+import pytest
+
+import iterm2.api_pb2
+from iterm2.recorder import RotatingGzipWriter, SessionRecorder
+from tests.fakes import (
+    FakeBuffer, FakeConnection, respond_ok_to_notification_requests)
+
+
+def screen_update(session):
+    """Makes a Notification proto for a screen update."""
+    notification = iterm2.api_pb2.Notification()
+    notification.screen_update_notification.session = session
+    return notification
+
+
+def session_terminated(session):
+    """Makes a Notification proto for a session terminating."""
+    notification = iterm2.api_pb2.Notification()
+    notification.terminate_session_notification.session_id = session
+    return notification
+
+
+def read_gzip(path):
+    """Returns the decompressed text of a file."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return file.read()
+
+
+async def async_read_gzip_when_closed(path):
+    """Returns the decompressed text of a file once its writer closes it."""
+    for _ in range(100):
+        try:
+            return read_gzip(path)
+        except (EOFError, OSError):
+            # Not yet written, or not yet closed.
+            await asyncio.sleep(0.01)
+    raise AssertionError("{} was not closed".format(path))
+
+
+def make_connection(buffers):
+    """Returns a connection serving a FakeBuffer per session ID."""
+    def respond(request, response):
+        if request.HasField("notification_request"):
+            respond_ok_to_notification_requests(request, response)
+        elif request.HasField("get_property_request"):
+            buffers[request.get_property_request.session_id].respond(
+                request, response)
+        else:
+            buffers[request.get_buffer_request.session].respond(
+                request, response)
+
+    return FakeConnection(respond)
+
+
+class TestRotatingGzipWriter:
+    """Tests for the RotatingGzipWriter class."""
+
+    def test_rotation(self, tmp_path):
+        """Test that full files are renamed and old ones discarded."""
+        writer = RotatingGzipWriter(str(tmp_path / "s.txt.gz"), 10, 2)
+        for text in ["aaaaaaaa\n", "bbbbbbbb\n", "cccccccc\n", "dddddddd\n"]:
+            writer.write(text)
+        writer.close()
+        assert read_gzip(writer.path) == "dddddddd\n"
+        assert read_gzip(writer.backup_path(1)) == "cccccccc\n"
+        assert read_gzip(writer.backup_path(2)) == "bbbbbbbb\n"
+        assert not (tmp_path / "s.txt.3.gz").exists()
+
+    def test_existing_file_counts_toward_rotation(self, tmp_path):
+        """Test that a writer reopening a file doesn't start counting from
+        zero."""
+        path = str(tmp_path / "s.txt.gz")
+        writer = RotatingGzipWriter(path, 100, 1)
+        writer.write("a" * 50)
+        writer.close()
+        writer = RotatingGzipWriter(path, os.path.getsize(path) + 10, 1)
+        writer.write("b" * 20)
+        writer.close()
+        assert read_gzip(writer.path) == "b" * 20
+        assert read_gzip(writer.backup_path(1)) == "a" * 50
+
+
+class TestSessionRecorder:
+    """Tests for the SessionRecorder class."""
+
+    def test_records_only_new_history(self, tmp_path):
+        """Test that each update fetches just the lines that scrolled off."""
+        buffers = {
+            "s1": FakeBuffer(["old {}".format(i) for i in range(30)],
+                             grid_height=5),
+            "s2": FakeBuffer(["other {}".format(i) for i in range(10)],
+                             grid_height=5)}
+
+        def respond(request, response):
+            if request.HasField("notification_request"):
+                respond_ok_to_notification_requests(request, response)
+            elif request.HasField("get_property_request"):
+                buffers[request.get_property_request.session_id].respond(
+                    request, response)
+            else:
+                buffers[request.get_buffer_request.session].respond(
+                    request, response)
+
+        connection = FakeConnection(respond)
+        recorder = SessionRecorder(connection, str(tmp_path))
+
+        async def body():
+            async with recorder:
+                await connection.async_notify(screen_update("s1"))
+                await asyncio.sleep(0.01)
+                buffers["s1"].lines.extend(
+                    "new {}".format(i) for i in range(3))
+                await connection.async_notify(screen_update("s1"))
+                await connection.async_notify(screen_update("s1"))
+                await asyncio.sleep(0.01)
+                # 4 more lines scroll off while 2 old ones fall out of a full
+                # history.
+                buffers["s1"].lines.extend(
+                    "new {}".format(i) for i in range(3, 7))
+                del buffers["s1"].lines[:2]
+                buffers["s1"].overflow = 2
+                await connection.async_notify(screen_update("s1"))
+                await connection.async_notify(screen_update("s2"))
+
+        asyncio.run(body())
+        assert read_gzip(recorder.path_for_session("s1")) == "".join(
+            "{}\n".format(line) for line in
+            ["old 25", "old 26", "old 27", "old 28", "old 29",
+             "new 0", "new 1"])
+        assert recorder.lines_recorded("s1") == 7
+        assert recorder.lines_lost("s1") == 0
+        assert recorder.lines_recorded("s2") == 0
+        ranges = [
+            request.get_buffer_request.line_range.windowed_coord_range.
+            coord_range
+            for request in connection.requests
+            if request.HasField("get_buffer_request")]
+        assert [(r.start.y, r.end.y) for r in ranges] == [(25, 28), (28, 32)]
+
+    def test_closes_file_when_session_terminates(self, tmp_path):
+        """Test that a session's file is closed when the session ends."""
+        connection = make_connection({
+            "s1": FakeBuffer(["line {}".format(i) for i in range(8)],
+                             grid_height=5)})
+        recorder = SessionRecorder(
+            connection, str(tmp_path), include_history=True)
+
+        async def body():
+            async with recorder:
+                await connection.async_notify(screen_update("s1"))
+                await asyncio.sleep(0.01)
+                await connection.async_notify(session_terminated("s1"))
+                return await async_read_gzip_when_closed(
+                    recorder.path_for_session("s1"))
+
+        assert asyncio.run(asyncio.wait_for(body(), 5)) == (
+            "line 0\nline 1\nline 2\n")
+        # The session's progress was discarded along with its writer.
+        assert recorder.lines_recorded("s1") == 0
+
+    def test_limits_open_files(self, tmp_path):
+        """Test that the least recently written file is closed to make
+        room."""
+        connection = make_connection({
+            session_id: FakeBuffer(
+                ["{} {}".format(session_id, i) for i in range(6)],
+                grid_height=5)
+            for session_id in ["s1", "s2"]})
+        recorder = SessionRecorder(
+            connection, str(tmp_path), include_history=True,
+            max_open_files=1)
+
+        async def body():
+            async with recorder:
+                await connection.async_notify(screen_update("s1"))
+                await asyncio.sleep(0.01)
+                await connection.async_notify(screen_update("s2"))
+                return await async_read_gzip_when_closed(
+                    recorder.path_for_session("s1"))
+
+        assert asyncio.run(asyncio.wait_for(body(), 5)) == "s1 0\n"
+        assert read_gzip(recorder.path_for_session("s2")) == "s2 0\n"
+
+    def test_write_error(self, tmp_path):
+        """Test that a failing writer stops recording without blocking
+        and raises on exit."""
+        connection = make_connection({
+            "s1": FakeBuffer(["line {}".format(i) for i in range(30)],
+                             grid_height=5)})
+        recorder = SessionRecorder(
+            connection, str(tmp_path), include_history=True,
+            lines_per_request=1, max_pending_writes=1)
+        os.mkdir(recorder.path_for_session("s1"))
+
+        async def body():
+            async with recorder:
+                await connection.async_notify(screen_update("s1"))
+                await asyncio.sleep(0.05)
+                await connection.async_notify(screen_update("s1"))
+                await asyncio.sleep(0.01)
+
+        with pytest.raises(OSError):
+            asyncio.run(asyncio.wait_for(body(), 5))
+        assert recorder.lines_recorded("s1") < 25
@@ -0,0 +1,72 @@
+"""Tests for iterm2.registration module."""
+import asyncio
+import os
+import pytest
+import iterm2.connection
+from iterm2.registration import (
+    RPCProcessPool, _process_pool_for_executor, _invoke_in_worker
+)
+
+
+def square(n):
+    """Module-level so it can be pickled by reference."""
+    return n * n
+
+
+async def async_worker_pid():
+    """A coroutine that runs in a worker process."""
+    return os.getpid()
+
+
+class TestInvokeInWorker:
+    """Tests for the worker-side trampoline."""
+
+    def test_function(self):
+        """Test that plain functions are called with keyword arguments."""
+        assert _invoke_in_worker(square, {"n": 7}) == 49
+
+    def test_coroutine(self):
+        """Test that coroutines are run to completion."""
+        assert _invoke_in_worker(async_worker_pid, {}) == os.getpid()
+
+
+class TestRPCProcessPool:
+    """Tests for the RPCProcessPool class."""
+
+    def test_max_workers(self):
+        """Test that max_workers defaults to a positive number."""
+        assert RPCProcessPool(max_workers=3).max_workers == 3
+        assert RPCProcessPool().max_workers >= 1
+
+    def test_call_runs_in_other_process(self):
+        """Test that calls execute in a worker and return results."""
+        pool = RPCProcessPool(max_workers=2)
+
+        async def run():
+            await pool.async_warm_up()
+            squared = await pool.async_call(square, {"n": 12})
+            pid = await pool.async_call(async_worker_pid, {})
+            return squared, pid
+
+        try:
+            squared, pid = asyncio.run(run())
+        finally:
+            pool.shutdown()
+        assert squared == 144
+        assert pid != os.getpid()
+
+    def test_executor_argument(self, monkeypatch):
+        """Test conversion of the executor argument."""
+        monkeypatch.setattr(iterm2.connection, "gDisconnectCallbacks", [])
+        monkeypatch.setattr(RPCProcessPool, "default", None)
+        pool = RPCProcessPool(max_workers=1)
+        assert _process_pool_for_executor(None) is None
+        assert _process_pool_for_executor(pool) is pool
+        default = _process_pool_for_executor("process")
+        assert isinstance(default, RPCProcessPool)
+        assert _process_pool_for_executor("process") is default
+        with pytest.raises(ValueError):
+            _process_pool_for_executor("fiber")
+        for callback in iterm2.connection.gDisconnectCallbacks:
+            callback()
+        assert RPCProcessPool.default is None
@@ -0,0 +1,224 @@
+"""Tests for iterm2.screen module."""
+import asyncio
+import sys
+
+import pytest
+
+import iterm2.api_pb2
+import iterm2.connection
+from iterm2.screen import (
+    LineContents, ScreenContents, ScreenContentsCache, StyleArrays,
+    get_shared_screen_contents_cache)
+from tests.fakes import (
+    FakeBuffer, FakeConnection, respond_ok_to_notification_requests)
+
+
+def count_requests(connection, field):
+    """Returns the number of requests of one kind sent so far."""
+    return sum(1 for request in connection.requests if request.HasField(field))
+
+
+def make_line(cells):
+    """Builds a LineContents with one cell per string in `cells`."""
+    proto = iterm2.api_pb2.LineContents()
+    proto.text = "".join(cells)
+    for cell in cells:
+        cppc = proto.code_points_per_cell.add()
+        cppc.num_code_points = len(cell)
+        cppc.repeats = 1
+    return LineContents(proto)
+
+
+class TestLineContents:
+    """Tests for the LineContents class."""
+
+    def test_substring(self):
+        """Test slicing by cell index with multi-code-point cells."""
+        line = make_line(["a", "é", "b", "\U0001F600", "c"])
+        assert line.number_of_cells == 5
+        assert line.substring(1, 3) == "éb"
+        assert line.substring(3) == "\U0001F600c"
+        assert line.string_at(1) == "é"
+
+    def test_substring_clamps(self):
+        """Test that out-of-range indices are clamped."""
+        line = make_line(["a", "b"])
+        assert line.substring(1, 10) == "b"
+        assert line.substring(5, 10) == ""
+        assert line.substring(-3, 1) == "a"
+
+
+def make_styled_contents():
+    """Builds ScreenContents with two lines of run-length encoded styles."""
+    proto = iterm2.api_pb2.GetBufferResponse()
+    first = proto.contents.add()
+    style = first.style.add()
+    style.repeats = 3
+    style.fgStandard = 1
+    style.bold = True
+    style = first.style.add()
+    style.repeats = 2
+    style.fgRgb.red = 0x12
+    style.fgRgb.green = 0x34
+    style.fgRgb.blue = 0x56
+    style.bgAlternate = iterm2.api_pb2.AlternateColor.Value("SYSTEM_MESSAGE")
+    style.url.url = "https://example.com/"
+    style.url.identifier = "x"
+    second = proto.contents.add()
+    style = second.style.add()
+    style.repeats = 1
+    style.italic = True
+    style.underline = True
+    style.url.url = "https://example.com/"
+    style.url.identifier = "x"
+    return ScreenContents(proto)
+
+
+class TestScreenContentsArrays:
+    """Tests for ScreenContents.to_arrays."""
+
+    def test_to_arrays(self):
+        """Test that runs are expanded and padded with unstyled cells."""
+        pytest.importorskip("numpy")
+        arrays = make_styled_contents().to_arrays()
+        cells = arrays.cells
+        assert cells.shape == (2, 5)
+        assert list(arrays.lengths) == [5, 1]
+        assert list(cells["fg_kind"][0]) == (
+            [StyleArrays.ColorKind.STANDARD] * 3 +
+            [StyleArrays.ColorKind.RGB] * 2)
+        assert list(cells["fg"][0]) == [1, 1, 1, 0x123456, 0x123456]
+        assert list(cells["bg_kind"][0]) == (
+            [StyleArrays.ColorKind.NONE] * 3 +
+            [StyleArrays.ColorKind.ALTERNATE] * 2)
+        assert list(cells["flags"][0]) == [StyleArrays.Flag.BOLD] * 3 + [0, 0]
+        assert cells["flags"][1][0] == (
+            StyleArrays.Flag.ITALIC | StyleArrays.Flag.UNDERLINE)
+        assert list(cells["url"][0]) == [0, 0, 0, 1, 1]
+        assert cells["url"][1][0] == 1
+        assert [url.url for url in arrays.urls] == ["https://example.com/"]
+        assert cells[1][1:].tolist() == [(0, 0, 0, 0, 0, 0)] * 4
+
+    def test_to_arrays_truncates(self):
+        """Test that a narrower width drops cells past it."""
+        pytest.importorskip("numpy")
+        arrays = make_styled_contents().to_arrays(columns=2)
+        assert arrays.cells.shape == (2, 2)
+        assert list(arrays.lengths) == [2, 1]
+        assert list(arrays.cells["fg"][0]) == [1, 1]
+
+    def test_to_arrays_without_numpy(self, monkeypatch):
+        """Test that a missing NumPy raises a helpful ImportError."""
+        monkeypatch.setitem(sys.modules, "numpy", None)
+        with pytest.raises(ImportError, match="iterm2\\[numpy\\]"):
+            make_styled_contents().to_arrays()
+
+
+def screen_update(session):
+    """Makes a Notification proto for a screen update."""
+    notification = iterm2.api_pb2.Notification()
+    notification.screen_update_notification.session = session
+    return notification
+
+
+class TestScreenContentsCache:
+    """Tests for the ScreenContentsCache class."""
+
+    def make_cache(self, idle_timeout=30.0):
+        """Returns a cache over a fake buffer and its connection."""
+        buffer = FakeBuffer(["line {}".format(i) for i in range(30)])
+
+        def respond(request, response):
+            if request.HasField("notification_request"):
+                respond_ok_to_notification_requests(request, response)
+            else:
+                buffer.respond(request, response)
+
+        connection = FakeConnection(respond)
+        return ScreenContentsCache(connection, idle_timeout), connection
+
+    def test_single_flight_per_generation(self):
+        """Test that concurrent and repeated gets share one fetch until the
+        screen updates."""
+        cache, connection = self.make_cache()
+
+        async def body():
+            first = await asyncio.gather(
+                *[cache.async_get("s1") for _ in range(5)])
+            unstyled = await cache.async_get("s1", style=False)
+            await connection.async_notify(screen_update("s1"))
+            second = await asyncio.gather(
+                cache.async_get("s1"), cache.async_get("s1"))
+            await cache.async_close()
+            return first, unstyled, second
+
+        first, unstyled, second = asyncio.run(body())
+        assert all(contents is first[0] for contents in first)
+        assert unstyled is first[0]
+        assert second[0] is second[1] and second[0] is not first[0]
+        fetches = count_requests(connection, "get_buffer_request")
+        assert fetches == 2
+        subscriptions = [
+            request.notification_request.subscribe
+            for request in connection.requests
+            if request.HasField("notification_request")]
+        assert subscriptions == [True, False]
+
+    def test_idle_eviction(self):
+        """Test that idle sessions are evicted and unsubscribed."""
+        cache, connection = self.make_cache(idle_timeout=0.01)
+
+        async def body():
+            await cache.async_get("s1")
+            generation = cache.generation("s1")
+            await asyncio.sleep(0.05)
+            return generation
+
+        assert asyncio.run(body()) == 0
+        assert cache.generation("s1") is None
+        unsubscribes = [
+            request for request in connection.requests
+            if request.HasField("notification_request") and
+            not request.notification_request.subscribe]
+        assert len(unsubscribes) == 1
+
+    def test_shared_cache_replaced_on_new_connection(self, monkeypatch):
+        """Test that the shared cache for an old connection is closed."""
+        monkeypatch.setattr(iterm2.connection, "gDisconnectCallbacks", [])
+        monkeypatch.setattr(ScreenContentsCache, "instance", None)
+        _, old_connection = self.make_cache()
+        _, new_connection = self.make_cache()
+
+        async def body():
+            old_cache = get_shared_screen_contents_cache(old_connection)
+            await old_cache.async_get("s1")
+            new_cache = get_shared_screen_contents_cache(new_connection)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return old_cache, new_cache
+
+        old_cache, new_cache = asyncio.run(body())
+        assert new_cache is not old_cache
+        assert new_cache.connection is new_connection
+        assert old_cache.generation("s1") is None
+        assert [request.notification_request.subscribe
+                for request in old_connection.requests
+                if request.HasField("notification_request")] == [True, False]
+
+    def test_shared_cache_discarded_on_disconnect(self, monkeypatch):
+        """Test that closing the connection discards the shared cache."""
+        monkeypatch.setattr(iterm2.connection, "gDisconnectCallbacks", [])
+        monkeypatch.setattr(ScreenContentsCache, "instance", None)
+        _, connection = self.make_cache()
+
+        async def body():
+            cache = get_shared_screen_contents_cache(connection)
+            await cache.async_get("s1")
+            return cache
+
+        cache = asyncio.run(body())
+        for callback in iterm2.connection.gDisconnectCallbacks:
+            callback()
+        assert ScreenContentsCache.instance is None
+        assert cache.generation("s1") is None
+        assert get_shared_screen_contents_cache(connection) is not cache
@@ -0,0 +1,127 @@
+"""Tests for iterm2.selection module."""
+import asyncio
+
+from iterm2.selection import Selection, SelectionMode, SubSelection
+from iterm2.util import CoordRange, Point, Range, WindowedCoordRange
+from tests.fakes import FakeBuffer, FakeConnection
+
+WIDTH = 10
+LINES = ["{:02d}abcdefgh".format(i) for i in range(20)]
+
+
+def box(left, top, right, bottom):
+    """A box selection covering columns [left, right) of rows top-bottom."""
+    return SubSelection(
+        WindowedCoordRange(
+            CoordRange(Point(left, top), Point(right, bottom)),
+            Range(left, right - left)),
+        SelectionMode.BOX,
+        False)
+
+
+def characters(start, end, connected=False):
+    """A character selection from start to end, exclusive."""
+    return SubSelection(
+        WindowedCoordRange(CoordRange(Point(*start), Point(*end))),
+        SelectionMode.CHARACTER,
+        connected)
+
+
+def get_string(selection):
+    """Returns the selection's text and the connection used to fetch it."""
+    connection = FakeConnection(FakeBuffer(LINES).respond)
+    text = asyncio.run(
+        selection.async_get_string(connection, "session", WIDTH))
+    return text, connection
+
+
+class TestSelectionGetString:
+    """Tests for Selection.async_get_string."""
+
+    def test_box_and_characters(self):
+        """Test a box followed by a character selection."""
+        selection = Selection([box(2, 1, 5, 3), characters((0, 5), (4, 5))])
+        text, connection = get_string(selection)
+        assert text == "abc\nabc\nabc\n05ab"
+        # Rows 1-3 and row 5 are fetched, once each.
+        assert len(connection.requests) == 2
+
+    def test_whole_rows_keep_hard_newlines(self):
+        """Test that a range ending at the right margin keeps the newline."""
+        selection = Selection([
+            characters((5, 1), (10, 2)),
+            characters((0, 4), (2, 4))])
+        text, _ = get_string(selection)
+        assert text == "defgh\n02abcdefgh\n04"
+
+    def test_overlapping_sub_selections_are_merged(self):
+        """Test that overlapping or adjacent ranges are not repeated."""
+        selection = Selection([
+            characters((0, 1), (6, 1)),
+            characters((4, 1), (8, 1)),
+            characters((8, 1), (9, 1))])
+        text, _ = get_string(selection)
+        assert text == "01abcdefg"
+
+    def test_connected_sub_selection(self):
+        """Test that no newline follows a connected sub-selection."""
+        selection = Selection([
+            characters((0, 1), (3, 1), connected=True),
+            characters((5, 1), (7, 1))])
+        text, _ = get_string(selection)
+        assert text == "01ade"
+
+    def test_many_rows_use_few_requests(self):
+        """Test that rows are fetched in batches, concurrently."""
+        lines = ["{:05d}".format(i) for i in range(2501)]
+        connection = FakeConnection(FakeBuffer(lines).respond)
+        selection = Selection([
+            box(1, 0, 3, 2499), characters((0, 2500), (5, 2500))])
+        text = asyncio.run(
+            selection.async_get_string(connection, "session", WIDTH))
+        assert text.split("\n")[-2:] == ["24", "02500"]
+        assert len(text.split("\n")) == 2501
+        assert len(connection.requests) == 3
+        assert connection.max_in_flight == 3
+
+
+class TestEnumerateRanges:
+    """Tests for range enumeration."""
+
+    def test_async_enumerate_ranges(self):
+        """Test the ranges and newline flags passed to the callback."""
+        selection = Selection([box(2, 1, 5, 2), characters((0, 4), (10, 4))])
+        calls = []
+
+        async def callback(windowed_coord_range, eol):
+            coord_range = windowed_coord_range.coordRange
+            calls.append((
+                (coord_range.start.x, coord_range.start.y),
+                (coord_range.end.x, coord_range.end.y),
+                eol))
+
+        asyncio.run(selection.async_enumerate_ranges(WIDTH, callback))
+        assert calls == [
+            ((2, 1), (5, 1), True),
+            ((2, 2), (5, 2), True),
+            ((0, 4), (10, 4), False)]
+
+    def test_async_enumerate_ranges_stops(self):
+        """Test that a truthy return value stops enumeration."""
+        selection = Selection([box(2, 1, 5, 3)])
+        calls = []
+
+        async def callback(windowed_coord_range, eol):
+            calls.append(windowed_coord_range)
+            return True
+
+        asyncio.run(selection.async_enumerate_ranges(WIDTH, callback))
+        assert len(calls) == 1
+
+    def test_sub_selection_enumerate_ranges(self):
+        """Test that every kind of sub-selection passes one argument."""
+        ranges = []
+        box(2, 1, 5, 2).enumerate_ranges(ranges.append)
+        characters((0, 4), (3, 4)).enumerate_ranges(ranges.append)
+        assert [(r.start.x, r.start.y, r.end.x, r.end.y) for r in ranges] == [
+            (2, 1, 5, 1), (2, 2, 5, 2), (0, 4, 3, 4)]
@@ -350,3 +350,26 @@ class TestInvocationString:
         """Test invocation with no arguments."""
         result = invocation_string("noArgs", {})
         assert result == "noArgs()"
+
+
+class TestSlots:
+    """Tests that value types don't carry a per-instance __dict__."""
+
+    @pytest.mark.parametrize("value", [
+        Size(1, 2),
+        Point(1, 2),
+        Range(1, 2),
+        Frame(Point(0, 0), Size(1, 1)),
+        CoordRange(Point(0, 0), Point(1, 1)),
+        WindowedCoordRange(CoordRange(Point(0, 0), Point(1, 1)), Range(0, 1)),
+    ])
+    def test_no_instance_dict(self, value):
+        """Test that instances have no __dict__ and reject new attributes."""
+        assert not hasattr(value, "__dict__")
+        with pytest.raises(AttributeError):
+            value.unexpected = 1
+
+    def test_point_hash_matches_equality(self):
+        """Test that equal points hash equally."""
+        assert hash(Point(3, 4)) == hash(Point(3, 4))
+        assert len({Point(3, 4), Point(3, 4), Point(4, 3)}) == 2
@@ -0,0 +1,55 @@
+"""Tests for iterm2.variables module."""
+import asyncio
+import json
+
+import iterm2.api_pb2
+from iterm2.variables import MultiVariableMonitor, VariableScopes
+from tests.fakes import FakeConnection, respond_ok_to_notification_requests
+
+
+def variable_changed(scope, identifier, name, value):
+    """Makes a Notification proto for a variable change."""
+    notification = iterm2.api_pb2.Notification()
+    change = notification.variable_changed_notification
+    change.scope = scope.value
+    change.identifier = identifier
+    change.name = name
+    change.json_new_value = json.dumps(value)
+    return notification
+
+
+class TestMultiVariableMonitor:
+    """Tests for the MultiVariableMonitor class."""
+
+    def test_subscribes_concurrently_and_coalesces(self):
+        """Test pipelined subscription and latest-value delivery."""
+        connection = FakeConnection(respond_ok_to_notification_requests)
+        names = ["jobName", "path", "hostname"]
+        variables = [(VariableScopes.SESSION, "all", name) for name in names]
+        variables.append((VariableScopes.APP, None, "effectiveTheme"))
+
+        async def body():
+            async with MultiVariableMonitor(connection, variables) as mon:
+                subscriptions = len(connection.requests)
+                await connection.async_notify(variable_changed(
+                    VariableScopes.SESSION, "s1", "path", "/tmp"))
+                await connection.async_notify(variable_changed(
+                    VariableScopes.SESSION, "s2", "path", "/usr"))
+                await connection.async_notify(variable_changed(
+                    VariableScopes.SESSION, "s1", "path", "/var"))
+                await connection.async_notify(variable_changed(
+                    VariableScopes.APP, "", "effectiveTheme", "dark"))
+                events = [await mon.async_get() for _ in range(3)]
+            return subscriptions, events
+
+        subscriptions, events = asyncio.run(body())
+        assert subscriptions == 4
+        assert connection.max_in_flight == 4
+        assert events == [
+            (VariableScopes.SESSION, "s1", "path", "/var"),
+            (VariableScopes.SESSION, "s2", "path", "/usr"),
+            (VariableScopes.APP, "", "effectiveTheme", "dark")]
+        unsubscribes = [
+            request for request in connection.requests[4:]
+            if not request.notification_request.subscribe]
+        assert len(unsubscribes) == 4
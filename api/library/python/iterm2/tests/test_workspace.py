@@ -0,0 +1,170 @@
+"""Tests for iterm2.workspace module."""
+import asyncio
+
+import pytest
+
+import iterm2.api_pb2
+from iterm2.session import SplitPaneException
+from iterm2.workspace import (
+    PaneSpec, SplitSpec, TabSpec, WindowSpec, WorkspaceSpec)
+from tests.fakes import FakeConnection, FakeSplitPanes
+
+
+def row(count, vertical=True):
+    """Returns a SplitSpec of `count` panes with profiles "p0", "p1"..."""
+    return SplitSpec(vertical, [
+        PaneSpec(profile="p{}".format(i)) for i in range(count)])
+
+
+def create(spec, server):
+    """Creates a workspace with a FakeSplitPanes server."""
+    connection = FakeConnection(server.respond)
+    workspace = asyncio.run(spec.async_create(connection))
+    return workspace, connection
+
+
+def shape(server, node):
+    """Describes a fake split tree with profile names in place of IDs."""
+    if isinstance(node, dict):
+        return ("|" if node["vertical"] else "-",
+                [shape(server, child) for child in node["children"]])
+    return server.profiles[node]
+
+
+class TestSpecs:
+    """Tests for validating workspace specs."""
+
+    def test_split_needs_two_children(self):
+        """Test that a split with one child is rejected."""
+        with pytest.raises(ValueError):
+            SplitSpec(True, [PaneSpec()])
+
+    def test_split_orientation_must_alternate(self):
+        """Test that a child split with its parent's orientation is rejected."""
+        with pytest.raises(ValueError):
+            SplitSpec(True, [PaneSpec(), row(2, vertical=True)])
+
+    def test_window_needs_a_tab(self):
+        """Test that a window without tabs is rejected."""
+        with pytest.raises(ValueError):
+            WindowSpec([])
+
+
+class TestWorkspaceSpec:
+    """Tests for WorkspaceSpec.async_create."""
+
+    def test_builds_nested_tree(self):
+        """Test that nested splits produce the same tree in iTerm2."""
+        root = SplitSpec(True, [
+            PaneSpec(profile="left"),
+            SplitSpec(False, [
+                PaneSpec(profile="top"),
+                row(3),
+                PaneSpec(profile="bottom")]),
+            PaneSpec(profile="right")])
+        server = FakeSplitPanes(width=160, height=48)
+        workspace, _ = create(WorkspaceSpec([WindowSpec([TabSpec(root)])]),
+                              server)
+        tab_id = int(workspace.tab_ids[0][0])
+        assert shape(server, server.trees[tab_id]) == (
+            "|", ["left",
+                  ("-", ["top", ("|", ["p0", "p1", "p2"]), "bottom"]),
+                  "right"])
+        assert [server.profiles[session_id]
+                for session_id in workspace.session_ids[0][0]] == [
+                    "left", "top", "p0", "p1", "p2", "bottom", "right"]
+
+    def test_windows_and_tabs(self):
+        """Test that windows and tabs are created in order, concurrently."""
+        spec = WorkspaceSpec([
+            WindowSpec([TabSpec(PaneSpec(profile="w{}t{}".format(w, t)))
+                        for t in range(3)])
+            for w in range(2)])
+        server = FakeSplitPanes()
+        workspace, connection = create(spec, server)
+        assert len(workspace.window_ids) == 2
+        for w, window_id in enumerate(workspace.window_ids):
+            assert server.windows[window_id] == [
+                int(tab_id) for tab_id in workspace.tab_ids[w]]
+            assert [server.profiles[tab[0]]
+                    for tab in workspace.session_ids[w]] == [
+                        "w{}t{}".format(w, t) for t in range(3)]
+        assert connection.max_in_flight == 4
+        assert [(step.name, step.requests) for step in workspace.steps] == [
+            ("create windows", 2), ("create tabs", 4)]
+        assert server.layouts == []
+
+    def test_splits_are_balanced_and_pipelined(self):
+        """Test that eight side-by-side panes need only three rounds of
+        splits, none of which splits a pane below the minimum size."""
+        spec = WorkspaceSpec([
+            WindowSpec([TabSpec(row(8)) for _ in range(6)])])
+        server = FakeSplitPanes(width=80, min_size=8)
+        workspace, connection = create(spec, server)
+        assert [(step.name, step.requests) for step in workspace.steps] == [
+            ("create windows", 1),
+            ("create tabs", 5),
+            ("split panes (depth 1)", 6),
+            ("split panes (depth 2)", 12),
+            ("split panes (depth 3)", 24),
+            ("list sessions", 1),
+            ("set tab layouts", 6)]
+        assert connection.max_in_flight == 24
+        for tab in workspace.session_ids[0]:
+            assert [server.profiles[session_id] for session_id in tab] == [
+                "p{}".format(i) for i in range(8)]
+
+    def test_layout_uses_weights(self):
+        """Test that the final layout divides space by weight."""
+        root = SplitSpec(True, [
+            PaneSpec(weight=1),
+            SplitSpec(False, [PaneSpec(), PaneSpec(weight=3)], weight=3)])
+        server = FakeSplitPanes(width=80, height=24)
+        workspace, _ = create(WorkspaceSpec([WindowSpec([TabSpec(root)])]),
+                              server)
+        left, top, bottom = workspace.session_ids[0][0]
+        (layout,) = server.layouts
+        assert layout.tab_id == workspace.tab_ids[0][0]
+        sizes = {}
+
+        def visit(node):
+            for link in node.links:
+                if link.HasField("session"):
+                    sizes[link.session.unique_identifier] = (
+                        link.session.grid_size.width,
+                        link.session.grid_size.height)
+                else:
+                    visit(link.node)
+
+        visit(layout.root)
+        assert sizes == {left: (20, 24), top: (60, 6), bottom: (60, 18)}
+
+    def test_command(self):
+        """Test that a pane's command is sent as a profile customization."""
+        root = SplitSpec(True, [PaneSpec(), PaneSpec(command="top")])
+        server = FakeSplitPanes()
+        _, connection = create(
+            WorkspaceSpec([WindowSpec([TabSpec(root)])]), server)
+        (split,) = [request.split_pane_request
+                    for request in connection.requests
+                    if request.HasField("split_pane_request")]
+        assert {prop.key for prop in split.custom_profile_properties} == {
+            "Custom Command", "Command"}
+
+    def test_split_failure_raises(self):
+        """Test that a refused split raises SplitPaneException."""
+        server = FakeSplitPanes(width=10, min_size=8)
+        with pytest.raises(SplitPaneException, match="CANNOT_SPLIT"):
+            create(WorkspaceSpec([WindowSpec([TabSpec(row(2))])]), server)
+
+    def test_create_failure_raises(self):
+        """Test that a refused window raises CreateWindowException."""
+        def respond(request, response):
+            response.create_tab_response.status = (
+                iterm2.api_pb2.CreateTabResponse.Status.Value(
+                    "INVALID_PROFILE_NAME"))
+
+        connection = FakeConnection(respond)
+        spec = WorkspaceSpec([WindowSpec([TabSpec(PaneSpec(profile="x"))])])
+        with pytest.raises(iterm2.CreateWindowException):
+            asyncio.run(spec.async_create(connection))